@@ -73,17 +73,23 @@
 #
 # Kod skryptu `run_evaluation.py`:
 
+import os
+import sys
 from langsmith import Client
 from langchain_openai import ChatOpenAI
 from langchain.evaluation import run_evaluator, EvaluatorType
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+# Kaseta z projektu końcowego (app/cassette.py): LLM_CASSETTE_MODE=record nagrywa odpowiedzi modelu,
+# a LLM_CASSETTE_MODE=replay odtwarza je lokalnie, więc powtórne przebiegi ewaluacji nie wołają API.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "module-final-project"))
+from app.cassette import wrap_llm
 
 # Funkcja budująca łańcuch, który chcemy przetestować
 def get_chain_to_test():
     # WAŻNE: W prawdziwym CI/CD, ten kod importowalibyśmy
     # z głównego kodu naszej aplikacji.
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
+    llm = wrap_llm(ChatOpenAI(model="gpt-4o", temperature=0))
     prompt = ChatPromptTemplate.from_template("Napisz jedno, zwięzłe zdanie na temat: {input}")
     chain = prompt | llm | StrOutputParser()
     return chain
@@ -72,7 +72,7 @@
 # Krok 0: Instalacja
 # pip install langchain-openai langchain-community faiss-cpu
 import os
-from langchain_community.vectorstores import FAISS
+from faiss_store import load_or_build_faiss
 from langchain_openai import OpenAIEmbeddings
 from langchain_text_splitters import CharacterTextSplitter
 from langchain_core.documents import Document
@@ -105,13 +105,16 @@ for doc in documents:
 embeddings = OpenAIEmbeddings()
 
 # Krok 3: Stworzenie indeksu FAISS z dokumentów
-# Ta komenda wykonuje wszystkie kluczowe kroki:
+# Sercem jest komenda `FAISS.from_documents(documents, embeddings)`, która:
 # 1. Bierze każdy dokument.
 # 2. Tworzy dla niego embedding za pomocą `OpenAIEmbeddings`.
 # 3. Buduje w pamięci indeks FAISS ze wszystkich wektorów.
+# Funkcja `load_or_build_faiss` (plik `faiss_store.py`) wywołuje ją tylko przy pierwszym
+# uruchomieniu, a gotowy indeks zapisuje na dysku. Kolejne uruchomienia wczytują go z pliku
+# i nie płacą ponownie za embeddingi – dopóki dokumenty się nie zmienią.
 print("\n--- Tworzenie indeksu FAISS ---")
-vectorstore = FAISS.from_documents(documents, embeddings)
-print("Indeks został stworzony w pamięci.")
+vectorstore = load_or_build_faiss(documents, embeddings, name="lekcja-80")
+print("Indeks jest gotowy.")
 
 # Krok 4: Użycie indeksu do wyszukiwania podobieństwa
 query = "Jakie są zastosowania LangChain?"
@@ -58,7 +58,7 @@
 # pip install langchain-openai langchain-community faiss-cpu
 
 import os
-from langchain_community.vectorstores import FAISS
+from faiss_store import load_or_build_faiss
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_text_splitters import CharacterTextSplitter
 from langchain_core.documents import Document
@@ -78,7 +78,7 @@ if "OPENAI_API_KEY" not in os.environ:
 text = "LangChain to potężny framework do budowy aplikacji AI. Szczególnie dobrze nadaje się do tworzenia zaawansowanych chatbotów, ponieważ pozwala na integrację z pamięcią i narzędziami."
 documents = [Document(page_content=text, metadata={"source": "lekcja-81"})]
 embeddings = OpenAIEmbeddings()
-vectorstore = FAISS.from_documents(documents, embeddings)
+vectorstore = load_or_build_faiss(documents, embeddings, name="lekcja-81")  # indeks zapisany na dysku (faiss_store.py)
 retriever = vectorstore.as_retriever(k=1)
 llm = ChatOpenAI(model="gpt-4o", temperature=0.2)
 
@@ -54,7 +54,7 @@
 # pip install langchain-openai langchain-community faiss-cpu beautifulsoup4
 import os
 from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.vectorstores import FAISS
+from faiss_store import load_or_build_faiss
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain.chains.combine_documents import create_stuff_documents_chain
@@ -85,8 +85,9 @@ documents = text_splitter.split_documents(docs)
 print(f"Załadowano i podzielono na {len(documents)} fragmentów.")
 
 # Tworzymy embeddingi i budujemy indeks FAISS
+# (tylko za pierwszym razem lub gdy dokumentacja się zmieniła – potem indeks jest wczytywany z dysku)
 embeddings = OpenAIEmbeddings()
-vectorstore = FAISS.from_documents(documents, embeddings)
+vectorstore = load_or_build_faiss(documents, embeddings, name="lekcja-82")
 
 # Tworzymy retriever, który będzie przeszukiwał naszą bazę
 retriever = vectorstore.as_retriever()
@@ -41,7 +41,7 @@
 # Krok 0: Instalacja
 # # pip install langchain-openai langchain-community faiss-cpu
 import os
-from langchain_community.vectorstores import FAISS
+from faiss_store import load_or_build_faiss
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.documents import Document
@@ -62,7 +62,7 @@ documents = [
     Document(page_content="LangChain to framework do budowy aplikacji opartych o LLM.", metadata={"source": "dokumentacja-langchain.md"})
 ]
 embeddings = OpenAIEmbeddings()
-vectorstore = FAISS.from_documents(documents, embeddings)
+vectorstore = load_or_build_faiss(documents, embeddings, name="lekcja-84")  # indeks zapisany na dysku (faiss_store.py)
 retriever = vectorstore.as_retriever(k=1) # Będziemy pobierać 1 najbardziej relevantny dokument
 
 # Krok 2: Zdefiniowanie szablonu promptu
@@ -76,7 +76,7 @@
 # Krok 0: Instalacja i przygotowanie danych
 # # (Używamy tych samych pakietów co w poprzedniej lekcji)
 import os
-from langchain_community.vectorstores import FAISS
+from faiss_store import load_or_build_faiss
 from langchain_openai import OpenAIEmbeddings, ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.documents import Document
@@ -100,7 +100,7 @@ movie_descriptions = [
     "świecie pełnym technologii.", metadata={"title": "Blade Runner 2049"})
 ]
 embeddings = OpenAIEmbeddings()
-vectorstore = FAISS.from_documents(movie_descriptions, embeddings)
+vectorstore = load_or_build_faiss(movie_descriptions, embeddings, name="lekcja-85")  # indeks zapisany na dysku (faiss_store.py)
 retriever = vectorstore.as_retriever()
 
 # Krok 2: Zdefiniowanie promptu i łańcucha rekomendacyjnego
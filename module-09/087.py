@@ -49,16 +49,23 @@
 #
 # Krok 0: Instalacja
 # # pip install langchain-openai faiss-cpu ragas datasets
+#
+# Ewaluację uruchamiamy wiele razy, więc wywołania LLM i embeddingów opakowujemy w "kasetę"
+# z projektu końcowego (app/cassette.py). Z LLM_CASSETTE_MODE=record odpowiedzi są nagrywane,
+# a z LLM_CASSETTE_MODE=replay odtwarzane lokalnie – bez kosztów i bez szumu po stronie API.
 import os
+import sys
 from ragas import evaluate
 from ragas.metrics import faithfulness, answer_relevancy, context_recall, context_precision
 from datasets import Dataset
 from langchain_openai import ChatOpenAI, OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
+from faiss_store import load_or_build_faiss
 from langchain_core.documents import Document
 from langchain_core.runnables import RunnablePassthrough
 from langchain_core.output_parsers import StrOutputParser
 from langchain.prompts import ChatPromptTemplate
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "module-final-project"))
+from app.cassette import wrap_embeddings, wrap_llm
 
 # Konfiguracja API
 # os.environ["OPENAI_API_KEY"] = "sk-..."
@@ -72,10 +79,10 @@ documents = [
     Document(page_content="Warszawa jest stolicą Polski i największym miastem w kraju.", metadata={"source": "doc1"}),
     Document(page_content="Paryż to stolica Francji, znana z Wieży Eiffla.", metadata={"source": "doc2"})
 ]
-embeddings = OpenAIEmbeddings()
-vectorstore = FAISS.from_documents(documents, embeddings)
+embeddings = wrap_embeddings(OpenAIEmbeddings())
+vectorstore = load_or_build_faiss(documents, embeddings, name="lekcja-87")  # indeks zapisany na dysku (faiss_store.py)
 retriever = vectorstore.as_retriever()
-llm = ChatOpenAI(model="gpt-4o", temperature=0)
+llm = wrap_llm(ChatOpenAI(model="gpt-4o", temperature=0))
 
 template = "Kontekst: {context}\n\nPytanie: {question}\n\nOdpowiedź:"
 prompt = ChatPromptTemplate.from_template(template)
@@ -77,20 +77,31 @@
 # Poniższy kod jest konceptualny, aby pokazać, jak zmieniłaby się nasza logika przy przejściu
 # na produkcyjną bazę wektorową, taką jak Pinecone.
 #
+# Bez konta w Pinecone ten sam kod można uruchomić na lokalnym serwisie wektorowym z projektu
+# końcowego – ma on API HTTP z przestrzeniami nazw i zapisuje dane na dysku, jak prawdziwa baza:
+#     cd module-final-project && uvicorn app.vector_service:app --port 8100
+# Jeśli PINECONE_API_KEY nie jest ustawiony, skrypt używa właśnie tego serwisu (VECTOR_SERVICE_URL).
+#
 # Krok 0: Instalacja
 # # pip install langchain-openai langchain-pinecone
 import os
+import sys
 from langchain_openai import OpenAIEmbeddings
-from langchain_pinecone import PineconeVectorStore
 from langchain_core.documents import Document
 
 # Konfiguracja API i Pinecone
 # os.environ["OPENAI_API_KEY"] = "sk-..."
 # os.environ["PINECONE_API_KEY"] = "..."
 # os.environ["PINECONE_ENVIRONMENT"] = "us-west1-gcp" # lub inny region
-if "OPENAI_API_KEY" not in os.environ or "PINECONE_API_KEY" not in os.environ:
-    print("\nBŁĄD: Skonfiguruj zmienne środowiskowe dla OpenAI i Pinecone.")
+if "OPENAI_API_KEY" not in os.environ:
+    print("\nBŁĄD: Skonfiguruj zmienną środowiskową OPENAI_API_KEY.")
     exit()
+USE_PINECONE = "PINECONE_API_KEY" in os.environ
+if USE_PINECONE:
+    from langchain_pinecone import PineconeVectorStore
+else:
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "module-final-project"))
+    from app.vector_client import RemoteVectorStore
 
 # Załóżmy, że mamy już zaindeksowane dokumenty
 documents = [
@@ -103,15 +114,26 @@ index_name = "rag-production-index" # Nazwa naszego indeksu w panelu Pinecone
 # Krok 1: Indeksowanie (w tle, w osobnym potoku)
 # Ta operacja dodaje dokumenty do zdalnego, zarządzanego indeksu Pinecone.
 # Nie tworzy niczego lokalnie.
-print("--- Indeksowanie danych w Pinecone ---")
-# PineconeVectorStore.from_documents(documents, embeddings, index_name=index_name)
-print("Dane (symulacyjnie) zindeksowane.")
+if USE_PINECONE:
+    print("--- Indeksowanie danych w Pinecone ---")
+    # PineconeVectorStore.from_documents(documents, embeddings, index_name=index_name)
+    print("Dane (symulacyjnie) zindeksowane.")
+else:
+    # Lokalny serwis przyjmuje dokumenty naprawdę; stałe identyfikatory sprawiają, że ponowne
+    # uruchomienie nadpisuje te same wpisy (upsert), zamiast dodawać duplikaty.
+    print("--- Indeksowanie danych w lokalnym serwisie wektorowym ---")
+    RemoteVectorStore.from_documents(documents, embeddings, ids=[doc.metadata["id"] for doc in documents],
+                                     namespace=index_name)
+    print("Dane zindeksowane.")
 
 # Krok 2: Użycie istniejącego indeksu w aplikacji Query-Time
 print("\n--- Użycie produkcyjnego retrievera ---")
 # W naszej aplikacji FastAPI, nie tworzymy indeksu od nowa.
 # Łączymy się z ISTNIEJĄCYM, już wypełnionym indeksem w chmurze Pinecone.
-vectorstore_prod = PineconeVectorStore.from_existing_index(index_name, embeddings)
+if USE_PINECONE:
+    vectorstore_prod = PineconeVectorStore.from_existing_index(index_name, embeddings)
+else:
+    vectorstore_prod = RemoteVectorStore(embeddings, namespace=index_name)
 retriever_prod = vectorstore_prod.as_retriever()
 
 # Krok 3: Wyszukiwanie
@@ -119,7 +141,7 @@ query = "Jakiej bazy używać w produkcyjnym RAG?"
 print(f"Zapytanie: {query}")
 found_docs = retriever_prod.invoke(query)
 
-print("\nZnalezione dokumenty z Pinecone:")
+print(f"\nZnalezione dokumenty z {'Pinecone' if USE_PINECONE else 'lokalnego serwisu'}:")
 print(found_docs)
 
 
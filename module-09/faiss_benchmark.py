@@ -0,0 +1,115 @@
+# --- Plik: faiss_benchmark.py ---
+# Porównanie indeksów FAISS: Flat vs IVF-Flat vs IVF-PQ na syntetycznych wektorach
+#
+# Skrypt generuje korpus losowych, zgrupowanych wektorów (bez wywoływania modelu embeddingowego),
+# buduje każdy indeks za pomocą funkcji z `faiss_store.py` i dla każdego podaje:
+#   * czas budowy (trening + dodanie wektorów),
+#   * rozmiar indeksu w pamięci (MB),
+#   * opóźnienie zapytania p50 / p95 (ms, zapytania pojedynczo – jak w aplikacji),
+#   * recall@k względem dokładnego indeksu Flat, dla kilku wartości nprobe.
+#
+# Uruchomienie (domyślnie 100 tys. i 1 mln wektorów):
+#     python faiss_benchmark.py
+#     python faiss_benchmark.py --sizes 100000,1000000,5000000 --dim 128 --pq-m 16
+#
+# Uwaga: 5 mln wektorów o wymiarze 128 to ok. 2,5 GB samych danych float32 (plus kopia w indeksie Flat).
+import argparse
+import os
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+from faiss_store import default_nlist, index_factory_string, set_nprobe, train_index
+
+
+def synthetic_vectors(count, dim, clusters=1000, seed=0, block=200_000):
+    """Wektory rozrzucone wokół `clusters` losowych środków (jak tematy w prawdziwym korpusie)."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+    vectors = np.empty((count, dim), dtype="float32")
+    for start in range(0, count, block):
+        stop = min(start + block, count)
+        vectors[start:stop] = centers[rng.integers(0, clusters, stop - start)]
+        vectors[start:stop] += 0.5 * rng.standard_normal((stop - start, dim)).astype("float32")
+    return vectors
+
+
+def index_megabytes(index):
+    """Rozmiar indeksu po serializacji – dobre przybliżenie zajmowanej pamięci RAM."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "index.faiss")
+        faiss.write_index(index, path)
+        return os.path.getsize(path) / 1024 / 1024
+
+
+def query_latencies(index, queries, k):
+    """Zapytania wysyłane pojedynczo; zwraca (wyniki, lista czasów w ms)."""
+    found, timings = [], []
+    for query in queries:
+        started_at = time.perf_counter()
+        _, ids = index.search(query[None, :], k)
+        timings.append((time.perf_counter() - started_at) * 1000)
+        found.append(ids[0])
+    return np.array(found), timings
+
+
+def recall_at_k(found, exact):
+    return np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, exact)])
+
+
+def run(count, args):
+    print(f"\n=== {count:,} wektorów, wymiar {args.dim} ===")
+    vectors = synthetic_vectors(count, args.dim, seed=args.seed)
+    queries = synthetic_vectors(args.queries, args.dim, seed=args.seed + 1)
+    nlist = args.nlist or default_nlist(count)
+
+    started_at = time.time()
+    flat = faiss.IndexFlatL2(args.dim)
+    flat.add(vectors)
+    flat_build = time.time() - started_at
+    exact, timings = query_latencies(flat, queries, args.k)
+    rows = [("Flat", "-", flat_build, index_megabytes(flat), timings, 1.0)]
+    del flat
+
+    for index_type in ("ivf_flat", "ivf_pq"):
+        started_at = time.time()
+        index = train_index(vectors, index_type, nlist, args.pq_m, args.pq_bits, args.train_size, args.seed)
+        index.add(vectors)
+        build = time.time() - started_at
+        megabytes = index_megabytes(index)
+        for nprobe in args.nprobe:
+            set_nprobe(index, nprobe)
+            found, timings = query_latencies(index, queries, args.k)
+            rows.append((index_factory_string(index_type, nlist, args.pq_m, args.pq_bits), nprobe,
+                         build, megabytes, timings, recall_at_k(found, exact)))
+        del index
+
+    print(f"{'Indeks':<22}{'nprobe':>8}{'budowa [s]':>12}{'pamięć [MB]':>13}{'p50 [ms]':>10}{'p95 [ms]':>10}{f'recall@{args.k}':>11}")
+    for name, nprobe, build, megabytes, timings, recall in rows:
+        p50, p95 = np.percentile(timings, [50, 95])
+        print(f"{name:<22}{nprobe:>8}{build:>12.1f}{megabytes:>13.1f}{p50:>10.2f}{p95:>10.2f}{recall:>11.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark indeksów FAISS: Flat, IVF-Flat i IVF-PQ.")
+    parser.add_argument("--sizes", default="100000,1000000", help="liczby wektorów oddzielone przecinkami")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=None, help="liczba grup IVF (domyślnie 4 * sqrt(N))")
+    parser.add_argument("--nprobe", default="1,8,32", help="wartości nprobe oddzielone przecinkami")
+    parser.add_argument("--pq-m", type=int, default=16, help="liczba podwektorów PQ (musi dzielić wymiar)")
+    parser.add_argument("--pq-bits", type=int, default=8, help="bity na kod PQ")
+    parser.add_argument("--train-size", type=int, default=None, help="wielkość próbki treningowej")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    args.nprobe = [int(n) for n in args.nprobe.split(",")]
+
+    for count in (int(n) for n in args.sizes.split(",")):
+        run(count, args)
+
+
+if __name__ == "__main__":
+    main()
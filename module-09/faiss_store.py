@@ -0,0 +1,241 @@
+# --- Plik: faiss_store.py ---
+# Moduł pomocniczy dla lekcji z modułu 9: trwały indeks FAISS zamiast budowania go przy każdym uruchomieniu
+#
+# W lekcjach indeks tworzyliśmy komendą `FAISS.from_documents(documents, embeddings)`.
+# Działa to świetnie, ale przy KAŻDYM starcie skryptu wszystkie dokumenty są od nowa
+# wysyłane do modelu embeddingowego (czas i pieniądze!), a indeks budowany od zera.
+#
+# Funkcja `load_or_build_faiss` robi to tylko raz:
+#   1. Liczy "odcisk palca" korpusu (skrót SHA-256 z nazwy modelu, treści i metadanych dokumentów).
+#   2. Jeśli na dysku jest indeks z takim samym odciskiem – wczytuje go (z mmap, czyli system
+#      czyta z pliku tylko te fragmenty, których akurat potrzebuje).
+#   3. W przeciwnym razie buduje indeks, a potem zapisuje na dysk wektory (index.faiss),
+#      dokumenty wraz z mapą identyfikatorów (docstore.json) i manifest z odciskiem.
+#
+# Zmiana choćby jednego dokumentu (albo modelu embeddingów) zmienia odcisk, więc indeks
+# zostanie automatycznie zbudowany od nowa.
+#
+# Użycie w lekcji:
+#     from faiss_store import load_or_build_faiss
+#     vectorstore = load_or_build_faiss(documents, embeddings, name="lekcja-84")
+#
+# Indeksy dla dużych korpusów (setki tysięcy i miliony wektorów)
+#
+# Domyślny indeks "flat" porównuje zapytanie z KAŻDYM wektorem. Przy milionach fragmentów
+# to zbyt wolno i zajmuje zbyt dużo pamięci, dlatego można wybrać `index_type`:
+#   * "ivf_flat" – wektory są dzielone na `nlist` grup (k-means). Zapytanie przeszukuje tylko
+#                  `nprobe` najbliższych grup zamiast całej bazy.
+#   * "ivf_pq"   – jak wyżej, ale każdy wektor jest dodatkowo kompresowany (Product Quantization)
+#                  do `pq_m` kodów po `pq_bits` bitów, np. 1536 * 4 B = 6 KB -> 64 B.
+# Oba wymagają kroku "trenowania" (k-means i słowniki PQ) na próbce korpusu. Wytrenowany,
+# pusty indeks zapisujemy osobno (trained.faiss), więc po zmianie dokumentów trening jest pomijany.
+# K-means potrzebuje co najmniej 39 wektorów na grupę, dlatego dla małych korpusów (np. tych
+# z lekcji) `load_or_build_faiss` zamiast IVF buduje po prostu indeks "flat".
+#
+# Indeks IVF wczytany z dysku przez mmap jest TYLKO DO ODCZYTU – FAISS nie pozwala dopisywać
+# wektorów do list zmapowanych z pliku. Jeśli chcesz potem wywołać `add_documents`, wczytaj
+# indeks z `writable=True` (cały trafi wtedy do RAM).
+#
+#     vectorstore = load_or_build_faiss(documents, embeddings, name="ustawy", index_type="ivf_pq",
+#                                       nlist=1024, nprobe=16, pq_m=64)
+#
+# Porównanie szybkości, pamięci i trafności z indeksem "flat": `python faiss_benchmark.py`.
+import hashlib
+import json
+import math
+import os
+import time
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+INDEX_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "faiss_indexes")
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq")
+# Poniżej tylu wektorów na centroid FAISS ostrzega, że k-means jest niedotrenowany.
+MIN_POINTS_PER_CENTROID = 39
+
+
+def default_nlist(count):
+    """
+    Popularna reguła: liczba grup IVF rzędu 4 * pierwiastek z liczby wektorów – ale nie
+    więcej niż count / 39, żeby każda grupa miała dość wektorów do treningu.
+    """
+    return max(1, min(int(4 * math.sqrt(count)), count // MIN_POINTS_PER_CENTROID))
+
+
+def min_training_size(index_type, nlist, pq_bits=8):
+    """Najmniejsza liczba wektorów, na której indeks da się wytrenować bez ostrzeżeń FAISS."""
+    if index_type == "flat":
+        return 0
+    centroids = max(nlist, 2 ** pq_bits) if index_type == "ivf_pq" else nlist
+    return MIN_POINTS_PER_CENTROID * centroids
+
+
+def index_factory_string(index_type, nlist=None, pq_m=16, pq_bits=8):
+    """Opis indeksu w notacji `faiss.index_factory`, np. "IVF1024,PQ64x8"."""
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if index_type == "ivf_pq":
+        return f"IVF{nlist},PQ{pq_m}x{pq_bits}"
+    raise ValueError(f"Nieznany typ indeksu: {index_type} (dostępne: {', '.join(INDEX_TYPES)})")
+
+
+def train_index(vectors, index_type, nlist=None, pq_m=16, pq_bits=8, train_size=None, seed=0):
+    """
+    Tworzy pusty indeks danego typu i trenuje go na losowej próbce wektorów.
+    Domyślna próbka to ok. 50 wektorów na grupę IVF (FAISS ostrzega, gdy jest ich mniej niż 39).
+    """
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    nlist = nlist or default_nlist(len(vectors))
+    index = faiss.index_factory(vectors.shape[1], index_factory_string(index_type, nlist, pq_m, pq_bits), faiss.METRIC_L2)
+    if index.is_trained:
+        return index
+    if len(vectors) < nlist:
+        raise ValueError(f"Za mało wektorów ({len(vectors)}) do wytrenowania {nlist} grup IVF – użyj mniejszego nlist lub indeksu 'flat'.")
+    sample_size = min(len(vectors), train_size or max(50 * nlist, 2 ** pq_bits * 40))
+    sample = vectors[np.random.default_rng(seed).choice(len(vectors), sample_size, replace=False)]
+    started_at = time.time()
+    index.train(sample)
+    print(f"Wytrenowano indeks {index_factory_string(index_type, nlist, pq_m, pq_bits)} na {sample_size} wektorach "
+          f"w {time.time() - started_at:.1f} s.")
+    return index
+
+
+def set_nprobe(index, nprobe):
+    """Ustawia, ile grup IVF przeszukuje zapytanie (więcej = trafniej, ale wolniej); indeks flat pomija."""
+    try:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    except RuntimeError:
+        pass
+
+
+def corpus_fingerprint(documents, embeddings):
+    """Skrót opisujący korpus i model embeddingów – zmienia się, gdy zmieni się którykolwiek z nich."""
+    digest = hashlib.sha256()
+    model = getattr(embeddings, "model", None) or type(embeddings).__name__
+    digest.update(str(model).encode("utf-8"))
+    for doc in documents:
+        digest.update(b"\0")
+        digest.update(doc.page_content.encode("utf-8"))
+        digest.update(json.dumps(doc.metadata, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _read_manifest(path):
+    try:
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_faiss(vectorstore, path, fingerprint, config=None):
+    """Zapisuje indeks, dokumenty i mapę identyfikatorów; manifest powstaje na końcu, jako znak kompletnego zapisu."""
+    os.makedirs(path, exist_ok=True)
+    faiss.write_index(vectorstore.index, os.path.join(path, "index.faiss"))
+    ids = [vectorstore.index_to_docstore_id[i] for i in range(vectorstore.index.ntotal)]
+    documents = {}
+    for doc_id in ids:
+        doc = vectorstore.docstore.search(doc_id)
+        documents[doc_id] = {"page_content": doc.page_content, "metadata": doc.metadata}
+    with open(os.path.join(path, "docstore.json"), "w", encoding="utf-8") as f:
+        json.dump({"ids": ids, "documents": documents}, f, ensure_ascii=False)
+    manifest = {"fingerprint": fingerprint, "config": config or {"index_type": "flat"},
+                "count": len(ids), "created_at": time.time()}
+    with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+
+class ReadOnlyFAISS(FAISS):
+    """Indeks IVF wczytany przez mmap – zamiast niejasnego błędu FAISS przy zapisie zgłasza czytelny komunikat."""
+
+    def _read_only(self, *args, **kwargs):
+        raise RuntimeError("Indeks IVF wczytany przez mmap jest tylko do odczytu – "
+                           "wczytaj go z writable=True, aby dodawać lub usuwać dokumenty.")
+
+    add_texts = add_embeddings = delete = merge_from = _read_only
+
+
+def load_faiss(path, embeddings, writable=False):
+    """
+    Wczytuje indeks zapisany przez `save_faiss`. Domyślnie wektory są mapowane z pliku
+    (mmap), a nie kopiowane do RAM; indeks IVF jest wtedy tylko do odczytu.
+    `writable=True` wczytuje cały indeks do pamięci, żeby można go było modyfikować.
+    """
+    index = faiss.read_index(os.path.join(path, "index.faiss"), 0 if writable else faiss.IO_FLAG_MMAP)
+    with open(os.path.join(path, "docstore.json"), encoding="utf-8") as f:
+        data = json.load(f)
+    docstore = InMemoryDocstore({
+        doc_id: Document(page_content=doc["page_content"], metadata=doc["metadata"])
+        for doc_id, doc in data["documents"].items()
+    })
+    is_ivf = isinstance(faiss.try_extract_index_ivf(index), faiss.IndexIVF)
+    store_class = ReadOnlyFAISS if is_ivf and not writable else FAISS
+    return store_class(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=dict(enumerate(data["ids"])),
+    )
+
+
+def _build_trained(documents, embeddings, path, config):
+    """Buduje indeks IVF: embeduje dokumenty, trenuje (albo wczytuje wytrenowany) indeks i dodaje wektory."""
+    vectors = np.asarray(embeddings.embed_documents([doc.page_content for doc in documents]), dtype="float32")
+    trained_path = os.path.join(path, "trained.faiss")
+    trained_manifest = _read_manifest(path) or {}
+    if os.path.exists(trained_path) and trained_manifest.get("config") == config:
+        print("Używam zapisanego, wytrenowanego indeksu (pomijam trening).")
+        index = faiss.read_index(trained_path)
+    else:
+        index = train_index(vectors, config["index_type"], config["nlist"], config["pq_m"], config["pq_bits"])
+        os.makedirs(path, exist_ok=True)
+        faiss.write_index(index, trained_path)
+    index.add(vectors)
+
+    ids = [str(i) for i in range(len(documents))]
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=InMemoryDocstore(dict(zip(ids, documents))),
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+
+
+def load_or_build_faiss(documents, embeddings, name, index_dir=INDEX_DIR,
+                        index_type="flat", nlist=None, nprobe=8, pq_m=16, pq_bits=8, writable=False):
+    """
+    Zwraca indeks FAISS dla dokumentów: z dysku, jeśli korpus się nie zmienił, w przeciwnym razie buduje go i zapisuje.
+    Dla korpusu zbyt małego do wytrenowania IVF buduje indeks "flat". `writable=True` – zob. `load_faiss`.
+    """
+    path = os.path.join(index_dir, name)
+    fingerprint = corpus_fingerprint(documents, embeddings)
+    nlist = nlist or default_nlist(len(documents))
+    if index_type != "flat" and len(documents) < min_training_size(index_type, nlist, pq_bits):
+        print(f"Korpus ({len(documents)} dokumentów) jest za mały do wytrenowania indeksu {index_type} "
+              f"(potrzeba co najmniej {min_training_size(index_type, nlist, pq_bits)}) – buduję indeks 'flat'.")
+        index_type = "flat"
+    config = {"index_type": index_type}
+    if index_type != "flat":
+        config.update(nlist=nlist, pq_m=pq_m, pq_bits=pq_bits)
+
+    manifest = _read_manifest(path)
+    if manifest is not None and manifest.get("fingerprint") == fingerprint and manifest.get("config") == config:
+        print(f"Wczytuję zapisany indeks FAISS '{name}' ({manifest['count']} wektorów).")
+        vectorstore = load_faiss(path, embeddings, writable)
+        set_nprobe(vectorstore.index, nprobe)
+        return vectorstore
+
+    print(f"Buduję indeks FAISS '{name}' ({len(documents)} dokumentów) i zapisuję go na dysku...")
+    if index_type == "flat":
+        vectorstore = FAISS.from_documents(documents, embeddings)
+    else:
+        vectorstore = _build_trained(documents, embeddings, path, config)
+        set_nprobe(vectorstore.index, nprobe)
+    save_faiss(vectorstore, path, fingerprint, config)
+    return vectorstore
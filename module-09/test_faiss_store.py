@@ -0,0 +1,109 @@
+# Testy modułu pomocniczego faiss_store.py: ponowne użycie zapisanego indeksu FAISS i indeksy IVF
+#
+# Uruchomienie (z folderu module-09):
+#     python -m pytest -q test_faiss_store.py
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import faiss
+import pytest
+
+from faiss_store import ReadOnlyFAISS, corpus_fingerprint, load_or_build_faiss
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Embeddingi testowe, które liczą teksty wysłane do modelu."""
+
+    embedded: int = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+def documents(count, prefix="Dokument"):
+    return [Document(page_content=f"{prefix} {i} o ochronie danych", metadata={"source": f"doc{i}"}) for i in range(count)]
+
+
+class NamedEmbeddings(DeterministicFakeEmbedding):
+    """Embeddingi testowe z nazwą modelu, jak `OpenAIEmbeddings.model`."""
+
+    model: str = "text-embedding-3-small"
+
+
+# Test 1: odcisk palca zależy od treści, metadanych i modelu embeddingów
+def test_odcisk_palca():
+    docs = documents(3)
+    embeddings = NamedEmbeddings(size=8)
+    assert corpus_fingerprint(docs, embeddings) == corpus_fingerprint(documents(3), embeddings)
+    changed = documents(3)
+    changed[1].metadata["source"] = "inny"
+    assert corpus_fingerprint(changed, embeddings) != corpus_fingerprint(docs, embeddings)
+    assert corpus_fingerprint(documents(3, "Tekst"), embeddings) != corpus_fingerprint(docs, embeddings)
+    assert corpus_fingerprint(docs, NamedEmbeddings(size=8, model="text-embedding-3-large")) != \
+           corpus_fingerprint(docs, embeddings)
+
+
+# Test 2: ten sam korpus jest wczytywany z dysku bez ponownego embedowania, zmieniony – budowany od nowa
+def test_ponowne_uzycie_indeksu(tmp_path):
+    embeddings = CountingEmbeddings(size=16)
+    docs = documents(20)
+    built = load_or_build_faiss(docs, embeddings, name="test", index_dir=str(tmp_path))
+    assert embeddings.embedded == 20
+    assert (tmp_path / "test" / "manifest.json").exists()
+
+    loaded = load_or_build_faiss(documents(20), embeddings, name="test", index_dir=str(tmp_path))
+    assert embeddings.embedded == 20
+    query = embeddings.embed_query("Dokument 7 o ochronie danych")
+    assert [doc.page_content for doc in loaded.similarity_search_by_vector(query, k=3)] == \
+           [doc.page_content for doc in built.similarity_search_by_vector(query, k=3)]
+    assert loaded.similarity_search_by_vector(query, k=1)[0].metadata == {"source": "doc7"}
+
+    docs[3] = Document(page_content="Zmieniona treść", metadata={"source": "doc3"})
+    rebuilt = load_or_build_faiss(docs, embeddings, name="test", index_dir=str(tmp_path))
+    assert embeddings.embedded == 40
+    assert rebuilt.index.ntotal == 20
+
+
+# Test 3: indeks IVF wczytany przez mmap jest tylko do odczytu, a writable=True pozwala go zmieniać
+def test_ivf_tylko_do_odczytu(tmp_path):
+    embeddings = CountingEmbeddings(size=16)
+    docs = documents(1000)
+    built = load_or_build_faiss(docs, embeddings, name="ivf", index_dir=str(tmp_path), index_type="ivf_flat", nprobe=4)
+    assert type(built) is FAISS
+    assert faiss.extract_index_ivf(built.index).nprobe == 4
+
+    loaded = load_or_build_faiss(docs, embeddings, name="ivf", index_dir=str(tmp_path), index_type="ivf_flat", nprobe=4)
+    assert isinstance(loaded, ReadOnlyFAISS)
+    assert embeddings.embedded == 1000
+    query = embeddings.embed_query("Dokument 5 o ochronie danych")
+    assert loaded.similarity_search_by_vector(query, k=1)[0].page_content == "Dokument 5 o ochronie danych"
+    with pytest.raises(RuntimeError, match="tylko do odczytu"):
+        loaded.add_texts(["Nowy dokument"])
+
+    writable = load_or_build_faiss(docs, embeddings, name="ivf", index_dir=str(tmp_path), index_type="ivf_flat",
+                                   writable=True)
+    assert type(writable) is FAISS
+    writable.add_texts(["Nowy dokument"])
+    assert writable.index.ntotal == 1001
+
+
+# Test 4: po zmianie korpusu wytrenowany indeks jest używany ponownie, a za mały korpus dostaje indeks flat
+def test_ivf_trening_i_maly_korpus(tmp_path, capsys):
+    embeddings = CountingEmbeddings(size=16)
+    docs = documents(1000)
+    load_or_build_faiss(docs, embeddings, name="ivf", index_dir=str(tmp_path), index_type="ivf_flat")
+    assert "Wytrenowano indeks" in capsys.readouterr().out
+
+    docs[0] = Document(page_content="Zmieniona treść", metadata={"source": "doc0"})
+    rebuilt = load_or_build_faiss(docs, embeddings, name="ivf", index_dir=str(tmp_path), index_type="ivf_flat")
+    output = capsys.readouterr().out
+    assert "pomijam trening" in output and "Wytrenowano" not in output
+    assert rebuilt.index.ntotal == 1000
+
+    small = load_or_build_faiss(documents(50), embeddings, name="maly", index_dir=str(tmp_path), index_type="ivf_pq")
+    assert "za mały" in capsys.readouterr().out
+    assert faiss.try_extract_index_ivf(small.index) is None
+    assert type(load_or_build_faiss(documents(50), embeddings, name="maly", index_dir=str(tmp_path),
+                                    index_type="ivf_pq")) is FAISS
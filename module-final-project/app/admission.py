@@ -0,0 +1,188 @@
+# Kontrola dopuszczania zapytań do API według planu klienta
+
+"""
+Ten plik decyduje, które zapytanie do `/ask` może teraz wejść do potoku RAG,
+a które musi poczekać w kolejce.
+
+Każdy plan klienta (tier) ma własną kolejkę, wagę i limit równoległych
+zapytań. Wolne miejsca są przydzielane metodą ważonego sprawiedliwego
+kolejkowania (WFQ): zapytania planu o większej wadze dostają proporcjonalnie
+więcej miejsc, a limit na plan sprawia, że nagły wzrost ruchu w planie
+darmowym nie zajmie całej przepustowości i nie wydłuży odpowiedzi klientom
+premium.
+"""
+from app import metrics
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+import os
+import threading
+import time
+
+# Konfiguracja planów: waga w kolejkowaniu, limit równoległych zapytań i maksymalna długość kolejki.
+TIERS = {
+    "premium": {"weight": 8, "max_concurrency": 12, "max_queue": 100},
+    "standard": {"weight": 3, "max_concurrency": 8, "max_queue": 50},
+    "free": {"weight": 1, "max_concurrency": 4, "max_queue": 20},
+}
+DEFAULT_TIER = "free"
+
+MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "16"))
+QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "30"))
+# Bez rejestru kluczy API plan klienta mógłby pochodzić tylko z nagłówka X-Customer-Plan, który
+# ustawia sam klient. Ufamy mu wyłącznie za zaufanym proxy, które ten nagłówek nadpisuje.
+TRUST_PLAN_HEADER = os.getenv("ADMISSION_TRUST_PLAN_HEADER", "0") == "1"
+
+
+class AdmissionRejected(Exception):
+    """Zapytanie nie zostało dopuszczone (pełna kolejka lub zbyt długie oczekiwanie)."""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _Ticket:
+    __slots__ = ("tier", "tag", "granted", "wake")
+
+    def __init__(self, tier: str, tag: float, wake):
+        self.tier = tier
+        self.tag = tag
+        self.granted = False
+        # Wywoływane (pod blokadą kontrolera), gdy zapytanie dostanie miejsce.
+        self.wake = wake
+
+
+class AdmissionController:
+    """
+    Kolejki per plan z ważonym sprawiedliwym przydziałem wolnych miejsc.
+
+    Miejsca przydziela ten, kto zmienia stan kontrolera (nowe zapytanie albo
+    zwolnienie miejsca), a oczekujący tylko czeka na sygnał. Dzięki temu to
+    samo sterowanie obsługuje wątki (`admit`) i pętlę asyncio (`admit_async`),
+    w której czekające zapytanie nie zajmuje wątku z puli serwera.
+    """
+
+    def __init__(self, tiers: dict = TIERS, max_concurrency: int = MAX_CONCURRENCY):
+        self.tiers = tiers
+        self.max_concurrency = max_concurrency
+        self.active = {name: 0 for name in tiers}
+        self.waiting = {name: [] for name in tiers}
+        self._last_tag = {name: 0.0 for name in tiers}
+        self._virtual_time = 0.0
+        self._total_active = 0
+        self._lock = threading.Lock()
+
+    def _eligible(self, tier: str) -> bool:
+        return (self._total_active < self.max_concurrency
+                and self.active[tier] < self.tiers[tier]["max_concurrency"])
+
+    def _next_ticket(self):
+        """Zwraca oczekujące zapytanie z najmniejszym znacznikiem wirtualnego czasu."""
+        candidates = [queue[0] for tier, queue in self.waiting.items() if queue and self._eligible(tier)]
+        return min(candidates, key=lambda t: t.tag, default=None)
+
+    def _update_gauges(self, tier: str):
+        metrics.set_gauge(f"admission.queue_depth.{tier}", len(self.waiting[tier]))
+        metrics.set_gauge(f"admission.active.{tier}", self.active[tier])
+
+    def _enqueue(self, tier: str, wake) -> _Ticket:
+        """Ustawia zapytanie w kolejce planu (albo odrzuca je, gdy kolejka jest pełna)."""
+        config = self.tiers[tier]
+        with self._lock:
+            if len(self.waiting[tier]) >= config["max_queue"]:
+                metrics.incr(f"admission.rejected.{tier}")
+                raise AdmissionRejected("Kolejka zapytań dla tego planu jest pełna. Spróbuj ponownie za chwilę.", 429)
+            # Znacznik WFQ: im większa waga planu, tym mniejszy przyrost i tym wcześniej zapytanie wejdzie.
+            tag = max(self._virtual_time, self._last_tag[tier]) + 1 / config["weight"]
+            self._last_tag[tier] = tag
+            ticket = _Ticket(tier, tag, wake)
+            self.waiting[tier].append(ticket)
+            self._update_gauges(tier)
+            self._dispatch()
+        return ticket
+
+    def _dispatch(self):
+        """Przydziela wolne miejsca oczekującym w kolejności WFQ (wywoływane pod blokadą)."""
+        while True:
+            ticket = self._next_ticket()
+            if ticket is None:
+                return
+            self.waiting[ticket.tier].remove(ticket)
+            self._virtual_time = max(self._virtual_time, ticket.tag)
+            self.active[ticket.tier] += 1
+            self._total_active += 1
+            ticket.granted = True
+            self._update_gauges(ticket.tier)
+            ticket.wake()
+
+    def _abandon(self, ticket: _Ticket) -> bool:
+        """Wycofuje zapytanie, którego czas oczekiwania minął; False, jeśli zdążyło dostać miejsce."""
+        with self._lock:
+            if ticket.granted:
+                return False
+            self.waiting[ticket.tier].remove(ticket)
+            self._update_gauges(ticket.tier)
+            self._dispatch()
+        metrics.incr(f"admission.timeouts.{ticket.tier}")
+        return True
+
+    def _release(self, tier: str):
+        with self._lock:
+            self.active[tier] -= 1
+            self._total_active -= 1
+            self._update_gauges(tier)
+            self._dispatch()
+
+    def _rejected_timeout(self):
+        return AdmissionRejected("Serwer jest przeciążony – przekroczono czas oczekiwania w kolejce.", 503)
+
+    @contextmanager
+    def admit(self, tier: str, timeout: float = QUEUE_TIMEOUT_S):
+        """Czeka (blokując wątek) na wolne miejsce dla zapytania z danego planu i zwalnia je po zakończeniu."""
+        started_at = time.monotonic()
+        event = threading.Event()
+        ticket = self._enqueue(tier, event.set)
+        if not event.wait(timeout) and self._abandon(ticket):
+            raise self._rejected_timeout()
+        metrics.observe(f"admission.wait_s.{tier}", time.monotonic() - started_at)
+        try:
+            yield
+        finally:
+            self._release(tier)
+
+    @asynccontextmanager
+    async def admit_async(self, tier: str, timeout: float = QUEUE_TIMEOUT_S):
+        """Jak `admit`, ale czeka w pętli asyncio, nie zajmując wątku."""
+        started_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        ticket = self._enqueue(tier, lambda: loop.call_soon_threadsafe(event.set))
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            if self._abandon(ticket):
+                raise self._rejected_timeout() from None
+        except BaseException:
+            # Klient się rozłączył (anulowanie) – miejsce w kolejce lub przydzielone miejsce trzeba oddać.
+            if not self._abandon(ticket):
+                self._release(tier)
+            raise
+        metrics.observe(f"admission.wait_s.{tier}", time.monotonic() - started_at)
+        try:
+            yield
+        finally:
+            self._release(tier)
+
+
+def resolve_tier(plan: str = None) -> str:
+    """Zamienia nazwę planu na znany tier (nieznane plany traktujemy jak darmowy)."""
+    plan = (plan or "").strip().lower()
+    return plan if plan in TIERS else DEFAULT_TIER
+
+
+_controller = AdmissionController()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Zwraca kontroler współdzielony przez cały proces API."""
+    return _controller
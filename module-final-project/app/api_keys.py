@@ -0,0 +1,222 @@
+# Rejestr kluczy API dla wielu klientów z limitami per klucz
+
+"""
+Ten plik zastępuje pojedynczy klucz API ze zmiennej środowiskowej rejestrem
+tysięcy kluczy klientów.
+
+- Klucze trzymamy w SQLite wyłącznie jako skróty HMAC-SHA256 (z opcjonalnym
+  "pieprzem" z API_KEY_PEPPER) – wyciek bazy nie ujawnia samych kluczy.
+- Przy starcie i potem okresowo rejestr wczytuje wszystkie aktywne klucze do
+  słownika w pamięci, więc sprawdzenie klucza to jedno liczenie skrótu i jedno
+  wyszukiwanie w słowniku (O(1)). Szukamy po skrócie HMAC, nie po samym
+  kluczu, więc czas wyszukiwania nie zdradza, jak bardzo podany klucz jest
+  "blisko" prawdziwego.
+- Każdy klucz ma własne wiadro z tokenami (limit zapytań na sekundę z
+  możliwością krótkiego "zrywu") oraz limit równoległych zapytań.
+
+Zarządzanie kluczami (z głównego folderu projektu):
+    python -m app.api_keys create --tenant acme --tier premium --rate 5 --burst 20 --concurrency 4
+    python -m app.api_keys revoke --prefix rodo_AbCdEfGh
+    python -m app.api_keys list
+"""
+from app.rate_limit import TokenBucket
+import argparse
+import hashlib
+import hmac
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+API_KEYS_DB = os.getenv("API_KEYS_DB")
+REFRESH_INTERVAL_S = float(os.getenv("API_KEYS_REFRESH_S", "30"))
+KEY_PREFIX = "rodo_"
+
+_PEPPER = os.getenv("API_KEY_PEPPER", "").encode("utf-8")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS api_keys (
+    key_hash TEXT PRIMARY KEY,
+    key_prefix TEXT NOT NULL,
+    tenant TEXT NOT NULL,
+    tier TEXT NOT NULL DEFAULT 'free',
+    rate_per_s REAL NOT NULL DEFAULT 1.0,
+    burst INTEGER NOT NULL DEFAULT 5,
+    max_concurrency INTEGER NOT NULL DEFAULT 2,
+    active INTEGER NOT NULL DEFAULT 1,
+    created_at REAL NOT NULL
+)
+"""
+
+
+class QuotaExceeded(Exception):
+    """Klucz przekroczył swój limit zapytań lub równoległości."""
+
+
+def hash_key(raw_key: str) -> str:
+    """Zwraca skrót klucza zapisywany w bazie (klucze są losowe, więc szybki HMAC wystarcza)."""
+    return hmac.new(_PEPPER, raw_key.encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+class KeyRecord:
+    """Dane jednego klucza w pamięci wraz z jego bieżącym stanem limitów."""
+
+    __slots__ = ("key_hash", "tenant", "tier", "bucket", "max_concurrency", "in_flight", "lock")
+
+    def __init__(self, key_hash, tenant, tier, rate_per_s, burst, max_concurrency):
+        self.key_hash = key_hash
+        self.tenant = tenant
+        self.tier = tier
+        self.bucket = TokenBucket(rate_per_s, burst)
+        self.max_concurrency = max_concurrency
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def update(self, tenant, tier, rate_per_s, burst, max_concurrency):
+        """Aktualizuje ustawienia bez kasowania bieżącego stanu wiadra i licznika zapytań."""
+        self.tenant = tenant
+        self.tier = tier
+        self.bucket.rate = rate_per_s
+        self.bucket.capacity = burst
+        self.max_concurrency = max_concurrency
+
+    def acquire(self):
+        """Zajmuje jedno zapytanie z limitu klucza; po obsłudze trzeba wywołać `release()`."""
+        with self.lock:
+            if self.in_flight >= self.max_concurrency:
+                raise QuotaExceeded("Przekroczono limit równoległych zapytań dla tego klucza API.")
+            if not self.bucket.try_consume(1):
+                raise QuotaExceeded("Przekroczono limit zapytań na sekundę dla tego klucza API.")
+            self.in_flight += 1
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+
+class ApiKeyRegistry:
+    """Słownik skrót -> KeyRecord, okresowo odświeżany z bazy SQLite."""
+
+    def __init__(self, db_path: str, refresh_interval: float = REFRESH_INTERVAL_S):
+        self.db_path = db_path
+        self.refresh_interval = refresh_interval
+        self._records = {}
+        self._stop = threading.Event()
+        with self._connect() as db:
+            db.execute(_SCHEMA)
+        self.refresh()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path)
+
+    def refresh(self):
+        """Wczytuje aktywne klucze; zachowuje stan limitów kluczy, które już znamy."""
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT key_hash, tenant, tier, rate_per_s, burst, max_concurrency FROM api_keys WHERE active = 1"
+            ).fetchall()
+        records = {}
+        for key_hash, *settings in rows:
+            record = self._records.get(key_hash)
+            if record is None:
+                record = KeyRecord(key_hash, *settings)
+            else:
+                record.update(*settings)
+            records[key_hash] = record
+        # Podmiana całego słownika jest atomowa – czytelnicy nie potrzebują blokady.
+        self._records = records
+
+    def start_background_refresh(self):
+        """Uruchamia wątek, który co `refresh_interval` sekund przeładowuje klucze."""
+        def loop():
+            while not self._stop.wait(self.refresh_interval):
+                try:
+                    self.refresh()
+                except sqlite3.Error as e:
+                    print(f"BŁĄD: Nie udało się odświeżyć rejestru kluczy API: {e}")
+        threading.Thread(target=loop, name="api-keys-refresh", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def authenticate(self, raw_key: str):
+        """Zwraca KeyRecord dla poprawnego klucza albo None."""
+        if not raw_key:
+            return None
+        return self._records.get(hash_key(raw_key))
+
+    def __len__(self):
+        return len(self._records)
+
+
+def create_key(db_path, tenant, tier="free", rate_per_s=1.0, burst=5, max_concurrency=2):
+    """Tworzy nowy klucz i zwraca go w postaci jawnej (zapisywany jest tylko skrót)."""
+    raw_key = KEY_PREFIX + secrets.token_urlsafe(32)
+    with sqlite3.connect(db_path) as db:
+        db.execute(_SCHEMA)
+        db.execute(
+            "INSERT INTO api_keys (key_hash, key_prefix, tenant, tier, rate_per_s, burst, max_concurrency, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (hash_key(raw_key), raw_key[:len(KEY_PREFIX) + 8], tenant, tier, rate_per_s, burst, max_concurrency, time.time()),
+        )
+    return raw_key
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Zwraca rejestr kluczy procesu albo None, jeśli API_KEYS_DB nie jest ustawione
+    (tryb deweloperski). API tworzy go przy starcie, więc błąd konfiguracji
+    (np. zła ścieżka bazy) zatrzymuje serwer, zamiast wrócić jako 500.
+    """
+    global _registry
+    if not API_KEYS_DB:
+        return None
+    with _registry_lock:
+        if _registry is None:
+            _registry = ApiKeyRegistry(API_KEYS_DB)
+            _registry.start_background_refresh()
+            print(f"Rejestr kluczy API załadowany: {len(_registry)} aktywnych kluczy.")
+        return _registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zarządzanie kluczami API dla RODO Ekspert AI.")
+    parser.add_argument("--db", default=API_KEYS_DB, required=API_KEYS_DB is None,
+                        help="Ścieżka do bazy SQLite z kluczami (domyślnie z API_KEYS_DB).")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    create = sub.add_parser("create", help="Utwórz nowy klucz.")
+    create.add_argument("--tenant", required=True)
+    create.add_argument("--tier", default="free")
+    create.add_argument("--rate", type=float, default=1.0, help="Zapytania na sekundę.")
+    create.add_argument("--burst", type=int, default=5, help="Maksymalny chwilowy zryw zapytań.")
+    create.add_argument("--concurrency", type=int, default=2, help="Maksymalna liczba równoległych zapytań.")
+
+    revoke = sub.add_parser("revoke", help="Dezaktywuj klucz po jego prefiksie.")
+    revoke.add_argument("--prefix", required=True)
+
+    sub.add_parser("list", help="Wypisz klucze (bez ich wartości).")
+    args = parser.parse_args()
+
+    if args.command == "create":
+        raw_key = create_key(args.db, args.tenant, args.tier, args.rate, args.burst, args.concurrency)
+        print("Nowy klucz API (zapisz go teraz – nie będzie można go odczytać ponownie):")
+        print(raw_key)
+    elif args.command == "revoke":
+        with sqlite3.connect(args.db) as db:
+            changed = db.execute("UPDATE api_keys SET active = 0 WHERE key_prefix = ?", (args.prefix,)).rowcount
+        print(f"Dezaktywowano kluczy: {changed}")
+    else:
+        with sqlite3.connect(args.db) as db:
+            db.execute(_SCHEMA)
+            for row in db.execute("SELECT key_prefix, tenant, tier, rate_per_s, burst, max_concurrency, active FROM api_keys"):
+                print(" | ".join(str(value) for value in row))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+# Warstwa nagrywania i odtwarzania wywołań LLM oraz embeddingów ("kasety")
+
+"""
+Ten plik pozwala uruchamiać aplikację i benchmarki bez dostępu do API OpenAI.
+
+W trybie `record` każde wywołanie modelu czatu lub modelu embeddingowego jest
+przekazywane do prawdziwego dostawcy, a para zapytanie/odpowiedź – razem ze
+zmierzonym czasem odpowiedzi i znacznikami czasu kolejnych fragmentów
+strumienia – trafia do skompresowanego pliku JSONL (kasety).
+
+W trybie `replay` odpowiedzi są serwowane lokalnie z kasety: natychmiast
+(`instant`) albo z zachowaniem nagranych opóźnień (`recorded`). Dzięki temu
+można precyzyjnie mierzyć narzut własnego kodu, bez szumu po stronie dostawcy.
+
+Konfiguracja przez zmienne środowiskowe:
+    LLM_CASSETTE_MODE   = off | record | replay   (domyślnie: off)
+    LLM_CASSETTE_PATH   = ścieżka do pliku kasety (.jsonl.gz)
+    LLM_CASSETTE_TIMING = instant | recorded      (domyślnie: instant)
+"""
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from typing import Any
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+CASSETTE_PATH = os.path.join(os.path.dirname(__file__), '..', 'cache', 'cassettes', 'default.jsonl.gz')
+
+MODES = ("off", "record", "replay")
+TIMINGS = ("instant", "recorded")
+
+
+class CassetteMiss(KeyError):
+    """Zgłaszany w trybie replay, gdy kaseta nie zawiera danego wywołania."""
+
+
+class Cassette:
+    """Plik z nagranymi wywołaniami, indeksowany skrótem zapytania."""
+
+    def __init__(self, path: str = CASSETTE_PATH, mode: str = "replay", timing: str = "instant"):
+        if mode not in MODES:
+            raise ValueError(f"Nieznany tryb kasety: {mode}. Dozwolone: {', '.join(MODES)}")
+        if timing not in TIMINGS:
+            raise ValueError(f"Nieznany tryb odtwarzania: {timing}. Dozwolone: {', '.join(TIMINGS)}")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            # Każde dopisanie tworzy nowy człon gzip; gzip.open czyta je wszystkie po kolei.
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    entry = json.loads(line)
+                    self._entries[entry["key"]] = entry
+        elif mode == "replay":
+            raise FileNotFoundError(f"Nie znaleziono kasety do odtworzenia: {path}")
+
+    @staticmethod
+    def make_key(kind: str, payload: Any) -> str:
+        raw = json.dumps([kind, payload], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> dict:
+        try:
+            return self._entries[key]
+        except KeyError:
+            raise CassetteMiss(f"Brak nagrania dla wywołania {key[:12]}… w kasecie {self.path}") from None
+
+    def put(self, entry: dict):
+        with self._lock:
+            self._entries[entry["key"]] = entry
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def wait(self, seconds: float):
+        """W trybie `recorded` odtwarza nagrane opóźnienie."""
+        if self.timing == "recorded" and seconds > 0:
+            time.sleep(seconds)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def _messages_payload(messages, stop, params, kwargs):
+    return {
+        "messages": [[m.type, m.content] for m in messages],
+        "stop": stop,
+        "params": params,
+        "kwargs": kwargs,
+    }
+
+
+class CassetteChatModel(BaseChatModel):
+    """Model czatu, który nagrywa lub odtwarza odpowiedzi modelu `inner`."""
+
+    inner: BaseChatModel
+    cassette: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cassette-{self.inner._llm_type}"
+
+    @property
+    def _identifying_params(self):
+        return self.inner._identifying_params
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        payload = _messages_payload(messages, stop, self._identifying_params, kwargs)
+        key = Cassette.make_key("chat", payload)
+
+        if self.cassette.mode == "replay":
+            entry = self.cassette.get(key)
+            self.cassette.wait(entry["latency"])
+            message = AIMessage(content=entry["content"], response_metadata=entry.get("metadata", {}))
+            return ChatResult(generations=[ChatGeneration(message=message)])
+
+        start = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        latency = time.perf_counter() - start
+        message = result.generations[0].message
+        self.cassette.put({
+            "key": key,
+            "kind": "chat",
+            "content": message.content,
+            "metadata": message.response_metadata,
+            "latency": latency,
+        })
+        return result
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        payload = _messages_payload(messages, stop, self._identifying_params, kwargs)
+        key = Cassette.make_key("chat_stream", payload)
+
+        if self.cassette.mode == "replay":
+            entry = self.cassette.get(key)
+            elapsed = 0.0
+            for offset, text in entry["chunks"]:
+                self.cassette.wait(offset - elapsed)
+                elapsed = offset
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+                if run_manager:
+                    run_manager.on_llm_new_token(text, chunk=chunk)
+                yield chunk
+            return
+
+        start = time.perf_counter()
+        recorded = []
+        for chunk in self.inner._stream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            recorded.append([time.perf_counter() - start, chunk.message.content])
+            yield chunk
+        self.cassette.put({
+            "key": key,
+            "kind": "chat_stream",
+            "chunks": recorded,
+            "latency": time.perf_counter() - start,
+        })
+
+
+class CassetteEmbeddings(Embeddings):
+    """Model embeddingowy, który nagrywa lub odtwarza wektory modelu `inner`."""
+
+    def __init__(self, inner: Embeddings, cassette: Cassette):
+        self.inner = inner
+        self.cassette = cassette
+        self.model = getattr(inner, "model", type(inner).__name__)
+
+    def _call(self, kind, payload, compute):
+        key = Cassette.make_key(kind, {"model": self.model, "input": payload})
+        if self.cassette.mode == "replay":
+            entry = self.cassette.get(key)
+            self.cassette.wait(entry["latency"])
+            return entry["vectors"]
+
+        start = time.perf_counter()
+        vectors = compute()
+        self.cassette.put({
+            "key": key,
+            "kind": kind,
+            "vectors": vectors,
+            "latency": time.perf_counter() - start,
+        })
+        return vectors
+
+    def embed_documents(self, texts):
+        return self._call("embed_documents", texts, lambda: self.inner.embed_documents(texts))
+
+    def embed_query(self, text):
+        return self._call("embed_query", text, lambda: self.inner.embed_query(text))
+
+
+_cassette = None
+
+
+def get_cassette():
+    """Zwraca współdzieloną kasetę skonfigurowaną zmiennymi środowiskowymi (albo None)."""
+    global _cassette
+    mode = os.getenv("LLM_CASSETTE_MODE", "off")
+    if mode == "off":
+        return None
+    if _cassette is None:
+        _cassette = Cassette(
+            path=os.getenv("LLM_CASSETTE_PATH", CASSETTE_PATH),
+            mode=mode,
+            timing=os.getenv("LLM_CASSETTE_TIMING", "instant"),
+        )
+        print(f"Kaseta LLM w trybie '{mode}': {_cassette.path} ({len(_cassette)} nagrań)")
+    return _cassette
+
+
+def wrap_llm(llm: BaseChatModel) -> BaseChatModel:
+    """Opakowuje model czatu w kasetę, jeśli jest włączona."""
+    cassette = get_cassette()
+    return CassetteChatModel(inner=llm, cassette=cassette) if cassette else llm
+
+
+def wrap_embeddings(embeddings: Embeddings) -> Embeddings:
+    """Opakowuje model embeddingowy w kasetę, jeśli jest włączona."""
+    cassette = get_cassette()
+    return CassetteEmbeddings(embeddings, cassette) if cassette else embeddings
@@ -0,0 +1,231 @@
+# Ograniczona pamięć rozmów dla endpointu /chat
+
+"""
+Ten plik przechowuje historię rozmów prowadzonych przez endpoint `/chat`.
+
+- Sesje trzymamy w pamięci w strukturze LRU (`OrderedDict`). Gdy sesji jest
+  więcej niż CHAT_MAX_SESSIONS, najdawniej używane są zrzucane na dysk
+  (SQLite) i wczytywane z powrotem przy kolejnym pytaniu w tej sesji.
+- Sesja pobrana przez `get` jest "przypięta", dopóki zapytanie (i zwijanie
+  historii w tle) nie odda jej przez `release` – przypiętej sesji nie
+  wypieramy, więc kolejne zapytanie w tej sesji nie wczyta z dysku drugiej,
+  nieaktualnej kopii, która nadpisałaby nowe wiadomości.
+- Sesje nieużywane dłużej niż CHAT_SESSION_TTL_S są usuwane z pamięci i z
+  dysku (sprawdzane co CHAT_PRUNE_INTERVAL_S).
+- Identyfikator sesji wybiera klient, dlatego przy włączonych kluczach API
+  sesje są trzymane osobno dla każdego klucza – znajomość cudzego
+  identyfikatora nie daje dostępu do cudzej historii.
+- Gdy historia sesji przekroczy próg tokenów, starsze wymiany są zwijane
+  przez LLM do krótkiego, kroczącego podsumowania; dosłownie zostaje tylko
+  kilka ostatnich wiadomości.
+
+Dzięki temu pamięć jednej sesji i rozmiar promptu są ograniczone niezależnie
+od długości rozmowy.
+"""
+from app.rate_limit import estimate_tokens
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+SESSIONS_DB = os.path.join(os.path.dirname(__file__), '..', 'cache', 'chat_sessions.sqlite')
+
+MAX_SESSIONS_IN_MEMORY = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+SESSION_TTL_S = float(os.getenv("CHAT_SESSION_TTL_S", str(7 * 24 * 3600)))
+PRUNE_INTERVAL_S = float(os.getenv("CHAT_PRUNE_INTERVAL_S", "3600"))
+SUMMARY_THRESHOLD_TOKENS = int(os.getenv("CHAT_SUMMARY_THRESHOLD_TOKENS", "1500"))
+KEEP_RECENT_MESSAGES = int(os.getenv("CHAT_KEEP_RECENT_MESSAGES", "4"))
+MAX_MESSAGE_CHARS = 4000
+# Twardy limit wiadomości na wypadek, gdyby podsumowywanie chwilowo nie działało.
+MAX_MESSAGES = 40
+MAX_SUMMARY_CHARS = 2000
+
+SUMMARY_PROMPT_TEMPLATE = """
+Streść poniższą rozmowę użytkownika z asystentem RODO w maksymalnie 150 słowach.
+Zachowaj tematy pytań, ustalone fakty i numery artykułów, do których się odwoływano.
+Odpowiedz wyłącznie treścią podsumowania, w języku polskim.
+
+Dotychczasowe podsumowanie:
+{summary}
+
+Nowe wiadomości:
+{messages}
+
+Zaktualizowane podsumowanie:
+"""
+
+
+class ChatSession:
+    """Stan jednej rozmowy: kroczące podsumowanie i kilka ostatnich wiadomości."""
+
+    __slots__ = ("session_id", "key", "summary", "messages", "updated_at", "compacting", "pins",
+                 "retrieval_cache", "lock")
+
+    def __init__(self, session_id: str, summary: str = "", messages=None, updated_at: float = None, key: str = None):
+        self.session_id = session_id
+        # Klucz sesji w magazynie: identyfikator klienta poprzedzony właścicielem (zob. `session_key`).
+        self.key = key or session_id
+        self.summary = summary
+        self.messages = messages or []
+        self.updated_at = updated_at or time.time()
+        self.compacting = False
+        # Liczba zapytań, które używają teraz tej sesji (zob. `SessionStore.get` / `release`).
+        self.pins = 0
+        # Fragmenty z ostatniej tury (app.retrieval.RetrievalCache); trzymane tylko w pamięci.
+        self.retrieval_cache = None
+        self.lock = threading.Lock()
+
+    def add(self, role: str, content: str):
+        self.messages.append((role, content[:MAX_MESSAGE_CHARS]))
+        del self.messages[:-MAX_MESSAGES]
+        self.updated_at = time.time()
+
+    def token_count(self) -> int:
+        return estimate_tokens(self.summary) + sum(estimate_tokens(content) for _, content in self.messages)
+
+    def history_text(self) -> str:
+        """Historia w formie tekstu do wstawienia w prompt."""
+        lines = []
+        if self.summary:
+            lines.append(f"Podsumowanie wcześniejszej rozmowy: {self.summary}")
+        for role, content in self.messages:
+            lines.append(f"{'Użytkownik' if role == 'user' else 'Asystent'}: {content}")
+        return "\n".join(lines)
+
+    def to_blob(self) -> bytes:
+        data = {"summary": self.summary, "messages": self.messages, "updated_at": self.updated_at}
+        return zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    @classmethod
+    def from_blob(cls, session_id: str, blob: bytes, key: str = None) -> "ChatSession":
+        data = json.loads(zlib.decompress(blob))
+        return cls(session_id, data["summary"], [tuple(m) for m in data["messages"]], data["updated_at"], key)
+
+
+def session_key(session_id: str, owner: str = None) -> str:
+    """Klucz sesji w magazynie; `owner` (np. skrót klucza API) oddziela sesje różnych klientów."""
+    return f"{owner}:{session_id}" if owner else session_id
+
+
+class SessionStore:
+    """Sesje w pamięci (LRU) z wypieraniem najstarszych na dysk i wygasaniem nieużywanych."""
+
+    def __init__(self, db_path: str = SESSIONS_DB, max_in_memory: int = MAX_SESSIONS_IN_MEMORY,
+                 ttl_s: float = SESSION_TTL_S, prune_interval_s: float = PRUNE_INTERVAL_S):
+        self.max_in_memory = max_in_memory
+        self.ttl_s = ttl_s
+        self.prune_interval_s = prune_interval_s
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._pruned_at = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        self._db.commit()
+
+    def get(self, session_id: str, owner: str = None) -> ChatSession:
+        """
+        Zwraca sesję z pamięci, z dysku albo tworzy nową – przypiętą do czasu
+        wywołania `release`, które musi nastąpić po zakończeniu pracy z sesją.
+        """
+        key = session_key(session_id, owner)
+        with self._lock:
+            now = time.time()
+            if now - self._pruned_at >= self.prune_interval_s:
+                self._prune(now)
+            session = self._sessions.get(key)
+            if session is not None and not self._expired(session, now):
+                self._sessions.move_to_end(key)
+            else:
+                row = self._db.execute("SELECT data, updated_at FROM sessions WHERE id = ?", (key,)).fetchone()
+                if row and now - row[1] <= self.ttl_s:
+                    session = ChatSession.from_blob(session_id, row[0], key)
+                else:
+                    session = ChatSession(session_id, key=key)
+                self._sessions[key] = session
+            session.pins += 1
+            self._evict()
+            return session
+
+    def release(self, session: ChatSession):
+        """Odpina sesję pobraną przez `get` i oznacza ją jako ostatnio używaną."""
+        with self._lock:
+            session.pins -= 1
+            if self._sessions.get(session.key) is session:
+                self._sessions.move_to_end(session.key)
+            self._evict()
+
+    def _expired(self, session: ChatSession, now: float) -> bool:
+        return session.pins == 0 and now - session.updated_at > self.ttl_s
+
+    def _prune(self, now: float):
+        """Usuwa sesje nieużywane dłużej niż `ttl_s` z pamięci i z dysku."""
+        for key in [key for key, session in self._sessions.items() if self._expired(session, now)]:
+            del self._sessions[key]
+        removed = self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl_s,)).rowcount
+        self._db.commit()
+        self._pruned_at = now
+        if removed:
+            print(f"Usunięto {removed} wygasłych sesji rozmów z dysku.")
+
+    def _evict(self):
+        """Zrzuca na dysk najdawniej używane sesje ponad limit; przypiętych nie wypiera."""
+        excess = len(self._sessions) - self.max_in_memory
+        for key in list(self._sessions):
+            if excess <= 0:
+                break
+            session = self._sessions[key]
+            if session.pins:
+                continue
+            del self._sessions[key]
+            excess -= 1
+            with session.lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+                    (key, session.to_blob(), session.updated_at),
+                )
+        self._db.commit()
+
+    def flush(self):
+        """Zapisuje wszystkie sesje z pamięci na dysk (np. przy zamykaniu aplikacji)."""
+        with self._lock:
+            for key, session in self._sessions.items():
+                with session.lock:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+                        (key, session.to_blob(), session.updated_at),
+                    )
+            self._db.commit()
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+def compact_session(session: ChatSession, summarize, threshold: int = SUMMARY_THRESHOLD_TOKENS):
+    """
+    Zwija starsze wiadomości sesji do podsumowania, jeśli historia przekroczyła próg tokenów.
+    `summarize` to funkcja przyjmująca gotowy prompt i zwracająca tekst podsumowania.
+    """
+    with session.lock:
+        if session.compacting or len(session.messages) <= KEEP_RECENT_MESSAGES:
+            return False
+        if session.token_count() <= threshold:
+            return False
+        session.compacting = True
+        old = session.messages[:-KEEP_RECENT_MESSAGES]
+        summary = session.summary
+
+    try:
+        messages = "\n".join(f"{'Użytkownik' if role == 'user' else 'Asystent'}: {content}" for role, content in old)
+        new_summary = summarize(SUMMARY_PROMPT_TEMPLATE.format(summary=summary or "(brak)", messages=messages))
+        with session.lock:
+            # W międzyczasie mogły dojść nowe wiadomości – usuwamy tylko te, które zostały streszczone.
+            session.messages = session.messages[len(old):]
+            session.summary = new_summary.strip()[:MAX_SUMMARY_CHARS]
+    finally:
+        session.compacting = False
+    return True
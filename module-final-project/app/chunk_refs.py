@@ -0,0 +1,77 @@
+# Odwołania do fragmentów zamiast ich treści w odpowiedziach API (endpoint /chunks/{id})
+
+"""
+Ten plik obsługuje tryb `references` w `/ask` i `/chat`: zamiast pełnej
+treści fragmentów odpowiedź zawiera tylko ich identyfikatory, strony i
+podobieństwo do pytania. Treść klient pobiera osobno z `/chunks/{id}` –
+zwykle dopiero wtedy, gdy użytkownik chce zobaczyć źródła.
+
+Identyfikator fragmentu to skrót jego źródła, strony i treści
+(`app.sharding.chunk_id`), więc pod danym identyfikatorem zawsze kryje się ta
+sama treść. Dlatego odpowiedź `/chunks/{id}` ma silny ETag i może być
+buforowana przez klienta i pośredników praktycznie bez końca.
+
+Fragmenty zwrócone przez potok trafiają do pamięci LRU (`ChunkCache`), z
+której `/chunks/{id}` odpowiada bez dostępu do bazy wektorowej.
+"""
+from app.parent_store import parent_id
+from app.sharding import chunk_id
+from collections import OrderedDict
+import os
+import threading
+
+CHUNK_CACHE_SIZE = int(os.getenv("CHUNK_CACHE_SIZE", "10000"))
+# Treść pod danym identyfikatorem nigdy się nie zmienia (identyfikator to jej skrót).
+CHUNK_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def chunk_etag(key: str) -> str:
+    return f'"{key}"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """Czy nagłówek If-None-Match obejmuje podany ETag (także w postaci słabej W/"...")."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+class ChunkCache:
+    """Ostatnio zwrócone fragmenty (identyfikator -> Document) w pamięci LRU."""
+
+    def __init__(self, max_size: int = CHUNK_CACHE_SIZE):
+        self.max_size = max_size
+        self._docs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, doc) -> str:
+        key = chunk_id(doc)
+        with self._lock:
+            self._docs[key] = doc
+            self._docs.move_to_end(key)
+            while len(self._docs) > self.max_size:
+                self._docs.popitem(last=False)
+        return key
+
+    def get(self, key: str):
+        with self._lock:
+            doc = self._docs.get(key)
+            if doc is not None:
+                self._docs.move_to_end(key)
+            return doc
+
+    def references(self, docs, scores=None):
+        """Zapamiętuje fragmenty i zwraca ich odwołania: identyfikator, źródło, stronę i podobieństwo."""
+        scores = scores or {}
+        references = []
+        for doc in docs:
+            key = self.put(doc)
+            references.append({
+                "id": key,
+                "page": doc.metadata.get("page"),
+                "source": doc.metadata.get("source"),
+                # Strona z magazynu dokumentów nadrzędnych dziedziczy wynik najlepszego ze swoich fragmentów.
+                "score": scores.get(key, scores.get(parent_id(doc.metadata))),
+            })
+        return references
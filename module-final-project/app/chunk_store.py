@@ -0,0 +1,225 @@
+# Kolumnowy magazyn fragmentów: jeden blob tekstu z przesunięciami i tablice liczb zamiast obiektów
+
+"""
+Ten plik zawiera `ChunkStore` – zwarty zapis tekstów i metadanych fragmentów
+dla lokalnych magazynów wektorów (`LocalVectorStore`, artefakt bazy wiedzy).
+
+Zamiast milionów obiektów Pythona (napis + słownik metadanych na fragment)
+trzymamy kilka kolumn:
+
+- `text`       – teksty wszystkich fragmentów sklejone w jeden blob UTF-8,
+                 `text_offsets[i]:text_offsets[i + 1]` to fragment `i`; na
+                 dysku blob leży w blokach zstd (zob. app/text_blocks.py),
+- `ids`        – identyfikatory fragmentów, w ten sam sposób,
+- `pages`      – numer strony (int32),
+- `source_ids` – numer pliku źródłowego w tabeli `sources` (int32),
+- `extra_ids`  – numer pozostałych metadanych (np. `parent_id`, pola z PDF)
+                 w tabeli `extras`; fragmenty z tej samej strony dzielą wpis.
+
+Obiekt fragmentu (`ChunkView`, a z niego `Document` LangChain) powstaje
+dopiero dla wyników zwracanych do wywołującego. Zapisane kolumny są przy
+wczytaniu mapowane przez mmap, a z tekstu rozpakowywane są tylko bloki
+zawierające zwracane fragmenty.
+"""
+from langchain_core.documents import Document
+from app.text_blocks import CompressedText, compress_blocks
+import json
+import numpy as np
+import os
+
+# Wartość w `pages`/`source_ids`/`extra_ids` oznaczająca brak pola.
+MISSING = np.iinfo(np.int32).min
+_INT32 = np.iinfo(np.int32)
+
+
+class ChunkView:
+    """Lekki widok jednego fragmentu – czyta kolumny magazynu dopiero przy dostępie do pól."""
+
+    __slots__ = ("store", "row")
+
+    def __init__(self, store, row: int):
+        self.store = store
+        self.row = row
+
+    @property
+    def id(self) -> str:
+        return self.store.id(self.row)
+
+    @property
+    def page_content(self) -> str:
+        return self.store.text(self.row)
+
+    @property
+    def page(self):
+        page = int(self.store.pages[self.row])
+        return None if page == MISSING else page
+
+    @property
+    def source(self):
+        source = int(self.store.source_ids[self.row])
+        return None if source == MISSING else self.store.sources[source]
+
+    @property
+    def metadata(self) -> dict:
+        return self.store.metadata(self.row)
+
+    def to_document(self) -> Document:
+        return Document(page_content=self.page_content, metadata=self.metadata, id=self.id)
+
+
+def _column(blob, offsets, row: int) -> str:
+    return bytes(blob[int(offsets[row]):int(offsets[row + 1])]).decode("utf-8")
+
+
+def _pack(values):
+    """Skleja napisy w blob UTF-8 i zwraca (blob, przesunięcia końców)."""
+    encoded = [value.encode("utf-8") for value in values]
+    return b"".join(encoded), np.cumsum([len(value) for value in encoded], dtype=np.uint64)
+
+
+class ChunkStore:
+    """Teksty, identyfikatory i metadane fragmentów w kolumnach (zob. opis modułu)."""
+
+    def __init__(self):
+        self._text = bytearray()
+        self.text_offsets = np.zeros(1, dtype=np.uint64)
+        self._ids = bytearray()
+        self.id_offsets = np.zeros(1, dtype=np.uint64)
+        self.pages = np.zeros(0, dtype=np.int32)
+        self.source_ids = np.zeros(0, dtype=np.int32)
+        self.extra_ids = np.zeros(0, dtype=np.int32)
+        self.sources = []
+        self.extras = []
+        self._source_index = {}
+        self._extra_index = {}
+        self._decoded = {}
+        self._id_index = None
+
+    def __len__(self):
+        return len(self.pages)
+
+    def __getitem__(self, row: int) -> ChunkView:
+        return ChunkView(self, row)
+
+    def _table_id(self, table, index, value) -> int:
+        if value not in index:
+            index[value] = len(table)
+            table.append(value)
+        return index[value]
+
+    def extend(self, ids, texts, metadatas):
+        """Dopisuje fragmenty na koniec kolumn."""
+        pages, source_ids, extra_ids = [], [], []
+        for metadata in metadatas:
+            extra = dict(metadata)
+            page, source = extra.get("page"), extra.get("source")
+            # Do kolumn liczbowych trafiają tylko wartości, które da się odtworzyć bez zmiany typu.
+            if isinstance(page, int) and not isinstance(page, bool) and _INT32.min < page <= _INT32.max:
+                pages.append(extra.pop("page"))
+            else:
+                pages.append(MISSING)
+            if isinstance(source, str):
+                source_ids.append(self._table_id(self.sources, self._source_index, extra.pop("source")))
+            else:
+                source_ids.append(MISSING)
+            extra_ids.append(self._table_id(self.extras, self._extra_index,
+                                            json.dumps(extra, ensure_ascii=False, sort_keys=True))
+                             if extra else MISSING)
+        # Po wczytaniu z dysku kolumny są tylko do odczytu (mmap) – dopisanie robi z nich kopie w pamięci.
+        if not isinstance(self._text, bytearray):
+            self._text, self._ids = bytearray(self._text[0:len(self._text)]), bytearray(self._ids)
+        for blob, name, values in ((self._text, "text_offsets", texts), (self._ids, "id_offsets", ids)):
+            packed, ends = _pack(values)
+            offsets = getattr(self, name)
+            setattr(self, name, np.concatenate([offsets, ends + offsets[-1]]))
+            blob.extend(packed)
+        self.pages = np.concatenate([self.pages, np.asarray(pages, dtype=np.int32)])
+        self.source_ids = np.concatenate([self.source_ids, np.asarray(source_ids, dtype=np.int32)])
+        self.extra_ids = np.concatenate([self.extra_ids, np.asarray(extra_ids, dtype=np.int32)])
+        self._id_index = None
+
+    def text(self, row: int) -> str:
+        return _column(self._text, self.text_offsets, row)
+
+    def id(self, row: int) -> str:
+        return _column(self._ids, self.id_offsets, row)
+
+    def metadata(self, row: int) -> dict:
+        metadata = {}
+        source, page, extra = int(self.source_ids[row]), int(self.pages[row]), int(self.extra_ids[row])
+        if source != MISSING:
+            metadata["source"] = self.sources[source]
+        if page != MISSING:
+            metadata["page"] = page
+        if extra != MISSING:
+            if extra not in self._decoded:
+                self._decoded[extra] = json.loads(self.extras[extra])
+            metadata.update(self._decoded[extra])
+        return metadata
+
+    def document(self, row: int) -> Document:
+        return self[row].to_document()
+
+    def find(self, ids):
+        """Wiersze fragmentów o podanych identyfikatorach (pominięte te, których nie ma)."""
+        if self._id_index is None:
+            # Posortowana tablica bajtów zamiast słownika – bez obiektu Pythona na każdy fragment.
+            keys = np.array([doc_id.encode("utf-8") for doc_id in self.ids()], dtype=bytes)
+            order = np.argsort(keys, kind="stable")
+            self._id_index = (keys[order], order)
+        keys, order = self._id_index
+        rows = []
+        for doc_id in ids:
+            key = doc_id.encode("utf-8")
+            position = int(np.searchsorted(keys, key))
+            if position < len(keys) and keys[position] == key:
+                rows.append(int(order[position]))
+        return rows
+
+    def ids(self):
+        return (self.id(row) for row in range(len(self)))
+
+    def texts(self):
+        return (self.text(row) for row in range(len(self)))
+
+    def metadatas(self):
+        return (self.metadata(row) for row in range(len(self)))
+
+    @property
+    def nbytes(self) -> int:
+        """Rozmiar kolumn i tabel w bajtach (tekst po wczytaniu z dysku – w postaci skompresowanej)."""
+        text = self._text.nbytes if isinstance(self._text, CompressedText) else len(self._text)
+        return (text + len(self._ids) + self.text_offsets.nbytes + self.id_offsets.nbytes
+                + self.pages.nbytes + self.source_ids.nbytes + self.extra_ids.nbytes
+                + sum(len(value.encode("utf-8")) for value in self.sources + self.extras))
+
+    def save(self, path: str):
+        data, index = compress_blocks(self._text, self.text_offsets)
+        np.save(os.path.join(path, "chunk_text_blocks.u8.npy"), np.frombuffer(data, dtype=np.uint8))
+        np.save(os.path.join(path, "chunk_text_block_index.u64.npy"), index)
+        np.save(os.path.join(path, "chunk_text_offsets.u64.npy"), self.text_offsets)
+        np.save(os.path.join(path, "chunk_ids.u8.npy"), np.frombuffer(bytes(self._ids), dtype=np.uint8))
+        np.save(os.path.join(path, "chunk_id_offsets.u64.npy"), self.id_offsets)
+        np.save(os.path.join(path, "chunk_pages.i32.npy"), self.pages)
+        np.save(os.path.join(path, "chunk_sources.i32.npy"), self.source_ids)
+        np.save(os.path.join(path, "chunk_extras.i32.npy"), self.extra_ids)
+        with open(os.path.join(path, "chunk_tables.json"), "w", encoding="utf-8") as f:
+            json.dump({"sources": self.sources, "extras": self.extras}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str):
+        """Wczytuje kolumny zapisane przez `save` (przez mmap)."""
+        store = cls()
+        columns = {name: np.load(os.path.join(path, f"chunk_{name}.npy"), mmap_mode="r") for name in (
+            "text_offsets.u64", "ids.u8", "id_offsets.u64", "pages.i32", "sources.i32", "extras.i32")}
+        store._text = CompressedText(np.load(os.path.join(path, "chunk_text_blocks.u8.npy"), mmap_mode="r"),
+                                     np.load(os.path.join(path, "chunk_text_block_index.u64.npy")))
+        store.text_offsets = columns["text_offsets.u64"]
+        store._ids, store.id_offsets = columns["ids.u8"], columns["id_offsets.u64"]
+        store.pages, store.source_ids, store.extra_ids = columns["pages.i32"], columns["sources.i32"], columns["extras.i32"]
+        with open(os.path.join(path, "chunk_tables.json"), encoding="utf-8") as f:
+            tables = json.load(f)
+        store.sources, store.extras = tables["sources"], tables["extras"]
+        store._source_index = {value: i for i, value in enumerate(store.sources)}
+        store._extra_index = {value: i for i, value in enumerate(store.extras)}
+        return store
@@ -0,0 +1,136 @@
+# Usuwanie prawie identycznych fragmentów przed embedowaniem (MinHash + LSH)
+
+"""
+Ten plik zawiera etap ingestii, który wyłapuje powtarzające się fragmenty
+tekstu prawnego (motywy, powtarzane definicje, nagłówki i stopki stron),
+zanim trafią do modelu embeddingowego.
+
+Każdy fragment jest zamieniany na zbiór "shingli" (kolejnych n-gramów słów),
+a z niego na sygnaturę MinHash. Sygnatury dzielimy na pasma (LSH), więc
+kandydatów na duplikat szukamy w słownikach, a nie porównując każdy
+fragment z każdym. Kandydaci są na koniec sprawdzani dokładnym
+współczynnikiem Jaccarda z progiem DEDUP_THRESHOLD.
+
+Duplikat nie jest embedowany – wskazuje swój fragment kanoniczny, a ten
+zapamiętuje w metadanych, w których jeszcze miejscach występuje
+(`duplicate_locations`: plik i strona każdego duplikatu, w formacie
+`parent_id`), więc odpowiedź nadal można przypisać do wszystkich tych stron.
+
+Etap jest opcjonalny (INGEST_DEDUP=1), bo zmienia zawartość indeksu względem
+zwykłej ingestii.
+"""
+from app.parent_store import parent_id
+from app.rate_limit import estimate_tokens
+import numpy as np
+import os
+import re
+import zlib
+
+DEDUP_ENABLED = os.getenv("INGEST_DEDUP", "0") == "1"
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+NUM_PERM = 128
+SHINGLE_SIZE = 5
+
+# Najmniejsza liczba pierwsza większa od 2^32 – parametry haszy mieszczą się w uint64 bez przepełnienia.
+_PRIME = np.uint64(4294967311)
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """Zbiór n-gramów słów (po normalizacji) jako 32-bitowe skróty."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+def lsh_params(threshold: float, num_perm: int = NUM_PERM):
+    """
+    Dobiera liczbę pasm i wierszy w paśmie tak, aby próg prawdopodobieństwa
+    kolizji (1/b)^(1/r) był jak najbliżej zadanego progu Jaccarda.
+    """
+    options = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    return min(options, key=lambda option: abs((1 / option[0]) ** (1 / option[1]) - threshold))
+
+
+class MinHasher:
+    """Sygnatury MinHash liczone wektorowo dla całego zbioru shingli naraz."""
+
+    def __init__(self, num_perm: int = NUM_PERM, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: set) -> np.ndarray:
+        values = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set))
+        hashes = (values[:, None] * self.a + self.b) % _PRIME
+        return hashes.min(axis=0)
+
+
+def deduplicate(chunks, threshold: float = DEDUP_THRESHOLD, num_perm: int = NUM_PERM):
+    """
+    Zwraca (fragmenty kanoniczne, mapa indeks duplikatu -> indeks kanoniczny, raport).
+    Kolejność fragmentów jest zachowana; kanoniczny jest zawsze pierwszy z grupy.
+    """
+    bands, rows = lsh_params(threshold, num_perm)
+    hasher = MinHasher(num_perm)
+    buckets = [dict() for _ in range(bands)]
+    shingle_sets = {}
+    canonical_map = {}
+    unique = []
+
+    for index, chunk in enumerate(chunks):
+        current = shingles(chunk.page_content)
+        signature = hasher.signature(current)
+        keys = [signature[band * rows:(band + 1) * rows].tobytes() for band in range(bands)]
+
+        candidates = {candidate for band, key in enumerate(keys) for candidate in buckets[band].get(key, ())}
+        match = next((c for c in sorted(candidates) if jaccard(current, shingle_sets[c]) >= threshold), None)
+        if match is not None:
+            canonical_map[index] = match
+            continue
+
+        shingle_sets[index] = current
+        for band, key in enumerate(keys):
+            buckets[band].setdefault(key, []).append(index)
+        unique.append(index)
+
+    _annotate_canonicals(chunks, canonical_map)
+    duplicates = [chunks[index] for index in canonical_map]
+    report = {
+        "chunks": len(chunks),
+        "unique": len(unique),
+        "duplicates": len(canonical_map),
+        "saved_chars": sum(len(chunk.page_content) for chunk in duplicates),
+        "saved_tokens": sum(estimate_tokens(chunk.page_content) for chunk in duplicates),
+        "total_tokens": sum(estimate_tokens(chunk.page_content) for chunk in chunks),
+        "threshold": threshold,
+        "lsh_bands": bands,
+        "lsh_rows": rows,
+    }
+    return [chunks[index] for index in unique], canonical_map, report
+
+
+def _annotate_canonicals(chunks, canonical_map):
+    """
+    Zapisuje w metadanych fragmentu kanonicznego, skąd pochodzą jego duplikaty
+    – plik i stronę każdego z nich (Chroma przyjmuje tylko proste typy, stąd napis).
+    """
+    locations = {}
+    for duplicate, canonical in canonical_map.items():
+        locations.setdefault(canonical, []).append(parent_id(chunks[duplicate].metadata))
+    for canonical, duplicate_locations in locations.items():
+        chunks[canonical].metadata["duplicates"] = len(duplicate_locations)
+        chunks[canonical].metadata["duplicate_locations"] = ",".join(duplicate_locations)
+
+
+def print_report(report):
+    share = report["saved_tokens"] / report["total_tokens"] if report["total_tokens"] else 0.0
+    print(f"Deduplikacja (Jaccard >= {report['threshold']}, LSH {report['lsh_bands']}x{report['lsh_rows']}): "
+          f"{report['duplicates']} z {report['chunks']} fragmentów to duplikaty.")
+    print(f"Oszczędność embeddingów: {report['saved_tokens']} tokenów ({share:.1%}), {report['saved_chars']} znaków.")
@@ -0,0 +1,138 @@
+# Trwały cache embeddingów, współdzielony między kolejnymi uruchomieniami
+
+"""
+Ten plik zawiera opakowanie na dowolny model embeddingowy LangChain, które
+zapamiętuje już policzone wektory w lokalnej bazie SQLite.
+
+Kluczem jest skrót SHA-256 z nazwy modelu i treści fragmentu, więc identyczny
+tekst (np. ten sam chunk powstały przy dwóch różnych ustawieniach splittera)
+jest embedowany tylko raz – niezależnie od tego, w którym procesie się pojawił.
+
+Przed SQLite stoi niewielka pamięć podręczna ostatnio używanych wektorów (LRU,
+EMBEDDING_CACHE_MEMORY_ITEMS pozycji), więc przegląd wielu konfiguracji nie
+trzyma w RAM wektorów wszystkich fragmentów ze wszystkich konfiguracji naraz.
+"""
+from langchain_core.embeddings import Embeddings
+from array import array
+from collections import OrderedDict
+import hashlib
+import os
+import sqlite3
+import threading
+
+CACHE_PATH = os.path.join(os.path.dirname(__file__), '..', 'cache', 'embeddings.sqlite')
+
+# Ile wektorów trzymamy w pamięci (jako tablice float32, ok. 6 KB na wektor 1536-wymiarowy).
+MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "20000"))
+
+# SQLite ogranicza liczbę parametrów w jednym zapytaniu, dlatego pytamy partiami.
+_LOOKUP_BATCH = 500
+
+
+class CachedEmbeddings(Embeddings):
+    """Model embeddingowy z trwałym cache'em wektorów w SQLite."""
+
+    def __init__(self, embeddings: Embeddings, path: str = CACHE_PATH, namespace: str = None,
+                 memory_items: int = MEMORY_ITEMS):
+        self.embeddings = embeddings
+        self.namespace = namespace or getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.hits = 0
+        self.misses = 0
+        self.memory_items = memory_items
+        self._memory = OrderedDict()
+        # Chroni połączenie SQLite, pamięć LRU i liczniki – z cache'u korzysta wiele wątków naraz.
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._db.commit()
+
+    def _key(self, text: str, kind: str = "doc") -> str:
+        raw = f"{self.namespace}\0{kind}\0{text}".encode("utf-8")
+        return hashlib.sha256(raw).hexdigest()
+
+    def _remember(self, items):
+        """Dopisuje wektory do pamięci LRU i usuwa najdawniej używane ponad limit (pod blokadą)."""
+        for key, vector in items:
+            self._memory[key] = vector if isinstance(vector, array) else array("f", vector)
+            self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _lookup(self, keys):
+        """Zwraca słownik klucz -> wektor dla kluczy obecnych w pamięci lub na dysku."""
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+            missing = [key for key in keys if key not in found]
+            loaded = []
+            for start in range(0, len(missing), _LOOKUP_BATCH):
+                batch = missing[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                loaded += [(key, array("f", blob)) for key, blob in rows]
+            self._remember(loaded)
+        found.update(loaded)
+        return {key: vector.tolist() for key, vector in found.items()}
+
+    def _store(self, items):
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items],
+            )
+            self._db.commit()
+            self._remember(items)
+
+    def _count(self, hits: int, misses: int):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def clear_memory(self):
+        """Zwalnia pamięć podręczną (np. po zakończeniu jednej konfiguracji); wektory zostają w SQLite."""
+        with self._lock:
+            self._memory.clear()
+
+    def embed_documents(self, texts):
+        """Embeduje fragmenty, wysyłając do modelu tylko te, których nie ma w cache'u."""
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        # Każdy brakujący tekst wysyłamy tylko raz, nawet jeśli występuje wielokrotnie.
+        to_embed = {}
+        for key, text in zip(keys, texts):
+            if key not in found:
+                to_embed.setdefault(key, text)
+
+        self._count(len(texts) - len(to_embed), len(to_embed))
+        if to_embed:
+            vectors = self.embeddings.embed_documents(list(to_embed.values()))
+            new_items = list(zip(to_embed.keys(), vectors))
+            self._store(new_items)
+            found.update(new_items)
+
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        """Embeduje zapytanie; wektory zapytań trzymamy pod osobnym kluczem."""
+        key = self._key(text, kind="query")
+        found = self._lookup([key])
+        if key in found:
+            self._count(1, 0)
+            return found[key]
+        self._count(0, 1)
+        vector = self.embeddings.embed_query(text)
+        self._store([(key, vector)])
+        return vector
+
+    def stats(self):
+        """Zwraca liczbę trafień i chybień cache'u."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
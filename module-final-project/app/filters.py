@@ -0,0 +1,240 @@
+# Filtry metadanych dla wyszukiwania wektorowego (bitsety liczone przy ingestii)
+
+"""
+Ten plik pozwala zawęzić wyszukiwanie do wybranych stron lub dokumentów
+źródłowych (pole `filters` w `/ask`).
+
+Filtr to słownik w składni zbliżonej do Chroma:
+
+    {"page": 12}                                  – równość,
+    {"page": [12, 13, 14]}                        – dowolna z wartości (też {"$in": [...]}),
+    {"page": {"$gte": 10, "$lte": 20}}            – zakres ($gt, $gte, $lt, $lte),
+    {"source": "data/rodo_pl.pdf", "page": 3}     – kilka pól naraz oznacza AND,
+    {"$or": [{"page": 3}, {"page": {"$gt": 80}}]} – jawne $and / $or.
+
+Pole `source` ingestia zapisuje jako ścieżkę względem folderu projektu
+(`app.ingest_data.source_name`), np. "data/rodo_pl.pdf".
+
+W lokalnym magazynie wektorów (`LocalVectorStore`) dla każdej wartości pól
+z FILTER_FIELDS przy ingestii powstaje bitset – jeden bit na fragment. Filtr
+zamienia się w kilka operacji AND/OR na tych bitsetach, a gotowa maska jest
+stosowana w trakcie skanowania wektorów, zamiast odrzucać wyniki po fakcie.
+Dla Chroma filtr jest tłumaczony na jej własny warunek `where` o tej samej
+semantyce: wartości porównujemy tekstowo (strona 3 i "3" to ta sama wartość),
+a granice zakresów zawsze jako liczby.
+"""
+import json
+import numpy as np
+import os
+
+# Pola metadanych, dla których przy ingestii liczymy bitsety (i po których można filtrować).
+FILTER_FIELDS = [field.strip() for field in os.getenv("FILTER_FIELDS", "source,page").split(",") if field.strip()]
+
+RANGE_OPERATORS = {
+    "$gt": lambda value, bound: value > bound,
+    "$gte": lambda value, bound: value >= bound,
+    "$lt": lambda value, bound: value < bound,
+    "$lte": lambda value, bound: value <= bound,
+}
+VALUE_OPERATORS = ("$eq", "$in", *RANGE_OPERATORS)
+
+
+class InvalidFilter(ValueError):
+    """Filtr ma nieprawidłową postać albo odwołuje się do pola, które nie jest indeksowane."""
+
+
+def _key(value) -> str:
+    # Strona 3 i "3" to ta sama wartość – klient nie musi pamiętać typów z metadanych.
+    return str(value)
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _conditions(field, condition):
+    """Rozkłada warunek pola na listę par (operator, wartość)."""
+    if isinstance(condition, list):
+        if not condition:
+            raise InvalidFilter(f"Lista wartości dla pola '{field}' nie może być pusta.")
+        return [("$in", condition)]
+    if not isinstance(condition, dict):
+        return [("$eq", condition)]
+    if not condition:
+        raise InvalidFilter(f"Pusty warunek dla pola '{field}'.")
+    for operator, value in condition.items():
+        if operator not in VALUE_OPERATORS:
+            raise InvalidFilter(f"Nieznany operator '{operator}' (dostępne: {', '.join(VALUE_OPERATORS)}).")
+        if operator == "$in" and (not isinstance(value, list) or not value):
+            raise InvalidFilter(f"Operator $in dla pola '{field}' wymaga niepustej listy wartości.")
+        if operator in RANGE_OPERATORS and _number(value) is None:
+            raise InvalidFilter(f"Operator {operator} dla pola '{field}' wymaga liczby.")
+    return list(condition.items())
+
+
+def _clauses(filters, fields):
+    """Sprawdza filtr i zwraca listę jego składników: ("$and"/"$or", podfiltry) albo (pole, warunek)."""
+    if not isinstance(filters, dict):
+        raise InvalidFilter("Filtr musi być obiektem JSON, np. {\"page\": 3}.")
+    clauses = []
+    for key, value in filters.items():
+        if key in ("$and", "$or"):
+            if not isinstance(value, list) or not value:
+                raise InvalidFilter(f"Operator {key} wymaga niepustej listy filtrów.")
+            clauses.append((key, value))
+        elif key in fields:
+            clauses.append((key, value))
+        else:
+            raise InvalidFilter(f"Nie można filtrować po polu '{key}' (dostępne: {', '.join(fields)}).")
+    return clauses
+
+
+def validate(filters, fields=FILTER_FIELDS):
+    """Sprawdza cały filtr (także zagnieżdżone $and/$or) i rzuca InvalidFilter, jeśli jest nieprawidłowy."""
+    for key, value in _clauses(filters, fields):
+        if key in ("$and", "$or"):
+            for sub in value:
+                validate(sub, fields)
+        else:
+            _conditions(key, value)
+
+
+def _typed_values(values):
+    """
+    Wartości, które lokalnie (przez `_key`) są równe podanym: Chroma porównuje typy,
+    więc "3" trzeba sprawdzić także jako 3, a 3 także jako "3". Zwraca listy jednego typu.
+    """
+    typed = {}
+    for value in values:
+        text = _key(value)
+        typed.setdefault(str, []).append(text)
+        for kind in (int, float):
+            try:
+                number = kind(text)
+            except ValueError:
+                continue
+            if _key(number) == text:
+                typed.setdefault(kind, []).append(number)
+    return [list(dict.fromkeys(group)) for group in typed.values()]
+
+
+def _chroma_condition(field, operator, operand):
+    if operator in RANGE_OPERATORS:
+        return {field: {operator: _number(operand)}}
+    # Chroma wymaga w $in niepustej listy wartości jednego typu.
+    parts = [{field: {"$in": group}} for group in _typed_values(operand if operator == "$in" else [operand])]
+    return parts[0] if len(parts) == 1 else {"$or": parts}
+
+
+def to_chroma_where(filters, fields=FILTER_FIELDS):
+    """Tłumaczy filtr na warunek `where` bazy Chroma (Chroma wymaga co najmniej dwóch elementów w $and)."""
+    parts = []
+    for key, value in _clauses(filters, fields):
+        if key in ("$and", "$or"):
+            subfilters = [to_chroma_where(sub, fields) for sub in value]
+            parts.append(subfilters[0] if len(subfilters) == 1 else {key: subfilters})
+            continue
+        for operator, operand in _conditions(key, value):
+            parts.append(_chroma_condition(key, operator, operand))
+    if not parts:
+        return None
+    return parts[0] if len(parts) == 1 else {"$and": parts}
+
+
+class MetadataBitsets:
+    """
+    Bitsety "fragment ma w polu X wartość Y", spakowane po 8 fragmentów w bajcie.
+    Wiersz macierzy `bits` odpowiada jednej parze (pole, wartość) z `values`.
+    """
+
+    def __init__(self, count: int, values, bits, fields=FILTER_FIELDS):
+        self.count = count
+        self.fields = list(fields)
+        self.values = [(field, value) for field, value in values]
+        self.bits = bits
+        self._rows = {}
+        for row, (field, value) in enumerate(self.values):
+            self._rows.setdefault(field, {})[_key(value)] = row
+
+    @classmethod
+    def build(cls, metadatas, fields=FILTER_FIELDS):
+        """Liczy bitsety dla wszystkich wartości pól `fields` występujących w metadanych."""
+        rows, members = {}, []
+        count = 0
+        # `metadatas` może być generatorem (np. z kolumn `ChunkStore`), dlatego liczbę fragmentów liczymy po drodze.
+        for index, metadata in enumerate(metadatas):
+            count = index + 1
+            for field in fields:
+                if field not in metadata:
+                    continue
+                key = (field, _key(metadata[field]))
+                if key not in rows:
+                    rows[key] = len(members)
+                    members.append((field, metadata[field], []))
+                members[rows[key]][2].append(index)
+        bits = np.zeros((len(members), (count + 7) // 8), dtype=np.uint8)
+        flags = np.zeros(count, dtype=bool)
+        for row, (_, _, indices) in enumerate(members):
+            flags[:] = False
+            flags[indices] = True
+            bits[row] = np.packbits(flags)
+        return cls(count, [(field, value) for field, value, _ in members], bits, fields)
+
+    @property
+    def nbytes(self) -> int:
+        return self.bits.nbytes
+
+    def mask(self, filters) -> np.ndarray:
+        """Maska logiczna (jedna wartość na fragment) fragmentów spełniających filtr."""
+        return np.unpackbits(self._packed(filters), count=self.count).astype(bool)
+
+    def _empty(self):
+        return np.zeros((self.count + 7) // 8, dtype=np.uint8)
+
+    def _field_rows(self, field, condition):
+        rows = self._rows.get(field, {})
+        packed = None
+        for operator, operand in _conditions(field, condition):
+            if operator == "$eq":
+                matching = [rows[_key(operand)]] if _key(operand) in rows else []
+            elif operator == "$in":
+                matching = [rows[_key(value)] for value in operand if _key(value) in rows]
+            else:
+                bound = _number(operand)
+                matching = [row for row in rows.values()
+                            if _number(self.values[row][1]) is not None
+                            and RANGE_OPERATORS[operator](_number(self.values[row][1]), bound)]
+            current = np.bitwise_or.reduce(self.bits[matching], axis=0) if matching else self._empty()
+            packed = current if packed is None else packed & current
+        return packed
+
+    def _packed(self, filters):
+        packed = None
+        for key, value in _clauses(filters, self.fields):
+            if key == "$and":
+                current = np.bitwise_and.reduce([self._packed(sub) for sub in value])
+            elif key == "$or":
+                current = np.bitwise_or.reduce([self._packed(sub) for sub in value])
+            else:
+                current = self._field_rows(key, value)
+            packed = current if packed is None else packed & current
+        # Pusty filtr ({}) przepuszcza wszystko.
+        return np.full((self.count + 7) // 8, 0xFF, dtype=np.uint8) if packed is None else packed
+
+    def save(self, path: str):
+        np.save(os.path.join(path, "bitsets.u8.npy"), self.bits)
+        with open(os.path.join(path, "bitsets.json"), "w", encoding="utf-8") as f:
+            json.dump({"count": self.count, "fields": self.fields, "values": self.values}, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str):
+        """Wczytuje bitsety zapisane przez `save` (macierz bitów przez mmap) albo None, jeśli ich nie ma."""
+        if not os.path.exists(os.path.join(path, "bitsets.json")):
+            return None
+        with open(os.path.join(path, "bitsets.json"), encoding="utf-8") as f:
+            data = json.load(f)
+        bits = np.load(os.path.join(path, "bitsets.u8.npy"), mmap_mode="r")
+        return cls(data["count"], data["values"], bits, data["fields"])
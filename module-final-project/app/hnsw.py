@@ -0,0 +1,229 @@
+# Przybliżone wyszukiwanie najbliższych sąsiadów: graf HNSW w czystym NumPy
+
+"""
+Ten plik zawiera indeks HNSW (Hierarchical Navigable Small World) używany
+przez `LocalVectorStore` przy VECTOR_INDEX=hnsw.
+
+Każdy wektor jest węzłem grafu, połączonym z kilkoma najbliższymi sąsiadami.
+Węzły dostają losowy poziom – na wyższych poziomach jest ich wykładniczo
+mniej, więc wyszukiwanie zaczyna od kilku "dalekich skoków" na górze i
+schodzi coraz niżej, zawężając okolicę zapytania. Zamiast porównywać
+zapytanie ze wszystkimi wektorami, odwiedzamy tylko kilkaset węzłów.
+
+Parametry:
+- M               – liczba sąsiadów węzła (na poziomie 0: 2 * M),
+- ef_construction – szerokość przeszukiwania przy wstawianiu (jakość grafu),
+- ef_search       – szerokość przeszukiwania przy zapytaniu (recall vs. czas).
+
+Wektory muszą być znormalizowane; odległość to 1 - podobieństwo kosinusowe.
+"""
+import heapq
+import math
+import numpy as np
+import os
+
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+
+class HNSWIndex:
+    """Graf HNSW z wstawianiem przyrostowym oraz zapisem do pliku `.npz`."""
+
+    def __init__(self, dim: int, m: int = HNSW_M, ef_construction: int = HNSW_EF_CONSTRUCTION,
+                 ef_search: int = HNSW_EF_SEARCH, seed: int = 0):
+        self.dim = dim
+        self.m = m
+        self.m0 = 2 * m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.level_mult = 1 / math.log(m)
+        self.rng = np.random.default_rng(seed)
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.count = 0
+        self.levels = []
+        # graph[level][węzeł] -> lista sąsiadów; poziom 0 jest listą, wyższe – słownikami.
+        self.graph = [[]]
+        self.entry_point = -1
+        self.max_level = -1
+
+    def __len__(self):
+        return self.count
+
+    def _reserve(self, extra: int):
+        if self.count + extra <= len(self.vectors):
+            return
+        capacity = max(self.count + extra, 2 * len(self.vectors), 1024)
+        grown = np.empty((capacity, self.dim), dtype=np.float32)
+        grown[:self.count] = self.vectors[:self.count]
+        self.vectors = grown
+
+    def _neighbors(self, node: int, level: int):
+        return self.graph[level][node] if level == 0 else self.graph[level].get(node, [])
+
+    def _distances(self, query, nodes):
+        return 1.0 - self.vectors[nodes] @ query
+
+    def _search_layer(self, query, entry_points, ef: int, level: int, allowed=None):
+        """
+        Zachłanne przeszukiwanie jednego poziomu; zwraca listę (odległość, węzeł) posortowaną rosnąco.
+        Z maską `allowed` graf jest przechodzony normalnie, ale do wyników trafiają tylko dozwolone węzły.
+        """
+        visited = set(entry_points)
+        distances = self._distances(query, entry_points)
+        candidates = [(d, n) for d, n in zip(distances.tolist(), entry_points)]
+        heapq.heapify(candidates)
+        results = [(-d, n) for d, n in candidates if allowed is None or allowed[n]]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            distance, node = heapq.heappop(candidates)
+            if len(results) >= ef and distance > -results[0][0]:
+                break
+            fresh = [n for n in self._neighbors(node, level) if n not in visited]
+            if not fresh:
+                continue
+            visited.update(fresh)
+            for d, n in zip(self._distances(query, fresh).tolist(), fresh):
+                if len(results) < ef or d < -results[0][0]:
+                    heapq.heappush(candidates, (d, n))
+                    if allowed is not None and not allowed[n]:
+                        continue
+                    heapq.heappush(results, (-d, n))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+        return sorted((-d, n) for d, n in results)
+
+    def _select_neighbors(self, candidates, limit: int):
+        """
+        Heurystyka z pracy o HNSW: kandydat jest dołączany tylko wtedy, gdy jest
+        bliżej węzła niż każdego z już wybranych sąsiadów – dzięki temu krawędzie
+        prowadzą w różne strony, a graf pozostaje spójny także między skupiskami.
+        """
+        if len(candidates) <= limit:
+            return [node for _, node in candidates]
+        nodes = [node for _, node in candidates]
+        distances = np.array([distance for distance, _ in candidates], dtype=np.float32)
+        vectors = self.vectors[nodes]
+        # closer[i, j]: kandydat i leży bliżej kandydata j niż węzła – j "zasłania" i.
+        closer = (1.0 - vectors @ vectors.T) < distances[:, None]
+        blocked = np.zeros(len(nodes), dtype=bool)
+        selected, rejected = [], []
+        for i, node in enumerate(nodes):
+            if blocked[i]:
+                rejected.append(node)
+                continue
+            selected.append(node)
+            if len(selected) == limit:
+                break
+            blocked |= closer[:, i]
+        # Uzupełniamy odrzuconymi, aby węzły nie zostawały z pojedynczymi krawędziami.
+        return selected + rejected[:limit - len(selected)]
+
+    def _connect(self, node: int, neighbors, level: int):
+        limit = self.m0 if level == 0 else self.m
+        if level == 0:
+            self.graph[0][node] = list(neighbors)
+        else:
+            self.graph[level][node] = list(neighbors)
+        for neighbor in neighbors:
+            links = self._neighbors(neighbor, level)
+            links.append(node)
+            if len(links) > limit:
+                # Ta sama heurystyka przy przycinaniu – samo "zostaw najbliższych" rozspójnia graf między skupiskami.
+                distances = self._distances(self.vectors[neighbor], links)
+                links[:] = self._select_neighbors(sorted(zip(distances.tolist(), links)), limit)
+
+    def add(self, vectors):
+        """Wstawia wektory (znormalizowane) i zwraca ich numery w indeksie."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        self._reserve(len(vectors))
+        start = self.count
+        for vector in vectors:
+            self._insert(vector)
+        return list(range(start, self.count))
+
+    def _insert(self, vector):
+        node = self.count
+        self.vectors[node] = vector
+        self.count += 1
+        level = int(-math.log(1.0 - self.rng.random()) * self.level_mult)
+        self.levels.append(level)
+        self.graph[0].append([])
+        while len(self.graph) <= level:
+            self.graph.append({})
+
+        if self.entry_point < 0:
+            self.entry_point, self.max_level = node, level
+            for upper in range(1, level + 1):
+                self.graph[upper][node] = []
+            return
+
+        entry = [self.entry_point]
+        for upper in range(self.max_level, level, -1):
+            entry = [self._search_layer(vector, entry, 1, upper)[0][1]]
+        for current in range(min(level, self.max_level), -1, -1):
+            found = self._search_layer(vector, entry, self.ef_construction, current)
+            self._connect(node, self._select_neighbors(found, self.m0 if current == 0 else self.m), current)
+            entry = [n for _, n in found]
+        for upper in range(self.max_level + 1, level + 1):
+            self.graph[upper][node] = []
+
+        if level > self.max_level:
+            self.entry_point, self.max_level = node, level
+
+    def search(self, query, k: int, ef: int = None, allowed=None):
+        """
+        Zwraca (numery węzłów, podobieństwa kosinusowe) `k` przybliżonych najbliższych sąsiadów;
+        opcjonalna maska logiczna `allowed` ogranicza wyniki do wybranych węzłów.
+        """
+        if self.count == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        query = np.asarray(query, dtype=np.float32)
+        entry = [self.entry_point]
+        for level in range(self.max_level, 0, -1):
+            entry = [self._search_layer(query, entry, 1, level)[0][1]]
+        found = self._search_layer(query, entry, max(ef or self.ef_search, k), 0, allowed)[:k]
+        return (np.array([n for _, n in found], dtype=np.int64),
+                np.array([1.0 - d for d, _ in found], dtype=np.float32))
+
+    def save(self, path: str):
+        """Zapisuje sam graf (wektory zapisuje właściciel indeksu) do pliku `.npz`."""
+        layer0 = np.full((self.count, self.m0), -1, dtype=np.int32)
+        for node, links in enumerate(self.graph[0]):
+            layer0[node, :len(links)] = links
+        arrays = {
+            "params": np.array([self.dim, self.m, self.ef_construction, self.ef_search,
+                                self.entry_point, self.max_level], dtype=np.int64),
+            "levels": np.asarray(self.levels, dtype=np.int8),
+            "layer0": layer0,
+        }
+        for level in range(1, len(self.graph)):
+            nodes = sorted(self.graph[level])
+            links = np.full((len(nodes), self.m), -1, dtype=np.int32)
+            for row, node in enumerate(nodes):
+                links[row, :len(self.graph[level][node])] = self.graph[level][node]
+            arrays[f"nodes_{level}"] = np.asarray(nodes, dtype=np.int32)
+            arrays[f"links_{level}"] = links
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str, vectors):
+        """Wczytuje graf zapisany przez `save`; `vectors` to te same wektory (np. otwarte przez mmap)."""
+        data = np.load(path)
+        dim, m, ef_construction, ef_search, entry_point, max_level = data["params"].tolist()
+        index = cls(dim, m, ef_construction, ef_search)
+        index.vectors = vectors
+        index.count = len(data["levels"])
+        index.levels = data["levels"].tolist()
+        index.entry_point, index.max_level = entry_point, max_level
+        index.graph = [[[n for n in row if n >= 0] for row in data["layer0"].tolist()]]
+        level = 1
+        while f"nodes_{level}" in data:
+            links = data[f"links_{level}"].tolist()
+            index.graph.append({node: [n for n in row if n >= 0]
+                                for node, row in zip(data[f"nodes_{level}"].tolist(), links)})
+            level += 1
+        return index
@@ -0,0 +1,134 @@
+# Współdzielony, pulowany klient HTTP dla wywołań dostawcy LLM i serwisu wektorowego
+
+"""
+Ten plik tworzy jeden klient `httpx` na cały proces, z pulą połączeń
+keep-alive i obsługą HTTP/2. Przekazujemy go do każdego `ChatOpenAI` i
+`OpenAIEmbeddings`, dzięki czemu kolejne zapytania nie płacą ponownie za
+zestawienie połączenia TCP i negocjację TLS. Ten sam klient obsługuje też
+`RemoteVectorStore` (app/vector_client.py).
+
+Dodatkowo każde zapytanie jest śledzone (rozszerzenie `trace` w httpcore),
+a liczniki w `app.metrics` pokazują, ile zapytań otworzyło nowe połączenie,
+a ile użyło już istniejącego.
+
+Konfiguracja przez zmienne środowiskowe:
+    HTTP_MAX_CONNECTIONS      - maksymalna liczba połączeń w puli (domyślnie 50)
+    HTTP_MAX_KEEPALIVE        - ile bezczynnych połączeń trzymać otwartych (domyślnie 20)
+    HTTP_KEEPALIVE_EXPIRY     - po ilu sekundach zamykać bezczynne połączenie (domyślnie 60)
+    HTTP_CONNECT_TIMEOUT      - limit czasu nawiązania połączenia w sekundach (domyślnie 5)
+    HTTP_READ_TIMEOUT         - limit czasu odczytu w sekundach (domyślnie 60)
+    HTTP_HTTP2                - "1" włącza HTTP/2 (domyślnie), "0" wymusza HTTP/1.1
+"""
+from app import metrics
+import httpx
+import os
+import threading
+
+_lock = threading.Lock()
+_client = None
+_async_client = None
+
+
+def _limits():
+    return httpx.Limits(
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "50")),
+        max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60")),
+    )
+
+
+def _timeout():
+    read = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+    return httpx.Timeout(read, connect=float(os.getenv("HTTP_CONNECT_TIMEOUT", "5")))
+
+
+def _http2_enabled():
+    return os.getenv("HTTP_HTTP2", "1") == "1"
+
+
+def _record_trace(event_name, info):
+    if event_name == "connection.connect_tcp.complete":
+        metrics.incr("http.connections_opened")
+    elif event_name == "connection.start_tls.complete":
+        metrics.incr("http.tls_handshakes")
+
+
+async def _record_trace_async(event_name, info):
+    _record_trace(event_name, info)
+
+
+def _on_request(request):
+    metrics.incr("http.requests")
+    request.extensions["trace"] = _record_trace
+
+
+async def _on_request_async(request):
+    metrics.incr("http.requests")
+    request.extensions["trace"] = _record_trace_async
+
+
+def get_http_client() -> httpx.Client:
+    """Zwraca współdzielony synchroniczny klient HTTP (tworzony leniwie)."""
+    global _client
+    with _lock:
+        if _client is None:
+            _client = httpx.Client(
+                http2=_http2_enabled(),
+                limits=_limits(),
+                timeout=_timeout(),
+                event_hooks={"request": [_on_request]},
+            )
+        return _client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Zwraca współdzielony asynchroniczny klient HTTP (tworzony leniwie)."""
+    global _async_client
+    with _lock:
+        if _async_client is None:
+            _async_client = httpx.AsyncClient(
+                http2=_http2_enabled(),
+                limits=_limits(),
+                timeout=_timeout(),
+                event_hooks={"request": [_on_request_async]},
+            )
+        return _async_client
+
+
+def provider_kwargs() -> dict:
+    """Argumenty, które należy przekazać do `ChatOpenAI`/`OpenAIEmbeddings`."""
+    return {"http_client": get_http_client(), "http_async_client": get_async_http_client()}
+
+
+def connection_stats() -> dict:
+    """Zwraca statystyki ponownego użycia połączeń."""
+    counters = metrics.snapshot()["counters"]
+    requests = counters.get("http.requests", 0)
+    opened = counters.get("http.connections_opened", 0)
+    return {
+        "requests": requests,
+        "connections_opened": opened,
+        "reused": max(0, requests - opened),
+        "reuse_ratio": (requests - opened) / requests if requests else None,
+    }
+
+
+def close_http_clients():
+    """Zamyka synchroniczny klient HTTP przy wyłączaniu aplikacji."""
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def aclose_http_clients():
+    """
+    Zamyka asynchroniczny klient HTTP przy wyłączaniu aplikacji. `aclose()`
+    musi zostać wywołane w pętli zdarzeń, dlatego to osobna funkcja `async`.
+    """
+    global _async_client
+    with _lock:
+        client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
@@ -6,22 +6,77 @@ Jego zadaniem jest wczytanie dokumentu PDF, podzielenie go na mniejsze fragmenty
 stworzenie dla nich wektorowych reprezentacji (embeddingów) i zapisanie ich
 w trwałej bazie wektorowej ChromaDB na dysku.
 
+Z PARENT_RETRIEVAL=1 buduje bazę dwupoziomową: w ChromaDB zapisywane są
+małe fragmenty (ok. 300 znaków) do precyzyjnego wyszukiwania, a pełne strony,
+z których pochodzą, trafiają do skompresowanego magazynu `app/parent_store.py`.
+
 Należy go uruchomić tylko raz, aby przygotować bazę wiedzy dla aplikacji.
+Uruchomienie (z głównego folderu projektu): `python -m app.ingest_data`
 """
 from langchain_community.document_loaders import PyPDFLoader
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import Chroma
 from dotenv import load_dotenv
+from app.dedup import DEDUP_ENABLED, deduplicate, print_report
+from app.http_client import provider_kwargs
+from app.kb_artifact import KB_ARTIFACT_PATH, write_artifact
+from app.local_store import LOCAL_INDEX_PATH, VECTOR_BACKEND, LocalVectorStore
+from app.parent_store import PARENTS_DB, ParentStore, parent_id
+from app.rate_limit import BATCH, ScheduledEmbeddings
+from app.sharding import SHARD_BY, SHARD_NODES, chunk_ids, write_shards
+from app.vector_client import VECTOR_SERVICE_NAMESPACE, VECTOR_SERVICE_URL, RemoteVectorStore
 import os
+import time
 
 # Wczytanie zmiennych środowiskowych (klucza API) z pliku .env
 load_dotenv()
 
 # Definicja stałych ze ścieżkami
+PROJECT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 PDF_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'rodo_pl.pdf')
 DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'vector_db')
 
+# Domyślne parametry splittera (można je dobrać narzędziem `app/sweep.py`)
+CHUNK_SIZE = 1200
+CHUNK_OVERLAP = 120
+
+# Baza dwupoziomowa: małe fragmenty potomne w indeksie wektorowym, całe strony w magazynie stron
+PARENT_RETRIEVAL = os.getenv("PARENT_RETRIEVAL", "0") == "1"
+CHILD_CHUNK_SIZE = 300
+CHILD_CHUNK_OVERLAP = 30
+
+def source_name(path, root=None):
+    """
+    Stała postać pola `source`: ścieżka względem folderu projektu, np. "data/rodo_pl.pdf"
+    (dla plików spoza projektu – sama nazwa pliku). Po niej filtrujemy wyszukiwanie.
+    """
+    relative = os.path.relpath(os.path.abspath(path), root or PROJECT_DIR)
+    if relative.startswith(".."):
+        return os.path.basename(path)
+    return relative.replace(os.sep, "/")
+
+def load_documents(pdf_path=PDF_PATH):
+    """Wczytuje dokument PDF i zwraca listę stron jako obiekty Document."""
+    loader = PyPDFLoader(pdf_path)
+    documents = loader.load()
+    # PyPDFLoader zapisuje ścieżkę tak, jak ją podano (tu: bezwzględną, z ".."), a ta zależy od maszyny.
+    for document in documents:
+        document.metadata["source"] = source_name(pdf_path)
+    return documents
+
+def split_documents(documents, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP):
+    """Dzieli strony dokumentu na mniejsze fragmenty (chunki)."""
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return text_splitter.split_documents(documents)
+
+def split_into_children(documents, chunk_size=CHILD_CHUNK_SIZE, chunk_overlap=CHILD_CHUNK_OVERLAP):
+    """Dzieli strony na małe fragmenty potomne, z których każdy wskazuje swoją stronę w `parent_id`."""
+    children = split_documents(documents, chunk_size, chunk_overlap)
+    for child in children:
+        child.metadata["parent_id"] = parent_id(child.metadata)
+    return children
+
 def main():
     """Główna funkcja orkiestrująca procesem ingestii."""
     print("Rozpoczynam proces ingestii danych...")
@@ -33,23 +88,76 @@ def main():
 
     # Krok 1: Ładowanie dokumentu PDF
     print(f"Ładowanie dokumentu z: {PDF_PATH}")
-    loader = PyPDFLoader(PDF_PATH)
-    documents = loader.load()
+    documents = load_documents()
     print(f"Załadowano {len(documents)} stron z dokumentu.")
 
     # Krok 2: Dzielenie tekstu na mniejsze fragmenty (chunki)
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=1200, chunk_overlap=120)
-    chunks = text_splitter.split_documents(documents)
-    print(f"Dokument podzielono na {len(chunks)} fragmentów (chunków).")
+    if PARENT_RETRIEVAL:
+        chunks = split_into_children(documents)
+        if os.path.exists(PARENTS_DB):
+            # Strony z poprzedniej ingestii mogły zniknąć z dokumentu albo mieć inny schemat.
+            os.remove(PARENTS_DB)
+        parent_store = ParentStore(PARENTS_DB)
+        parent_store.put_many(documents)
+        raw_kb = sum(len(doc.page_content.encode("utf-8")) for doc in documents) / 1024
+        print(f"Dokument podzielono na {len(chunks)} fragmentów potomnych ({CHILD_CHUNK_SIZE} znaków).")
+        print(f"Magazyn stron: {len(parent_store)} stron, {parent_store.size_bytes() / 1024:.0f} KB "
+              f"(bez kompresji {raw_kb:.0f} KB).")
+    else:
+        chunks = split_documents(documents)
+        if os.path.exists(PARENTS_DB):
+            # Magazyn stron z poprzedniej, dwupoziomowej ingestii nie pasowałby do nowego indeksu.
+            os.remove(PARENTS_DB)
+        print(f"Dokument podzielono na {len(chunks)} fragmentów (chunków).")
+
+    # Krok 2b (opcjonalny, INGEST_DEDUP=1): pomijanie prawie identycznych fragmentów.
+    # Fragment kanoniczny zapamiętuje w metadanych pliki i strony pominiętych duplikatów.
+    if DEDUP_ENABLED:
+        chunks, _, report = deduplicate(chunks)
+        print_report(report)
+
+    # Identyfikatory liczone z treści (`chunk_id`) zapisujemy w każdej bazie: API odnajduje
+    # po nich fragment pod `/chunks/{id}` także po restarcie, a artefakt liczy z nich łatki
+    # między wersjami (app/kb_artifact.py). Indeksujemy wszystkie fragmenty – powtórzone
+    # dostają identyfikator z przyrostkiem (pomijanie duplikatów to osobny krok INGEST_DEDUP).
+    ids = chunk_ids(chunks)
 
     # Krok 3: Tworzenie embeddingów i zapis w bazie wektorowej
-    print("Tworzenie embeddingów i zapisywanie w bazie wektorowej ChromaDB...")
-    embeddings = OpenAIEmbeddings()
-    vector_store = Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=DB_PATH
-    )
+    embeddings = ScheduledEmbeddings(OpenAIEmbeddings(**provider_kwargs()), BATCH)
+    if VECTOR_BACKEND == "local":
+        print("Tworzenie embeddingów i zapisywanie w lokalnym magazynie wektorów...")
+        vector_store = LocalVectorStore.from_documents(chunks, embeddings, ids=ids)
+        vector_store.save(LOCAL_INDEX_PATH)
+        print(f"Indeks {vector_store.quantization}: {vector_store.index_nbytes() / 1024:.0f} KB w pamięci, "
+              f"wektory float32: {vector_store.vectors.nbytes / 1024:.0f} KB na dysku.")
+        print(f"Bitsety filtrów: {len(vector_store.bitsets.values)} wartości pól {', '.join(vector_store.bitsets.fields)}, "
+              f"{vector_store.bitsets.nbytes / 1024:.0f} KB.")
+    elif VECTOR_BACKEND == "remote":
+        print(f"Tworzenie embeddingów i wysyłanie do serwisu wektorowego {VECTOR_SERVICE_URL} "
+              f"(przestrzeń nazw '{VECTOR_SERVICE_NAMESPACE}')...")
+        vector_store = RemoteVectorStore(embeddings)
+        # Ponowna ingestia zastępuje całą przestrzeń nazw, zamiast dopisywać do niej duplikaty.
+        vector_store.clear()
+        vector_store.add_documents(chunks, ids=ids)
+    elif VECTOR_BACKEND == "sharded":
+        target = f"węzłów {', '.join(SHARD_NODES)}" if SHARD_NODES else "shardów w vector_db/shards"
+        print(f"Tworzenie embeddingów i podział fragmentów (klucz: {SHARD_BY}) do {target}...")
+        sizes = write_shards(chunks, embeddings)
+        print(f"Fragmenty w shardach: {', '.join(str(size) for size in sizes)}.")
+    elif VECTOR_BACKEND == "artifact":
+        print("Tworzenie embeddingów i zapisywanie artefaktu bazy wiedzy w vector_db/kb...")
+        vectors = embeddings.embed_documents([chunk.page_content for chunk in chunks])
+        manifest = write_artifact(KB_ARTIFACT_PATH, ids, [chunk.page_content for chunk in chunks],
+                                  [chunk.metadata for chunk in chunks], vectors, time.strftime("%Y%m%d%H%M%S"))
+        print(f"Artefakt w wersji {manifest['version']}: {len(chunks)} fragmentów.")
+    else:
+        print("Tworzenie embeddingów i zapisywanie w bazie wektorowej ChromaDB...")
+        vector_store = Chroma.from_documents(
+            documents=chunks,
+            embedding=embeddings,
+            ids=ids,
+            persist_directory=DB_PATH
+        )
 
     print("-" * 50)
     print("Proces ingestii zakończony pomyślnie!")
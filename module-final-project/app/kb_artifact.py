@@ -0,0 +1,527 @@
+# Wersjonowany artefakt bazy wiedzy: eksport, otwieranie przez mmap i łatki delta
+
+"""
+Ten plik zamienia bazę wektorową w jeden przenośny artefakt, który można
+zbudować raz (np. w CI), skopiować do obrazu Dockera albo na serwer i od razu
+używać (VECTOR_BACKEND=artifact) – bez ponownej ingestii i embedowania.
+
+Układ katalogu artefaktu:
+
+    manifest.json                     – wersja, wersja poprzednia, wymiar wektorów,
+                                        lista segmentów z sumami SHA-256 plików,
+                                        usunięte wiersze (tombstones)
+    manifests/<wersja>.json           – wcześniejsze manifesty (do wycofania wdrożenia)
+    segments/<id>/vectors.f32.npy     – znormalizowane wektory float32
+                  chunk_*             – kolumny fragmentów: teksty (w blokach zstd), stabilne
+                                        identyfikatory, strony, źródła (zob. app/chunk_store.py)
+                  lexical_*           – indeks odwrócony BM25 (słownik, listy wystąpień, długości)
+                  bitsets.*           – bitsety filtrów metadanych (zob. app/filters.py)
+
+Otwarcie artefaktu czyta tylko manifest i mapuje pliki przez mmap – koszt
+nie zależy od liczby fragmentów. Tekst fragmentu jest odczytywany dopiero
+wtedy, gdy trafia do wyników. Ranking BM25 (`lexical_search_with_vectors`)
+`FusionRetriever` łączy z rankingami wektorowymi (wyszukiwanie hybrydowe).
+
+Segmenty są niezmienne. Łatka (`diff`) zawiera nowy segment z dodanymi
+fragmentami i listę usuniętych wierszy starych segmentów; `apply` dokłada ten
+segment i atomowo podmienia manifest, więc wdrożenie nowej wersji kopiuje
+tylko zmiany.
+
+Uruchomienie (z głównego folderu projektu):
+    python -m app.kb_artifact export dist/kb-2 --version 2 --source chroma
+    python -m app.kb_artifact diff dist/kb-1 dist/kb-2 dist/patch-1-2
+    python -m app.kb_artifact apply vector_db/kb dist/patch-1-2
+    python -m app.kb_artifact verify vector_db/kb
+    python -m app.kb_artifact rollback vector_db/kb 1
+"""
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from app.chunk_store import ChunkStore
+from app.filters import MetadataBitsets
+from app.local_store import LOCAL_INDEX_PATH, VECTOR_BACKEND, LocalVectorStore, normalize
+from app.sharding import SHARDS_PATH, chunk_id
+from collections import Counter
+from itertools import islice
+import argparse
+import hashlib
+import heapq
+import json
+import math
+import numpy as np
+import os
+import re
+import shutil
+import time
+import uuid
+
+FORMAT = "rodo-kb/1"
+KB_ARTIFACT_PATH = os.getenv("KB_ARTIFACT_PATH", os.path.join(os.path.dirname(__file__), '..', 'vector_db', 'kb'))
+DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'vector_db')
+SCAN_BLOCK = 8192
+# Parametry BM25 (typowe wartości z literatury).
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+class ArtifactError(Exception):
+    """Artefakt jest niekompletny, uszkodzony albo łatka nie pasuje do jego wersji."""
+
+
+def tokenize(text: str):
+    return re.findall(r"\w+", text.lower())
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_json(path: str, data):
+    """Zapis przez plik tymczasowy i os.replace – czytelnik widzi starą albo nową wersję, nigdy połowę."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def read_manifest(path: str):
+    try:
+        with open(os.path.join(path, "manifest.json"), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ArtifactError(f"Brak pliku manifest.json w {path}.")
+    if manifest.get("format") != FORMAT:
+        raise ArtifactError(f"Nieobsługiwany format artefaktu: {manifest.get('format')} (oczekiwano {FORMAT}).")
+    return manifest
+
+
+def _write_lexical(path: str, texts):
+    """Indeks odwrócony: posortowany słownik, a dla każdego termu zakres w płaskich tablicach (wiersz, liczba wystąpień)."""
+    postings, lengths = {}, []
+    for row, text in enumerate(texts):
+        counts = Counter(tokenize(text))
+        lengths.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((row, tf))
+    terms = sorted(postings)
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+    rows = np.fromiter((row for term in terms for row, _ in postings[term]), dtype=np.int32, count=int(offsets[-1]))
+    tfs = np.fromiter((min(tf, 65535) for term in terms for _, tf in postings[term]), dtype=np.uint16,
+                      count=int(offsets[-1]))
+    with open(os.path.join(path, "lexical_terms.json"), "w", encoding="utf-8") as f:
+        json.dump(terms, f, ensure_ascii=False)
+    np.save(os.path.join(path, "lexical_offsets.i64.npy"), offsets)
+    np.save(os.path.join(path, "lexical_rows.i32.npy"), rows)
+    np.save(os.path.join(path, "lexical_tf.u16.npy"), tfs)
+    np.save(os.path.join(path, "lexical_lengths.u32.npy"), np.asarray(lengths, dtype=np.uint32))
+    return int(sum(lengths))
+
+
+def write_segment(root: str, ids, texts, metadatas, vectors):
+    """Zapisuje niezmienny segment w `root/segments/<id>` i zwraca jego wpis do manifestu."""
+    segment_id = uuid.uuid4().hex[:12]
+    path = os.path.join(root, "segments", segment_id)
+    os.makedirs(path)
+    np.save(os.path.join(path, "vectors.f32.npy"), normalize(vectors))
+    chunks = ChunkStore()
+    chunks.extend(ids, texts, metadatas)
+    chunks.save(path)
+    tokens = _write_lexical(path, texts)
+    MetadataBitsets.build(metadatas).save(path)
+    files = {name: {"sha256": _sha256(os.path.join(path, name)), "bytes": os.path.getsize(os.path.join(path, name))}
+             for name in sorted(os.listdir(path))}
+    return {"id": segment_id, "count": len(ids), "tokens": tokens, "files": files}
+
+
+def write_artifact(path: str, ids, texts, metadatas, vectors, version: str):
+    """Buduje pełny artefakt z jednym segmentem; istniejący katalog `path` jest zastępowany w całości."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    tmp = f"{path}.tmp"
+    if os.path.isdir(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    segments = [write_segment(tmp, ids, texts, metadatas, vectors)] if len(ids) else []
+    _write_json(os.path.join(tmp, "manifest.json"), {
+        "format": FORMAT, "type": "full", "version": version, "parent": None,
+        "dimension": int(vectors.shape[1]) if len(ids) else 0, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "segments": segments, "deleted": {},
+    })
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+    return read_manifest(path)
+
+
+def read_vector_db(source: str):
+    """Czyta (identyfikatory, teksty, metadane, wektory) z bieżącej bazy: chroma, local albo sharded."""
+    if source == "local":
+        stores = [LocalVectorStore.load(LOCAL_INDEX_PATH, None, "none")]
+    elif source == "sharded":
+        with open(os.path.join(SHARDS_PATH, "shards.json"), encoding="utf-8") as f:
+            sizes = json.load(f)["sizes"]
+        stores = [LocalVectorStore.load(os.path.join(SHARDS_PATH, f"shard-{shard}"), None, "none")
+                  for shard, size in enumerate(sizes) if size]
+    elif source == "chroma":
+        from langchain_community.vectorstores import Chroma
+        data = Chroma(persist_directory=DB_PATH)._collection.get(include=["documents", "metadatas", "embeddings"])
+        texts, metadatas = data["documents"], [metadata or {} for metadata in data["metadatas"]]
+        vectors = np.asarray(data["embeddings"], dtype=np.float32)
+        stores = []
+    else:
+        raise ArtifactError(f"Nie można wyeksportować bazy '{source}' (dostępne: chroma, local, sharded).")
+    if stores:
+        texts = [text for store in stores for text in store.chunks.texts()]
+        metadatas = [metadata for store in stores for metadata in store.chunks.metadatas()]
+        vectors = np.vstack([np.asarray(store.vectors, dtype=np.float32) for store in stores])
+
+    # Identyfikatory liczone z treści są takie same w każdej wersji, co pozwala policzyć różnicę między wersjami.
+    ids, rows = [], []
+    seen = set()
+    for row, (text, metadata) in enumerate(zip(texts, metadatas)):
+        doc_id = chunk_id(Document(page_content=text, metadata=metadata))
+        if doc_id not in seen:
+            seen.add(doc_id)
+            ids.append(doc_id)
+            rows.append(row)
+    return ids, [texts[row] for row in rows], [metadatas[row] for row in rows], vectors[rows]
+
+
+class Segment:
+    """Otwarty segment: wektory i kolumny fragmentów są mapowane przez mmap, nic nie jest czytane z góry."""
+
+    def __init__(self, root: str, entry, deleted=()):
+        self.id = entry["id"]
+        self.count = entry["count"]
+        self.tokens = entry["tokens"]
+        self.path = os.path.join(root, "segments", self.id)
+        self.vectors = np.load(os.path.join(self.path, "vectors.f32.npy"), mmap_mode="r")
+        self.chunks = ChunkStore.load(self.path)
+        self.bitsets = MetadataBitsets.load(self.path)
+        self.alive = None
+        if len(deleted):
+            self.alive = np.ones(self.count, dtype=bool)
+            self.alive[list(deleted)] = False
+        self._terms = None
+
+    def document(self, row: int) -> Document:
+        return self.chunks.document(row)
+
+    def mask(self, filters):
+        """Maska wierszy żywych i pasujących do filtra albo None, gdy pasują wszystkie."""
+        mask = self.alive
+        if filters:
+            matching = self.bitsets.mask(filters)
+            mask = matching if mask is None else mask & matching
+        return mask
+
+    def search(self, query, k: int, mask=None):
+        """Lista par (podobieństwo, wiersz) `k` najbliższych wierszy, od najbliższego."""
+        rows, scores = [], []
+        for start in range(0, self.count, SCAN_BLOCK):
+            end = min(start + SCAN_BLOCK, self.count)
+            block_mask = None if mask is None else mask[start:end]
+            if block_mask is not None and not block_mask.any():
+                continue
+            block = np.asarray(self.vectors[start:end]) @ query
+            if block_mask is not None:
+                block[~block_mask] = -np.inf
+            top = LocalVectorStore._top(block, k)
+            top = top[np.isfinite(block[top])]
+            rows.append(top + start)
+            scores.append(block[top])
+        if not rows:
+            return []
+        rows, scores = np.concatenate(rows), np.concatenate(scores)
+        best = LocalVectorStore._top(scores, k)
+        return [(float(scores[i]), int(rows[i])) for i in best]
+
+    def _lexical(self):
+        if self._terms is None:
+            with open(os.path.join(self.path, "lexical_terms.json"), encoding="utf-8") as f:
+                self._terms = {term: i for i, term in enumerate(json.load(f))}
+            self._postings = tuple(np.load(os.path.join(self.path, name), mmap_mode="r") for name in (
+                "lexical_offsets.i64.npy", "lexical_rows.i32.npy", "lexical_tf.u16.npy", "lexical_lengths.u32.npy"))
+        return self._terms
+
+    def postings(self, term: str):
+        """Wiersze zawierające term i liczba jego wystąpień w każdym z nich."""
+        index = self._lexical().get(term)
+        if index is None:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint16)
+        offsets, rows, tfs, _ = self._postings
+        return rows[offsets[index]:offsets[index + 1]], tfs[offsets[index]:offsets[index + 1]]
+
+    def lengths(self):
+        self._lexical()
+        return self._postings[3]
+
+
+class KnowledgeBaseStore(VectorStore):
+    """VectorStore nad artefaktem bazy wiedzy: wyszukiwanie wektorowe i BM25 po wszystkich segmentach."""
+
+    def __init__(self, embedding, path: str, manifest, segments):
+        self._embedding = embedding
+        self.path = path
+        self.manifest = manifest
+        self.version = manifest["version"]
+        self.segments = segments
+
+    @classmethod
+    def open(cls, path: str, embedding, verify: bool = False):
+        """Otwiera artefakt; `verify=True` dodatkowo sprawdza sumy kontrolne (czyta wtedy wszystkie pliki)."""
+        manifest = read_manifest(path)
+        if verify:
+            verify_artifact(path)
+        segments = [Segment(path, entry, manifest["deleted"].get(entry["id"], ())) for entry in manifest["segments"]]
+        return cls(embedding, path, manifest, segments)
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def __len__(self):
+        return sum(segment.count - len(self.manifest["deleted"].get(segment.id, ())) for segment in self.segments)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        raise NotImplementedError("Artefakt jest tylko do odczytu – nowe fragmenty dodaje łatka (`diff` + `apply`).")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Użyj `write_artifact`, a potem `KnowledgeBaseStore.open`.")
+
+    def get_by_ids(self, ids, /):
+        return [segment.document(row) for segment in self.segments for row in segment.chunks.find(ids)
+                if segment.alive is None or segment.alive[row]]
+
+    def search_with_scores_by_vectors(self, query_vectors, k: int, filters=None):
+        """Dla każdego zapytania lista trójek (dokument, podobieństwo, wektor), od najbliższego – jak w shardach."""
+        masks = [segment.mask(filters) for segment in self.segments]
+        results = []
+        for query_vector in query_vectors:
+            query = normalize(query_vector)[0]
+            if len(query) != self.manifest["dimension"]:
+                raise ValueError(f"Wymiar zapytania {len(query)} różni się od wymiaru artefaktu {self.manifest['dimension']}.")
+            per_segment = [[(score, segment, row) for score, row in segment.search(query, k, mask)]
+                           for segment, mask in zip(self.segments, masks)]
+            hits = islice(heapq.merge(*per_segment, key=lambda hit: -hit[0]), k)
+            results.append([(segment.document(row), score, np.asarray(segment.vectors[row], dtype=np.float32))
+                            for score, segment, row in hits])
+        return results
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, filter=None, **kwargs):
+        return [(doc, score) for doc, score, _ in self.search_with_scores_by_vectors([embedding], k, filter)[0]]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query, k: int = 4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query, k: int = 4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2
+
+    def search_by_vectors(self, query_vectors, k: int, filters=None):
+        """Jak `retrieval.search_many_with_vectors`: lista par (dokumenty, wektory) dla wielu zapytań."""
+        results = []
+        for hits in self.search_with_scores_by_vectors(query_vectors, k, filters):
+            vectors = np.asarray([vector for _, _, vector in hits], dtype=np.float32)
+            results.append(([doc for doc, _, _ in hits], vectors))
+        return results
+
+    def lexical_search(self, query: str, k: int = 4, filters=None):
+        """Wyszukiwanie słów kluczowych BM25 (statystyki liczone łącznie dla wszystkich segmentów)."""
+        return [(segment.document(row), score) for score, segment, row in self._lexical_hits(query, k, filters)]
+
+    def lexical_search_with_vectors(self, query: str, k: int, filters=None):
+        """Ranking BM25 jako para (dokumenty, wektory) – do łączenia z rankingami wektorowymi w RRF."""
+        hits = self._lexical_hits(query, k, filters)
+        vectors = np.asarray([segment.vectors[row] for _, segment, row in hits], dtype=np.float32)
+        return [segment.document(row) for _, segment, row in hits], vectors.reshape(len(hits), self.manifest["dimension"])
+
+    def _lexical_hits(self, query: str, k: int, filters=None):
+        terms = list(dict.fromkeys(tokenize(query)))
+        total = sum(segment.count for segment in self.segments)
+        if not terms or not total:
+            return []
+        average_length = sum(segment.tokens for segment in self.segments) / total
+        postings = [{term: segment.postings(term) for term in terms} for segment in self.segments]
+        frequency = {term: sum(len(found[term][0]) for found in postings) for term in terms}
+        per_segment = []
+        for segment, found, mask in zip(self.segments, postings, (segment.mask(filters) for segment in self.segments)):
+            scores = np.zeros(segment.count, dtype=np.float32)
+            lengths = segment.lengths()
+            for term in terms:
+                rows, tfs = found[term]
+                if not len(rows):
+                    continue
+                idf = math.log(1 + (total - frequency[term] + 0.5) / (frequency[term] + 0.5))
+                tf = tfs.astype(np.float32)
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[rows] / average_length)
+                scores[rows] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+            if mask is not None:
+                scores[~mask] = 0
+            top = LocalVectorStore._top(scores, k)
+            per_segment.append([(float(scores[row]), segment, int(row)) for row in top if scores[row] > 0])
+        return list(islice(heapq.merge(*per_segment, key=lambda hit: -hit[0]), k))
+
+
+def verify_artifact(path: str):
+    """Porównuje rozmiary i sumy SHA-256 wszystkich plików segmentów z manifestem."""
+    manifest = read_manifest(path)
+    problems = []
+    for entry in manifest["segments"]:
+        for name, expected in entry["files"].items():
+            file_path = os.path.join(path, "segments", entry["id"], name)
+            if not os.path.exists(file_path):
+                problems.append(f"{entry['id']}/{name}: brak pliku")
+            elif os.path.getsize(file_path) != expected["bytes"] or _sha256(file_path) != expected["sha256"]:
+                problems.append(f"{entry['id']}/{name}: niezgodna suma kontrolna")
+    if problems:
+        raise ArtifactError("Artefakt jest uszkodzony:\n" + "\n".join(problems))
+    return manifest
+
+
+def _alive_rows(path: str, manifest):
+    """Słownik identyfikator fragmentu -> (segment, wiersz) dla wszystkich nieusuniętych fragmentów."""
+    rows = {}
+    for entry in manifest["segments"]:
+        deleted = set(manifest["deleted"].get(entry["id"], ()))
+        segment = Segment(path, entry)
+        for row, doc_id in enumerate(segment.chunks.ids()):
+            if row not in deleted:
+                rows[doc_id] = (segment, row)
+    return rows
+
+
+def diff_artifacts(base: str, new: str, out: str):
+    """Zapisuje w `out` łatkę, która zamienia wersję `base` w wersję `new`."""
+    base_manifest, new_manifest = read_manifest(base), read_manifest(new)
+    if base_manifest["dimension"] and new_manifest["dimension"] and base_manifest["dimension"] != new_manifest["dimension"]:
+        raise ArtifactError("Wersje mają różny wymiar wektorów – zamiast łatki wdróż pełny artefakt.")
+    base_rows, new_rows = _alive_rows(base, base_manifest), _alive_rows(new, new_manifest)
+    added = [doc_id for doc_id in new_rows if doc_id not in base_rows]
+    deleted = {}
+    for doc_id, (segment, row) in base_rows.items():
+        if doc_id not in new_rows:
+            deleted.setdefault(segment.id, []).append(row)
+
+    if os.path.isdir(out):
+        shutil.rmtree(out)
+    os.makedirs(out)
+    segments = []
+    if added:
+        hits = [new_rows[doc_id] for doc_id in added]
+        segments.append(write_segment(out, added, [segment.chunks.text(row) for segment, row in hits],
+                                      [segment.chunks.metadata(row) for segment, row in hits],
+                                      np.vstack([segment.vectors[row] for segment, row in hits])))
+    _write_json(os.path.join(out, "manifest.json"), {
+        "format": FORMAT, "type": "patch", "version": new_manifest["version"], "parent": base_manifest["version"],
+        "dimension": new_manifest["dimension"], "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "segments": segments, "deleted": {segment_id: sorted(rows) for segment_id, rows in deleted.items()},
+    })
+    return len(added), sum(len(rows) for rows in deleted.values())
+
+
+def apply_patch(path: str, patch: str):
+    """Dokłada segmenty łatki do artefaktu i atomowo przełącza manifest na nową wersję."""
+    manifest, patch_manifest = read_manifest(path), verify_artifact(patch)
+    if patch_manifest.get("type") != "patch":
+        raise ArtifactError(f"{patch} nie jest łatką.")
+    if patch_manifest["parent"] != manifest["version"]:
+        raise ArtifactError(f"Łatka dotyczy wersji {patch_manifest['parent']}, a artefakt ma wersję {manifest['version']}.")
+    for entry in patch_manifest["segments"]:
+        target = os.path.join(path, "segments", entry["id"])
+        if not os.path.isdir(target):
+            shutil.copytree(os.path.join(patch, "segments", entry["id"]), target)
+    deleted = {segment_id: list(rows) for segment_id, rows in manifest["deleted"].items()}
+    for segment_id, rows in patch_manifest["deleted"].items():
+        deleted[segment_id] = sorted(set(deleted.get(segment_id, [])) | set(rows))
+
+    os.makedirs(os.path.join(path, "manifests"), exist_ok=True)
+    _write_json(os.path.join(path, "manifests", f"{manifest['version']}.json"), manifest)
+    updated = dict(manifest, version=patch_manifest["version"], parent=manifest["version"],
+                   dimension=manifest["dimension"] or patch_manifest["dimension"],
+                   created=patch_manifest["created"], segments=manifest["segments"] + patch_manifest["segments"],
+                   deleted=deleted)
+    _write_json(os.path.join(path, "manifest.json"), updated)
+    return updated
+
+
+def rollback(path: str, version: str):
+    """Przywraca zapisany manifest wcześniejszej wersji (segmenty nie są nigdy usuwane, więc wciąż są na dysku)."""
+    manifest = read_manifest(path)
+    archived = os.path.join(path, "manifests", f"{version}.json")
+    if not os.path.exists(archived):
+        raise ArtifactError(f"Brak zapisanego manifestu wersji {version}.")
+    os.makedirs(os.path.join(path, "manifests"), exist_ok=True)
+    _write_json(os.path.join(path, "manifests", f"{manifest['version']}.json"), manifest)
+    with open(archived, encoding="utf-8") as f:
+        _write_json(os.path.join(path, "manifest.json"), json.load(f))
+
+
+def describe(path: str):
+    manifest = read_manifest(path)
+    size = sum(file["bytes"] for entry in manifest["segments"] for file in entry["files"].values())
+    deleted = sum(len(rows) for rows in manifest["deleted"].values())
+    print(f"Artefakt {path}: wersja {manifest['version']} (poprzednia: {manifest['parent']}), "
+          f"wymiar {manifest['dimension']}, {len(manifest['segments'])} segmentów, "
+          f"{sum(entry['count'] for entry in manifest['segments']) - deleted} fragmentów "
+          f"({deleted} usuniętych), {size / 1024 / 1024:.1f} MB.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Artefakt bazy wiedzy RODO Ekspert AI: eksport, łatki, weryfikacja.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="Eksportuje bieżącą bazę wektorową do pełnego artefaktu.")
+    export.add_argument("path")
+    export.add_argument("--version", default=time.strftime("%Y%m%d%H%M%S"))
+    export.add_argument("--source", default=VECTOR_BACKEND if VECTOR_BACKEND != "artifact" else "chroma",
+                        choices=["chroma", "local", "sharded"])
+    diff = commands.add_parser("diff", help="Tworzy łatkę między dwiema wersjami artefaktu.")
+    diff.add_argument("base")
+    diff.add_argument("new")
+    diff.add_argument("out")
+    apply = commands.add_parser("apply", help="Nakłada łatkę na artefakt.")
+    apply.add_argument("path")
+    apply.add_argument("patch")
+    verify = commands.add_parser("verify", help="Sprawdza sumy kontrolne artefaktu.")
+    verify.add_argument("path")
+    back = commands.add_parser("rollback", help="Wraca do wcześniejszej wersji artefaktu.")
+    back.add_argument("path")
+    back.add_argument("version")
+    info = commands.add_parser("info", help="Pokazuje wersję i rozmiar artefaktu.")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        ids, texts, metadatas, vectors = read_vector_db(args.source)
+        write_artifact(args.path, ids, texts, metadatas, vectors, args.version)
+        describe(args.path)
+    elif args.command == "diff":
+        added, deleted = diff_artifacts(args.base, args.new, args.out)
+        print(f"Łatka {args.out}: {added} nowych i {deleted} usuniętych fragmentów.")
+    elif args.command == "apply":
+        apply_patch(args.path, args.patch)
+        describe(args.path)
+    elif args.command == "verify":
+        verify_artifact(args.path)
+        print("Sumy kontrolne się zgadzają.")
+        describe(args.path)
+    elif args.command == "rollback":
+        rollback(args.path, args.version)
+        describe(args.path)
+    else:
+        describe(args.path)
+
+
+if __name__ == "__main__":
+    main()
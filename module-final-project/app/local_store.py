@@ -0,0 +1,321 @@
+# Lokalny magazyn wektorów na plikach NumPy, z kwantyzacją int8 i binarną
+
+"""
+Ten plik zawiera alternatywny backend bazy wektorowej (VECTOR_BACKEND=local).
+
+Wektory w pełnej precyzji (float32) leżą na dysku w pliku `.npy` i są
+otwierane przez mmap – system wczytuje z nich tylko te wiersze, których
+akurat potrzebujemy. Do przeszukiwania całej bazy służy jedna z wersji
+indeksu (VECTOR_QUANTIZATION):
+
+- `none`   – pełne wektory float32 (4 bajty na wymiar),
+- `int8`   – kwantyzacja skalarna z osobną skalą dla każdego wymiaru (1 bajt),
+- `binary` – sam znak każdej współrzędnej (1 bit); kandydatów wybiera
+             odległość Hamminga.
+
+Dla wersji skwantyzowanych wybieramy `k * RESCORE_FACTOR` kandydatów, a
+ostateczną kolejność ustala dokładne podobieństwo kosinusowe policzone na
+wektorach float32 tylko dla tych kandydatów.
+
+Przy bardzo dużych bazach zamiast skanować wszystkie wiersze można użyć
+grafu HNSW (VECTOR_INDEX=hnsw, zob. `app/hnsw.py`), budowanego przyrostowo
+podczas ingestii i zapisywanego obok wektorów.
+
+Filtry metadanych (`filter=...`, zob. `app/filters.py`) korzystają z bitsetów
+liczonych przy ingestii. Maska filtra jest stosowana w trakcie skanowania:
+bloki bez pasujących fragmentów są pomijane, a przy wąskich filtrach liczymy
+dokładne podobieństwo tylko dla pasujących wierszy.
+
+Teksty i metadane fragmentów leżą w kolumnach `ChunkStore` (zob.
+`app/chunk_store.py`); obiekty `Document` powstają tylko dla zwracanych wyników.
+"""
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from app.chunk_store import ChunkStore
+from app.filters import MetadataBitsets
+from app.hnsw import HNSWIndex
+import numpy as np
+import os
+import uuid
+
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+VECTOR_INDEX = os.getenv("VECTOR_INDEX", "flat")
+RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+LOCAL_INDEX_PATH = os.path.join(os.path.dirname(__file__), '..', 'vector_db', 'local')
+
+QUANTIZATIONS = ("none", "int8", "binary")
+INDEXES = ("flat", "hnsw")
+
+# Liczba wierszy skanowanych naraz – tymczasowa macierz float32 z kodów int8 mieści się w cache procesora.
+_SCAN_BLOCK = 8192
+# Graf HNSW z filtrem odwiedza też niepasujące węzły; gdy pasuje mniej niż taki ułamek bazy,
+# taniej jest policzyć podobieństwo wprost dla pasujących wierszy.
+_HNSW_FILTER_RATIO = 0.1
+
+if hasattr(np, "bitwise_count"):
+    _popcount = np.bitwise_count
+else:
+    _POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def _popcount(values):
+        return _POPCOUNT_TABLE[values]
+
+
+def normalize(vectors) -> np.ndarray:
+    """Normalizuje wiersze do długości 1, aby iloczyn skalarny był podobieństwem kosinusowym."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def quantize_int8(vectors):
+    """Kwantyzacja symetryczna: kody int8 i skala float32 dla każdego wymiaru."""
+    scale = np.maximum(np.abs(vectors).max(axis=0), 1e-12) / 127
+    codes = np.clip(np.rint(vectors / scale), -127, 127).astype(np.int8)
+    return codes, scale.astype(np.float32)
+
+
+def quantize_binary(vectors) -> np.ndarray:
+    """Jeden bit na wymiar (znak współrzędnej), spakowany po 8 w bajcie."""
+    return np.packbits(vectors > 0, axis=1)
+
+
+class LocalVectorStore(VectorStore):
+    """Baza wektorowa na plikach NumPy z opcjonalną kwantyzacją i dokładnym przeliczeniem wyników."""
+
+    def __init__(self, embedding, quantization: str = VECTOR_QUANTIZATION, rescore_factor: int = RESCORE_FACTOR,
+                 index: str = VECTOR_INDEX):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Nieznany rodzaj kwantyzacji: {quantization} (dostępne: {', '.join(QUANTIZATIONS)})")
+        if index not in INDEXES:
+            raise ValueError(f"Nieznany rodzaj indeksu: {index} (dostępne: {', '.join(INDEXES)})")
+        self._embedding = embedding
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.index = index
+        self.hnsw = None
+        self.chunks = ChunkStore()
+        self.vectors = None
+        self._codes = None
+        self._scale = None
+        self._bits = None
+        self.bitsets = None
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(texts, self._embedding.embed_documents(texts), metadatas, ids)
+
+    def add_embeddings(self, texts, vectors, metadatas=None, ids=None):
+        """Dodaje gotowe wektory (np. z cache'u embeddingów) razem z ich tekstami."""
+        texts = list(texts)
+        ids = list(ids) if ids is not None else [uuid.uuid4().hex for _ in texts]
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        vectors = normalize(vectors)
+        self.vectors = vectors if self.vectors is None else np.vstack([self.vectors, vectors])
+        self.chunks.extend(ids, texts, metadatas)
+        # Skala int8 zależy od całego zbioru, więc kody przeliczamy przy następnym użyciu.
+        self._codes = self._scale = self._bits = None
+        self.bitsets = None
+        if self.index == "hnsw":
+            # Graf rośnie razem z bazą – nowe wektory są od razu wstawiane do HNSW.
+            self._ensure_hnsw(len(self) - len(ids))
+            self.hnsw.add(vectors)
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    def _ensure_hnsw(self, count: int = None):
+        """Tworzy graf HNSW i wstawia do niego pierwsze `count` wektorów (domyślnie wszystkie)."""
+        if self.hnsw is None:
+            count = len(self) if count is None else count
+            self.hnsw = HNSWIndex(self.vectors.shape[1])
+            if count:
+                print(f"Budowanie grafu HNSW dla {count} wektorów...")
+                self.hnsw.add(self.vectors[:count])
+
+    def _ensure_codes(self):
+        if self.quantization == "int8" and self._codes is None:
+            self._codes, self._scale = quantize_int8(self.vectors)
+        elif self.quantization == "binary" and self._bits is None:
+            self._bits = quantize_binary(self.vectors)
+
+    def _ensure_bitsets(self):
+        if self.bitsets is None:
+            self.bitsets = MetadataBitsets.build(self.chunks.metadatas())
+
+    def filter_mask(self, filters):
+        """Maska fragmentów spełniających filtr metadanych (None, gdy filtra nie ma)."""
+        if not filters:
+            return None
+        self._ensure_bitsets()
+        return self.bitsets.mask(filters)
+
+    def index_nbytes(self) -> int:
+        """Ile bajtów indeksu musi być w pamięci, aby przeskanować całą bazę."""
+        self._ensure_codes()
+        if self.quantization == "int8":
+            return self._codes.nbytes + self._scale.nbytes
+        if self.quantization == "binary":
+            return self._bits.nbytes
+        return 0 if self.vectors is None else self.vectors.nbytes
+
+    def _approximate_scores(self, query, start, end):
+        """Przybliżone podobieństwo zapytania do wierszy [start, end) (większe = bliżej)."""
+        if self.quantization == "int8":
+            return self._codes[start:end].astype(np.float32) @ (query * self._scale)
+        if self.quantization == "binary":
+            query_bits = quantize_binary(query[None, :])[0]
+            distance = _popcount(np.bitwise_xor(self._bits[start:end], query_bits)).sum(axis=1, dtype=np.int32)
+            return -distance.astype(np.float32)
+        return np.asarray(self.vectors[start:end]) @ query
+
+    @staticmethod
+    def _top(scores, count):
+        count = min(count, len(scores))
+        if count <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-scores, count - 1)[:count]
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def _exact(self, query, rows, k: int):
+        """Dokładne podobieństwo dla wybranych wierszy – z mmapu czytamy tylko je."""
+        rows = np.sort(rows)
+        exact = np.asarray(self.vectors[rows]) @ query
+        best = self._top(exact, k)
+        return rows[best], exact[best]
+
+    def search_indices(self, query_vector, k: int, mask=None):
+        """Zwraca (indeksy, dokładne podobieństwa) `k` najbliższych wierszy; `mask` zawęża wyszukiwanie."""
+        empty = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        if not len(self):
+            return empty
+        query = normalize(query_vector)[0]
+        if mask is not None:
+            matching = np.count_nonzero(mask)
+            if not matching:
+                return empty
+            narrow = self.index == "hnsw" and matching <= _HNSW_FILTER_RATIO * len(self)
+            if narrow or matching <= _SCAN_BLOCK:
+                return self._exact(query, np.flatnonzero(mask), k)
+            if matching == len(self):
+                mask = None
+        if self.index == "hnsw":
+            self._ensure_hnsw()
+            return self.hnsw.search(query, k, allowed=mask)
+        self._ensure_codes()
+        fetch = k if self.quantization == "none" else k * self.rescore_factor
+
+        candidates, scores = [], []
+        for start in range(0, len(self), _SCAN_BLOCK):
+            end = min(start + _SCAN_BLOCK, len(self))
+            block_mask = None if mask is None else mask[start:end]
+            if block_mask is not None and not block_mask.any():
+                continue
+            block = self._approximate_scores(query, start, end)
+            if block_mask is not None and not block_mask.all():
+                block[~block_mask] = -np.inf
+            top = self._top(block, fetch)
+            if block_mask is not None:
+                top = top[np.isfinite(block[top])]
+            candidates.append(top + start)
+            scores.append(block[top])
+        candidates = np.concatenate(candidates)
+        candidates = candidates[self._top(np.concatenate(scores), fetch)]
+
+        # Dokładne przeliczenie na wektorach float32 tylko dla kandydatów.
+        return self._exact(query, candidates, k)
+
+    def _document(self, index) -> Document:
+        # Obiekt Document powstaje tylko dla zwracanych wyników – reszta fragmentów zostaje w kolumnach.
+        return self.chunks[int(index)].to_document()
+
+    def get_by_ids(self, ids, /):
+        return [self._document(row) for row in self.chunks.find(ids)]
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, filter=None, **kwargs):
+        indices, scores = self.search_indices(embedding, k, self.filter_mask(filter))
+        return [(self._document(i), float(score)) for i, score in zip(indices, scores)]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query, k: int = 4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query, k: int = 4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Wektory są znormalizowane, więc wynik to podobieństwo kosinusowe z zakresu [-1, 1].
+        return lambda score: (score + 1) / 2
+
+    def search_by_vectors(self, query_vectors, k: int, filters=None):
+        """Jak `retrieval.search_many_with_vectors`: lista par (dokumenty, ich wektory) dla wielu zapytań."""
+        mask = self.filter_mask(filters)
+        results = []
+        for query_vector in query_vectors:
+            indices, _ = self.search_indices(query_vector, k, mask)
+            results.append(([self._document(i) for i in indices], np.asarray(self.vectors[indices], dtype=np.float32)))
+        return results
+
+    def search_with_scores_by_vectors(self, query_vectors, k: int, filters=None):
+        """Dla każdego zapytania lista trójek (dokument, podobieństwo, wektor), od najbliższego – jak w shardach."""
+        mask = self.filter_mask(filters)
+        results = []
+        for query_vector in query_vectors:
+            indices, scores = self.search_indices(query_vector, k, mask)
+            vectors = np.asarray(self.vectors[indices], dtype=np.float32)
+            results.append([(self._document(i), float(score), vector) for i, score, vector in zip(indices, scores, vectors)])
+        return results
+
+    def save(self, path: str = LOCAL_INDEX_PATH):
+        """Zapisuje wektory, kody skwantyzowane, bitsety filtrów i kolumny fragmentów do katalogu."""
+        os.makedirs(path, exist_ok=True)
+        self._ensure_codes()
+        self._ensure_bitsets()
+        self.bitsets.save(path)
+        np.save(os.path.join(path, "vectors.f32.npy"), np.asarray(self.vectors, dtype=np.float32))
+        if self._codes is not None:
+            np.save(os.path.join(path, "codes.i8.npy"), self._codes)
+            np.save(os.path.join(path, "scale.f32.npy"), self._scale)
+        if self._bits is not None:
+            np.save(os.path.join(path, "bits.u8.npy"), self._bits)
+        if self.hnsw is not None:
+            self.hnsw.save(os.path.join(path, "hnsw.npz"))
+        self.chunks.save(path)
+
+    @classmethod
+    def load(cls, path: str, embedding, quantization: str = VECTOR_QUANTIZATION, rescore_factor: int = RESCORE_FACTOR,
+             index: str = VECTOR_INDEX):
+        """
+        Wczytuje magazyn z katalogu. Wektory float32 i kolumny fragmentów są otwierane
+        przez mmap; do pamięci trafia tylko indeks wybranego rodzaju (brakujący jest
+        liczony od nowa).
+        """
+        store = cls(embedding, quantization, rescore_factor, index)
+        store.vectors = np.load(os.path.join(path, "vectors.f32.npy"), mmap_mode="r")
+        if quantization == "int8" and os.path.exists(os.path.join(path, "codes.i8.npy")):
+            store._codes = np.load(os.path.join(path, "codes.i8.npy"))
+            store._scale = np.load(os.path.join(path, "scale.f32.npy"))
+        elif quantization == "binary" and os.path.exists(os.path.join(path, "bits.u8.npy")):
+            store._bits = np.load(os.path.join(path, "bits.u8.npy"))
+        elif quantization == "none":
+            store.vectors = np.load(os.path.join(path, "vectors.f32.npy"))
+        store.chunks = ChunkStore.load(path)
+        store.bitsets = MetadataBitsets.load(path)
+        if index == "hnsw" and os.path.exists(os.path.join(path, "hnsw.npz")):
+            store.hnsw = HNSWIndex.load(os.path.join(path, "hnsw.npz"), store.vectors)
+        return store
@@ -4,10 +4,22 @@
 Główny plik aplikacji FastAPI.
 Definiuje endpointy API, obsługuje zapytania i odpowiedzi.
 """
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from app.core import get_qa_chain
-from typing import List
+from fastapi import BackgroundTasks, Depends, FastAPI, Header, HTTPException, Response
+from fastapi.security import APIKeyHeader
+from pydantic import BaseModel, Field
+from app.admission import TRUST_PLAN_HEADER, AdmissionRejected, get_admission_controller, resolve_tier
+from app.api_keys import QuotaExceeded, get_registry
+from app.chat_memory import SessionStore, compact_session
+from app.chunk_refs import CHUNK_CACHE_CONTROL, chunk_etag, etag_matches
+from app.core import get_rag_pipeline
+from app.filters import InvalidFilter, validate
+from app.http_client import aclose_http_clients, close_http_clients, connection_stats
+from app.rate_limit import RateLimitTimeout
+from app.resilience import Deadline, DeadlineExceeded
+from app import metrics
+from typing import Any, Dict, List, Optional
+import os
+import uuid
 
 app = FastAPI(
     title="RODO Ekspert AI API",
@@ -15,21 +27,49 @@ app = FastAPI(
 )
 
 qa_chain = None
+chat_sessions = None
+
+# Domyślny limit czasu zapytania, jeśli klient nie poda własnego (w sekundach).
+DEFAULT_TIMEOUT_S = float(os.getenv("REQUEST_TIMEOUT_S", "60"))
 
 @app.on_event("startup")
 def startup_event():
-    """Inicjalizuje łańcuch QA przy starcie aplikacji."""
-    global qa_chain
+    """Inicjalizuje rejestr kluczy API i łańcuch QA przy starcie aplikacji."""
+    global qa_chain, chat_sessions
+    # Poza blokiem try: zła konfiguracja kluczy ma zatrzymać start serwera, a nie API działające bez nich.
+    get_registry()
     try:
-        qa_chain = get_qa_chain()
+        qa_chain = get_rag_pipeline()
+        chat_sessions = SessionStore()
         print("Łańcuch QA został pomyślnie załadowany.")
     except Exception as e:
         print(f"BŁĄD krytyczny: Nie udało się załadować łańcucha QA: {e}")
         print("Sprawdź, czy baza wektorowa 'vector_db/' istnieje. Uruchom 'ingest_data.py'.")
 
+@app.on_event("shutdown")
+def shutdown_event():
+    """Zamyka współdzielone połączenia HTTP do dostawcy LLM."""
+    close_http_clients()
+    if chat_sessions is not None:
+        chat_sessions.flush()
+    registry = get_registry()
+    if registry is not None:
+        registry.stop()
+
+@app.on_event("shutdown")
+async def close_async_http_client():
+    """Zamyka pulę połączeń asynchronicznego klienta HTTP (wymaga pętli zdarzeń)."""
+    await aclose_http_clients()
+
 # Modele danych Pydantic dla walidacji i dokumentacji API
 class QueryRequest(BaseModel):
     query: str
+    # Limit czasu, w którym klient oczekuje odpowiedzi; serwer rozdziela go na etapy potoku.
+    timeout_s: Optional[float] = Field(default=None, gt=0, le=300)
+    # Zawężenie wyszukiwania po metadanych, np. {"page": {"$gte": 10, "$lte": 20}} (zob. app/filters.py).
+    filters: Optional[Dict[str, Any]] = None
+    # Zamiast treści fragmentów zwróć tylko odwołania do nich (`sources`); treść jest pod /chunks/{id}.
+    references: bool = False
 
 class DocumentMetadata(BaseModel):
     page: int
@@ -39,28 +79,180 @@ class Document(BaseModel):
     page_content: str
     metadata: DocumentMetadata
 
+class SourceReference(BaseModel):
+    id: str
+    page: Optional[int] = None
+    source: Optional[str] = None
+    # Podobieństwo kosinusowe do pytania (brak, gdy potok go nie zna).
+    score: Optional[float] = None
+
+class ChunkResponse(Document):
+    id: str
+
 class QueryResponse(BaseModel):
     answer: str
     source_documents: List[Document]
+    sources: Optional[List[SourceReference]] = None
+    # True, gdy LLM był niedostępny i zwracamy wyłącznie znalezione fragmenty RODO.
+    degraded: bool = False
+
+class ChatRequest(BaseModel):
+    message: str
+    # Identyfikator rozmowy; pominięty rozpoczyna nową sesję.
+    session_id: Optional[str] = Field(default=None, max_length=128)
+    timeout_s: Optional[float] = Field(default=None, gt=0, le=300)
+    references: bool = False
+
+class ChatResponse(QueryResponse):
+    session_id: str
 
 @app.get("/")
 def read_root():
     """Główny endpoint powitalny."""
     return {"message": "Witaj w API dla RODO Ekspert AI! Przejdź do /docs po dokumentację."}
 
+api_key_header_scheme = APIKeyHeader(name="X-Api-Key", auto_error=False)
+
+def verify_api_key(api_key: Optional[str] = Depends(api_key_header_scheme)):
+    """
+    Zależność FastAPI: sprawdza klucz z nagłówka X-Api-Key w rejestrze kluczy
+    i zajmuje jedno zapytanie z jego limitu. Bez skonfigurowanego rejestru
+    (API_KEYS_DB) API działa w trybie otwartym, jak dotychczas.
+    """
+    registry = get_registry()
+    if registry is None:
+        yield None
+        return
+    record = registry.authenticate(api_key)
+    if record is None:
+        raise HTTPException(status_code=403, detail="Nieprawidłowy lub brakujący klucz API")
+    try:
+        record.acquire()
+    except QuotaExceeded as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    try:
+        yield record
+    finally:
+        record.release()
+
+async def admission_control(x_customer_plan: Optional[str] = Header(default=None), api_key=Depends(verify_api_key)):
+    """
+    Zależność FastAPI: wpuszcza zapytanie do potoku dopiero, gdy plan klienta ma
+    wolne miejsce; w przeciwnym razie czeka w kolejce – w pętli zdarzeń, bez
+    zajmowania wątku z puli, na której działają endpointy. Plan pochodzi z klucza
+    API; nagłówek X-Customer-Plan jest brany pod uwagę tylko w trybie otwartym
+    i tylko za zaufanym proxy (ADMISSION_TRUST_PLAN_HEADER=1).
+    """
+    if api_key is not None:
+        tier = resolve_tier(api_key.tier)
+    else:
+        tier = resolve_tier(x_customer_plan if TRUST_PLAN_HEADER else None)
+    try:
+        async with get_admission_controller().admit_async(tier):
+            yield tier
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@app.get("/metrics")
+def read_metrics():
+    """Zwraca bieżące metryki aplikacji (m.in. ponowne użycie połączeń HTTP)."""
+    return {**metrics.snapshot(), "http": connection_stats()}
+
 @app.post("/ask", response_model=QueryResponse)
-def ask_question(request: QueryRequest):
+def ask_question(request: QueryRequest, tier: str = Depends(admission_control)):
     """Główny endpoint do zadawania pytań."""
     if not qa_chain:
         raise HTTPException(status_code=503, detail="Serwer nie jest gotowy. Łańcuch QA nie został załadowany.")
     if not request.query.strip():
         raise HTTPException(status_code=400, detail="Pytanie (query) nie może być puste.")
     
+    deadline = Deadline(request.timeout_s or DEFAULT_TIMEOUT_S)
     try:
-        result = qa_chain.invoke({"query": request.query})
+        if request.filters:
+            # Błędny filtr odrzucamy od razu, zanim pytanie trafi do embeddingów i bazy.
+            validate(request.filters)
+        result = qa_chain.invoke({"query": request.query, "filters": request.filters,
+                                  "references": request.references}, deadline=deadline)
         return {
             "answer": result.get("result", ""),
-            "source_documents": result.get("source_documents", [])
+            "source_documents": [] if request.references else result.get("source_documents", []),
+            "sources": result.get("sources"),
+            "degraded": result.get("degraded", False),
         }
+    except InvalidFilter as e:
+        raise HTTPException(status_code=400, detail=f"Nieprawidłowy filtr: {e}")
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except RateLimitTimeout as e:
+        # Budżet dostawcy nie zwolnił się przed deadline'em zapytania.
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Wystąpił wewnętrzny błąd serwera: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Wystąpił wewnętrzny błąd serwera: {str(e)}")
+
+def _compact_in_background(session):
+    """Zwija historię sesji do podsumowania po wysłaniu odpowiedzi, poza ścieżką zapytania."""
+    try:
+        compact_session(session, qa_chain.summarize)
+    except Exception as e:
+        print(f"Nie udało się podsumować historii sesji {session.session_id}: {e}")
+    finally:
+        chat_sessions.release(session)
+
+@app.post("/chat", response_model=ChatResponse)
+def chat(request: ChatRequest, background_tasks: BackgroundTasks, tier: str = Depends(admission_control),
+         api_key=Depends(verify_api_key)):
+    """
+    Endpoint konwersacyjny: pamięta historię rozmowy w ramach sesji. Przy
+    włączonych kluczach API sesje są oddzielone per klucz.
+    """
+    if not qa_chain:
+        raise HTTPException(status_code=503, detail="Serwer nie jest gotowy. Łańcuch QA nie został załadowany.")
+    if not request.message.strip():
+        raise HTTPException(status_code=400, detail="Wiadomość (message) nie może być pusta.")
+
+    owner = api_key.key_hash if api_key is not None else None
+    session = chat_sessions.get(request.session_id or uuid.uuid4().hex, owner)
+    deadline = Deadline(request.timeout_s or DEFAULT_TIMEOUT_S)
+    handed_off = False
+    try:
+        result = qa_chain.chat(session, request.message, deadline=deadline, references=request.references)
+        # Sesję odepnie zadanie w tle – po zwinięciu historii.
+        background_tasks.add_task(_compact_in_background, session)
+        handed_off = True
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except RateLimitTimeout as e:
+        # Budżet dostawcy nie zwolnił się przed deadline'em zapytania.
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Wystąpił wewnętrzny błąd serwera: {str(e)}")
+    finally:
+        if not handed_off:
+            chat_sessions.release(session)
+
+    return {
+        "session_id": session.session_id,
+        "answer": result["result"],
+        "source_documents": [] if request.references else result["source_documents"],
+        "sources": result.get("sources"),
+        "degraded": result["degraded"],
+    }
+
+@app.get("/chunks/{chunk_id}", response_model=ChunkResponse)
+def read_chunk(chunk_id: str, response: Response, if_none_match: Optional[str] = Header(default=None)):
+    """
+    Treść fragmentu wskazanego w `sources` odpowiedzi /ask lub /chat. Identyfikator
+    jest skrótem treści, więc odpowiedź ma silny ETag i może być buforowana na stałe.
+    Endpoint nie zajmuje limitów klucza API – zwraca tylko fragmenty publicznego tekstu
+    rozporządzenia, których identyfikatory klient dostał już w odpowiedzi.
+    """
+    if not qa_chain:
+        raise HTTPException(status_code=503, detail="Serwer nie jest gotowy. Łańcuch QA nie został załadowany.")
+    doc = qa_chain.chunk(chunk_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail=f"Nie znaleziono fragmentu {chunk_id}.")
+    headers = {"ETag": chunk_etag(chunk_id), "Cache-Control": CHUNK_CACHE_CONTROL}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return {"id": chunk_id, "page_content": doc.page_content, "metadata": doc.metadata}
@@ -0,0 +1,71 @@
+# Prosty, współdzielony rejestr metryk aplikacji
+
+"""
+Ten plik zbiera liczniki, wartości bieżące (gauge) i rozkłady czasów
+z różnych części aplikacji w jednym miejscu, bez zewnętrznych zależności.
+
+Migawkę wszystkich metryk zwraca funkcja `snapshot()`, a API udostępnia ją
+pod adresem `/metrics`.
+"""
+from collections import defaultdict, deque
+import threading
+
+# Ile ostatnich obserwacji trzymamy dla każdego rozkładu (okno przesuwne).
+WINDOW_SIZE = 2048
+
+_lock = threading.Lock()
+_counters = defaultdict(float)
+_gauges = {}
+_observations = defaultdict(lambda: deque(maxlen=WINDOW_SIZE))
+
+
+def incr(name: str, value: float = 1):
+    """Zwiększa licznik o podaną wartość."""
+    with _lock:
+        _counters[name] += value
+
+
+def set_gauge(name: str, value: float):
+    """Ustawia bieżącą wartość metryki (np. głębokość kolejki)."""
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, value: float):
+    """Zapisuje pojedynczą obserwację rozkładu (np. czas odpowiedzi w sekundach)."""
+    with _lock:
+        _observations[name].append(value)
+
+
+def percentile(name: str, q: float, default: float = None):
+    """Zwraca q-ty percentyl (0-100) z okna obserwacji lub `default`, gdy brak danych."""
+    with _lock:
+        values = sorted(_observations.get(name, ()))
+    if not values:
+        return default
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def count(name: str) -> int:
+    """Zwraca liczbę obserwacji w oknie danego rozkładu."""
+    with _lock:
+        return len(_observations.get(name, ()))
+
+
+def snapshot() -> dict:
+    """Zwraca migawkę wszystkich metryk w formie gotowej do serializacji JSON."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        names = list(_observations)
+    summaries = {
+        name: {
+            "count": count(name),
+            "p50": percentile(name, 50),
+            "p95": percentile(name, 95),
+            "p99": percentile(name, 99),
+        }
+        for name in names
+    }
+    return {"counters": counters, "gauges": gauges, "summaries": summaries}
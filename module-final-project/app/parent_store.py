@@ -0,0 +1,119 @@
+# Magazyn dokumentów nadrzędnych (stron PDF) dla wyszukiwania dwupoziomowego
+
+"""
+Ten plik zawiera kompaktowy magazyn klucz-wartość na dokumenty nadrzędne.
+
+W trybie dwupoziomowym (PARENT_RETRIEVAL=1 podczas ingestii) w bazie
+wektorowej lądują tylko małe fragmenty potomne (ok. 300 znaków), które
+precyzyjnie pasują do pytania. Każdy z nich ma w metadanych `parent_id`
+wskazujący stronę PDF, z której pochodzi. Pełne strony trzymamy tutaj –
+skompresowane zstd w SQLite – i pobieramy po identyfikatorach dopiero przy
+składaniu promptu, bez duplikatów. Obok identyfikatora strony zapisujemy jej
+`chunk_id`, żeby odwołanie `/chunks/{id}` do strony działało także po
+restarcie serwera.
+"""
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from app.sharding import chunk_id
+from app.text_blocks import compress, decompress
+from typing import Any
+import json
+import os
+import sqlite3
+import threading
+
+PARENTS_DB = os.path.join(os.path.dirname(__file__), '..', 'vector_db', 'parents.sqlite')
+
+# Ile różnych stron trafia do promptu w trybie dwupoziomowym.
+PARENT_MAX_DOCS = int(os.getenv("PARENT_MAX_DOCS", "3"))
+
+
+def parent_id(metadata: dict) -> str:
+    """Identyfikator dokumentu nadrzędnego: nazwa pliku i numer strony."""
+    return f"{os.path.basename(metadata.get('source', ''))}:{metadata.get('page', 0)}"
+
+
+class ParentStore:
+    """Dokumenty nadrzędne w SQLite, skompresowane zstd, pobierane po identyfikatorach."""
+
+    def __init__(self, path: str = PARENTS_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS parents (id TEXT PRIMARY KEY, chunk_id TEXT NOT NULL, data BLOB NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS parents_chunk_id ON parents (chunk_id)")
+        self._db.commit()
+        self._lock = threading.Lock()
+
+    def put_many(self, documents):
+        """Zapisuje dokumenty nadrzędne; identyfikator wynika z ich metadanych."""
+        rows = [
+            (parent_id(doc.metadata), chunk_id(doc),
+             compress(json.dumps({"text": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False).encode("utf-8")))
+            for doc in documents
+        ]
+        with self._lock:
+            self._db.executemany("INSERT OR REPLACE INTO parents (id, chunk_id, data) VALUES (?, ?, ?)", rows)
+            self._db.commit()
+
+    def get_many(self, ids):
+        """Zwraca słownik identyfikator -> Document dla znalezionych identyfikatorów."""
+        ids = list(ids)
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._db.execute(f"SELECT id, data FROM parents WHERE id IN ({placeholders})", ids).fetchall()
+        return {key: self._document(blob) for key, blob in rows}
+
+    def get_by_chunk_id(self, key: str):
+        """Strona o podanym `chunk_id` (identyfikator odwołania w `/chunks/{id}`) albo None."""
+        with self._lock:
+            row = self._db.execute("SELECT data FROM parents WHERE chunk_id = ?", (key,)).fetchone()
+        return self._document(row[0]) if row is not None else None
+
+    @staticmethod
+    def _document(blob):
+        data = json.loads(decompress(blob))
+        return Document(page_content=data["text"], metadata=data["metadata"])
+
+    def expand(self, children, max_parents: int = PARENT_MAX_DOCS):
+        """
+        Zamienia fragmenty potomne na ich dokumenty nadrzędne w kolejności
+        trafności, bez duplikatów. Fragmenty bez `parent_id` zostają bez zmian.
+        """
+        selected, seen = [], set()
+        for child in children:
+            key = child.metadata.get("parent_id") or child.page_content
+            if key in seen:
+                continue
+            seen.add(key)
+            selected.append((child.metadata.get("parent_id"), child))
+            if len(selected) == max_parents:
+                break
+        parents = self.get_many(pid for pid, _ in selected if pid)
+        return [parents.get(pid, child) for pid, child in selected]
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(LENGTH(data)), 0) FROM parents").fetchone()[0]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM parents").fetchone()[0]
+
+
+class ParentRetriever(BaseRetriever):
+    """Retriever zwracający strony nadrzędne dla fragmentów znalezionych przez `child`."""
+
+    child: Any
+    store: Any
+    max_parents: int = PARENT_MAX_DOCS
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self.store.expand(self.child.invoke(query), self.max_parents)
+
+
+def get_parent_store(path: str = PARENTS_DB):
+    """Zwraca magazyn, jeśli baza została zbudowana w trybie dwupoziomowym; w przeciwnym razie None."""
+    return ParentStore(path) if os.path.exists(path) else None
@@ -0,0 +1,249 @@
+# Wspólny harmonogram ruchu do dostawcy LLM z limitami RPM i TPM
+
+"""
+Ten plik pilnuje, aby wszystkie części aplikacji razem nie przekroczyły
+limitów dostawcy (zapytania na minutę i tokeny na minutę).
+
+Każde wywołanie najpierw szacuje liczbę tokenów (`tiktoken`), a potem prosi
+harmonogram o przydział z dwóch "wiader z tokenami" (token bucket): jednego
+na zapytania, drugiego na tokeny. Gdy budżet się wyczerpie, wywołanie czeka
+w kolejce priorytetowej – interaktywne pytania z `/ask` są obsługiwane przed
+pracą wsadową (ingestia, ewaluacja), a nic nie kończy się błędem 429.
+
+Dostawca liczy limity osobno dla każdego modelu, dlatego każdy model (czat,
+embeddingi) ma własny harmonogram – embedowanie dokumentów przy ingestii nie
+zabiera budżetu odpowiedziom czatu i odwrotnie. Budżety są wspólne dla całego
+procesu. Jeśli API i ingestia działają jednocześnie w osobnych procesach,
+każdemu z nich należy przydzielić jego część limitu zmiennymi LLM_RPM i
+LLM_TPM (albo LLM_RPM_<MODEL> i LLM_TPM_<MODEL> dla jednego modelu, np.
+LLM_TPM_TEXT_EMBEDDING_ADA_002).
+
+Wywołania wykonywane w ramach zapytania API czekają na budżet najwyżej do
+jego deadline'u (`deadline_scope`), a nie bez końca.
+"""
+from langchain_core.embeddings import Embeddings
+from app import metrics
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+
+INTERACTIVE = 0
+BATCH = 1
+
+# Model czatu, z którego korzysta aplikacja; jego harmonogram jest domyślny.
+CHAT_MODEL = "gpt-3.5-turbo"
+
+# Szacowana długość odpowiedzi modelu, doliczana do tokenów promptu.
+COMPLETION_TOKENS_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKENS_ESTIMATE", "300"))
+
+
+class RateLimitTimeout(TimeoutError):
+    """Zgłaszany, gdy przydział budżetu nie nastąpił w zadanym czasie."""
+
+
+class TokenBucket:
+    """Wiadro z tokenami: uzupełnia się w stałym tempie do określonej pojemności."""
+
+    def __init__(self, rate_per_s: float, capacity: float):
+        self.rate = rate_per_s
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Ile sekund trzeba poczekać, aż w wiadrze będzie `amount` tokenów (0 = od razu)."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def try_consume(self, amount: float) -> bool:
+        """Pobiera tokeny, jeśli są dostępne od razu; w przeciwnym razie niczego nie zmienia."""
+        if self.wait_time(amount) > 0:
+            return False
+        self.consume(amount)
+        return True
+
+
+class LLMScheduler:
+    """Kolejka priorytetowa przed dostawcą LLM, pilnująca limitów RPM i TPM."""
+
+    def __init__(self, rpm: int, tpm: int, name: str = "llm"):
+        self.name = name
+        self.requests = TokenBucket(rpm / 60, rpm)
+        self.tokens = TokenBucket(tpm / 60, tpm)
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._sequence = itertools.count()
+
+    def _wait_time(self, tokens):
+        return max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+
+    def _update_gauges(self):
+        metrics.set_gauge(f"{self.name}.scheduler.queue_depth", len(self._waiting))
+        metrics.set_gauge(f"{self.name}.scheduler.tokens_available", round(self.tokens.tokens))
+
+    def acquire(self, tokens: int, priority: int = BATCH, timeout: float = None):
+        """
+        Czeka na przydział budżetu dla jednego zapytania o szacowanej liczbie tokenów.
+        Obsługuje oczekujących w kolejności priorytetu, a w ramach priorytetu – FIFO.
+        """
+        started_at = time.monotonic()
+        expires_at = started_at + timeout if timeout is not None else None
+        ticket = (priority, next(self._sequence))
+
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            self._update_gauges()
+            try:
+                while True:
+                    if self._waiting[0] == ticket:
+                        wait = self._wait_time(tokens)
+                        if wait == 0:
+                            self.requests.consume(1)
+                            self.tokens.consume(tokens)
+                            break
+                    else:
+                        wait = None
+                    if expires_at is not None:
+                        left = expires_at - time.monotonic()
+                        if left <= 0:
+                            metrics.incr(f"{self.name}.scheduler.timeouts")
+                            raise RateLimitTimeout("Nie przydzielono budżetu zapytań do LLM w zadanym czasie.")
+                        wait = left if wait is None else min(wait, left)
+                    self._cond.wait(wait)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._update_gauges()
+                self._cond.notify_all()
+
+        waited = time.monotonic() - started_at
+        name = "interactive" if priority == INTERACTIVE else "batch"
+        metrics.observe(f"{self.name}.scheduler.wait_s.{name}", waited)
+        metrics.incr(f"{self.name}.scheduler.tokens.{name}", tokens)
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Pobiera budżet tylko wtedy, gdy jest dostępny od razu i nikt nie czeka w kolejce."""
+        with self._cond:
+            if self._waiting or self._wait_time(tokens) > 0:
+                return False
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            self._update_gauges()
+            return True
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    import tiktoken
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken pobiera słowniki z sieci przy pierwszym użyciu; offline szacujemy z długości.
+        print(f"OSTRZEŻENIE: Nie udało się wczytać kodowania tiktoken ({e}). Używam przybliżenia.")
+        return None
+
+
+def estimate_tokens(text: str, model: str = CHAT_MODEL) -> int:
+    """Szacuje liczbę tokenów tekstu dla danego modelu."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+# Deadline bieżącego zapytania API (obiekt z metodą `remaining()`); None poza zapytaniem.
+_deadline = ContextVar("rate_limit_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(deadline):
+    """Ogranicza czekanie na budżet w tym kontekście do czasu pozostałego do deadline'u."""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_timeout():
+    """Ile sekund wywołanie może czekać na budżet (None = bez limitu, np. praca wsadowa)."""
+    deadline = _deadline.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+class ScheduledEmbeddings(Embeddings):
+    """Model embeddingowy, którego wywołania przechodzą przez wspólny harmonogram."""
+
+    def __init__(self, inner: Embeddings, priority: int = BATCH, scheduler: "LLMScheduler" = None):
+        self.inner = inner
+        self.priority = priority
+        self.scheduler = scheduler
+        self.model = getattr(inner, "model", "text-embedding-ada-002")
+
+    def embed_documents(self, texts):
+        """Embeduje teksty partiami, z których każda mieści się w części budżetu TPM."""
+        scheduler = self.scheduler or get_scheduler(self.model)
+        max_batch_tokens = max(1, scheduler.tokens.capacity // 4)
+        vectors = []
+        batch, batch_tokens = [], 0
+        for text in texts:
+            tokens = estimate_tokens(text, self.model)
+            if batch and batch_tokens + tokens > max_batch_tokens:
+                scheduler.acquire(batch_tokens, self.priority, timeout=deadline_timeout())
+                vectors.extend(self.inner.embed_documents(batch))
+                batch, batch_tokens = [], 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            scheduler.acquire(batch_tokens, self.priority, timeout=deadline_timeout())
+            vectors.extend(self.inner.embed_documents(batch))
+        return vectors
+
+    def embed_query(self, text):
+        scheduler = self.scheduler or get_scheduler(self.model)
+        scheduler.acquire(estimate_tokens(text, self.model), self.priority, timeout=deadline_timeout())
+        return self.inner.embed_query(text)
+
+
+_schedulers = {}
+_scheduler_lock = threading.Lock()
+
+
+def _model_limit(name: str, model: str, default: str) -> int:
+    """Limit z LLM_RPM_<MODEL> / LLM_TPM_<MODEL>, a jeśli go nie ustawiono – wspólny LLM_RPM / LLM_TPM."""
+    suffix = re.sub(r"[^A-Z0-9]+", "_", model.upper()).strip("_")
+    return int(os.getenv(f"{name}_{suffix}", os.getenv(name, default)))
+
+
+def get_scheduler(model: str = CHAT_MODEL) -> LLMScheduler:
+    """Zwraca harmonogram danego modelu, współdzielony przez cały proces."""
+    with _scheduler_lock:
+        if model not in _schedulers:
+            name = "llm" if model == CHAT_MODEL else f"llm.{model}"
+            _schedulers[model] = LLMScheduler(
+                rpm=_model_limit("LLM_RPM", model, "3500"),
+                tpm=_model_limit("LLM_TPM", model, "90000"),
+                name=name,
+            )
+        return _schedulers[model]
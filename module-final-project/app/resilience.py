@@ -0,0 +1,263 @@
+# Mechanizmy kontroli opóźnień: deadline'y etapów i zapytania zabezpieczające (hedging)
+
+"""
+Ten plik zawiera narzędzia, które pilnują, aby pojedyncze wolne wywołanie LLM
+nie wydłużało odpowiedzi API w nieskończoność.
+
+- `Deadline` przenosi limit czasu z zapytania klienta do kolejnych etapów
+  potoku RAG i przydziela każdemu etapowi jego część budżetu.
+- `hedged_stream` uruchamia strumień odpowiedzi LLM, a jeśli pierwszy token
+  nie nadejdzie w typowym czasie (p95 z ostatnich wywołań), wysyła drugie,
+  identyczne zapytanie i bierze odpowiedź, która skończy się pierwsza.
+- `CircuitBreaker` odcina wywołania LLM po serii błędów, aby przy awarii
+  dostawcy API odpowiadało od razu, zamiast czekać na kolejne timeouty.
+"""
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from app.rate_limit import estimate_tokens
+from app import metrics
+import contextvars
+import os
+import queue
+import threading
+import time
+
+# Jaka część całkowitego budżetu czasu przypada na dany etap potoku.
+STAGE_BUDGETS = {
+    "retrieval": float(os.getenv("DEADLINE_RETRIEVAL_SHARE", "0.25")),
+    "generation": 1.0,
+}
+
+# Hedging: włączany zmienną środowiskową, próg liczony z p95 czasu do pierwszego tokenu.
+HEDGING_ENABLED = os.getenv("LLM_HEDGING", "0") == "1"
+HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "3.0"))
+
+# Bezpiecznik: po ilu kolejnych błędach się otwiera i po jakim czasie próbuje ponownie.
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("LLM_BREAKER_RESET_S", "30"))
+
+_executor = ThreadPoolExecutor(max_workers=int(os.getenv("RESILIENCE_WORKERS", "32")),
+                               thread_name_prefix="rag-stage")
+
+
+class DeadlineExceeded(TimeoutError):
+    """Zgłaszany, gdy etap potoku nie zmieścił się w przydzielonym czasie."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Przekroczono limit czasu na etapie: {stage}")
+        self.stage = stage
+
+
+class Deadline:
+    """Bezwzględny termin zakończenia zapytania, liczony od momentu jego przyjęcia."""
+
+    def __init__(self, timeout_s: float):
+        self.timeout_s = timeout_s
+        self.expires_at = time.monotonic() + timeout_s
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def stage_timeout(self, stage: str) -> float:
+        """Czas dostępny dla etapu: jego udział w budżecie, ale nie więcej niż zostało."""
+        share = STAGE_BUDGETS.get(stage, 1.0)
+        return min(self.remaining(), share * self.timeout_s)
+
+    def check(self, stage: str):
+        if self.remaining() <= 0:
+            metrics.incr(f"deadline.exceeded.{stage}")
+            raise DeadlineExceeded(stage)
+
+
+def run_stage(stage: str, deadline: Deadline, func, *args, **kwargs):
+    """
+    Wykonuje funkcję etapu z limitem czasu wynikającym z deadline'u.
+    Bez deadline'u funkcja jest wywoływana bezpośrednio.
+    """
+    if deadline is None:
+        return func(*args, **kwargs)
+    deadline.check(stage)
+    return await_stage(stage, deadline, start_stage(func, *args, **kwargs))
+
+
+def start_stage(func, *args, **kwargs):
+    """
+    Uruchamia funkcję etapu w tle (np. spekulatywnie) i zwraca jej Future.
+    Funkcja działa w kopii bieżącego kontekstu (`contextvars`), więc widzi
+    np. deadline zapytania ustawiony przez `rate_limit.deadline_scope`.
+    """
+    return _executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def await_stage(stage: str, deadline: Deadline, future):
+    """Czeka na wynik etapu uruchomionego przez `start_stage`, w granicach deadline'u."""
+    if deadline is None:
+        return future.result()
+    try:
+        return future.result(timeout=deadline.stage_timeout(stage))
+    except FutureTimeoutError:
+        # Wątek roboczy dokończy pracę w tle, ale klient nie musi na niego czekać.
+        metrics.incr(f"deadline.exceeded.{stage}")
+        raise DeadlineExceeded(stage) from None
+
+
+def _start_attempt(attempt, index):
+    """
+    Uruchamia próbę wywołania LLM we własnym wątku, a nie we wspólnej puli etapów.
+    Gdy pula jest zajęta wyszukiwaniem, zapytanie zabezpieczające czekałoby w jej
+    kolejce właśnie wtedy, gdy jest najbardziej potrzebne. Liczbę równoległych
+    wywołań LLM ogranicza już kontrola przyjęć i limiter ruchu.
+    """
+    threading.Thread(target=attempt, args=(index,), name=f"llm-attempt-{index}", daemon=True).start()
+
+
+def hedge_delay() -> float:
+    """Próg uruchomienia drugiego zapytania: p95 czasu do pierwszego tokenu."""
+    if metrics.count("llm.ttft_s") < HEDGE_MIN_SAMPLES:
+        return HEDGE_DEFAULT_DELAY
+    return metrics.percentile("llm.ttft_s", HEDGE_PERCENTILE, HEDGE_DEFAULT_DELAY)
+
+
+def hedged_stream(llm, prompt: str, timeout: float = None, hedging: bool = None, can_hedge=None) -> str:
+    """
+    Generuje odpowiedź LLM w trybie strumieniowym i zwraca pełny tekst.
+
+    Jeśli hedging jest włączony, a pierwszy token nie nadszedł w czasie
+    `hedge_delay()`, uruchamiane jest drugie, identyczne zapytanie. Wygrywa to,
+    które pierwsze zwróci kompletną odpowiedź; drugie jest przerywane.
+    Opcjonalna funkcja `can_hedge` może zablokować drugie zapytanie (np. brak budżetu).
+    """
+    hedging = HEDGING_ENABLED if hedging is None else hedging
+    started_at = time.monotonic()
+    expires_at = started_at + timeout if timeout is not None else None
+    results = queue.Queue()
+    cancel = threading.Event()
+    first_token = [threading.Event(), threading.Event()]
+    received = [0, 0]
+
+    def attempt(index):
+        start = time.monotonic()
+        parts = []
+        try:
+            stream = llm.stream(prompt)
+            for chunk in stream:
+                if not first_token[index].is_set():
+                    # Czas do pierwszego tokenu zapisujemy zawsze, także dla przegranych prób,
+                    # inaczej p95 byłby zaniżony właśnie przez najwolniejsze wywołania.
+                    metrics.observe("llm.ttft_s", time.monotonic() - start)
+                    first_token[index].set()
+                if cancel.is_set():
+                    stream.close()  # zamyka połączenie przegranego zapytania
+                    return
+                parts.append(chunk.content)
+                received[index] += 1
+            results.put((index, "".join(parts), None))
+        except Exception as e:
+            results.put((index, None, e))
+
+    def wait_left():
+        return None if expires_at is None else max(0.0, expires_at - time.monotonic())
+
+    _start_attempt(attempt, 0)
+    attempts = 1
+
+    if hedging:
+        delay = hedge_delay()
+        if expires_at is not None:
+            delay = min(delay, wait_left())
+        if not first_token[0].wait(delay) and results.empty():
+            if can_hedge is not None and not can_hedge():
+                metrics.incr("llm.hedge.skipped")
+            else:
+                metrics.incr("llm.hedge.fired")
+                metrics.incr("llm.hedge.extra_prompt_tokens", estimate_tokens(prompt))
+                _start_attempt(attempt, 1)
+                attempts = 2
+
+    error = None
+    try:
+        for _ in range(attempts):
+            index, text, error = results.get(timeout=wait_left())
+            if error is None:
+                if index == 1:
+                    metrics.incr("llm.hedge.won")
+                metrics.observe("llm.total_s", time.monotonic() - started_at)
+                return text
+    except queue.Empty:
+        metrics.incr("deadline.exceeded.generation")
+        raise DeadlineExceeded("generation") from None
+    finally:
+        cancel.set()
+        if attempts == 2:
+            # Koszt hedgingu: fragmenty wygenerowane przez zapytanie, które przegrało.
+            metrics.incr("llm.hedge.wasted_chunks", min(received))
+    raise error
+
+
+class CircuitBreaker:
+    """
+    Klasyczny bezpiecznik z trzema stanami:
+    - closed: wywołania przechodzą normalnie, liczymy kolejne błędy,
+    - open: wywołania są od razu odrzucane, aż minie `reset_timeout`,
+    - half_open: przepuszczamy jedno wywołanie próbne; sukces zamyka bezpiecznik,
+      błąd otwiera go ponownie.
+    `clock` to źródło czasu (domyślnie `time.monotonic`); w testach można podać własne.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    _STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT, clock=time.monotonic):
+        self.name = name
+        self.clock = clock
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.set_gauge(f"{self.name}.breaker.state", self._STATE_CODES[state])
+
+    def allow(self) -> bool:
+        """Czy wywołanie może teraz przejść do dostawcy?"""
+        with self._lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                metrics.incr(f"{self.name}.breaker.probes")
+                return True
+        metrics.incr(f"{self.name}.breaker.rejected")
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probe_in_flight = False
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def release(self):
+        """Zwalnia wywołanie bez werdyktu (np. przerwane przed kontaktem z dostawcą)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    metrics.incr(f"{self.name}.breaker.opened")
+                self._set_state(self.OPEN)
+                self.opened_at = self.clock()
@@ -0,0 +1,339 @@
+# Pomocnicze funkcje etapu wyszukiwania fragmentów (retrieval)
+
+"""
+Ten plik zawiera elementy etapu wyszukiwania, z których korzysta potok RAG
+poza zwykłym `retriever.invoke(...)`.
+
+- `search_with_vectors` zwraca znalezione fragmenty razem z ich zapisanymi
+  wektorami, bez dodatkowego wywołania modelu embeddingowego (magazyny, które
+  nie udostępniają wektorów, zwracają same rankingi).
+- `RetrievalCache` zapamiętuje fragmenty z poprzedniej tury rozmowy. Jeśli
+  pytanie uzupełniające jest wystarczająco podobne do tych fragmentów,
+  używamy ich ponownie i pomijamy zarówno przeformułowanie pytania przez LLM,
+  jak i przeszukiwanie bazy wektorowej.
+- Wyszukiwanie spekulatywne: wyszukiwanie dla surowego pytania rusza
+  równolegle z jego przeformułowaniem, więc opóźnienia obu kroków się nie
+  sumują (`is_near_identical`, `merge_candidates`,
+  `create_speculative_history_aware_retriever`).
+- `FusionRetriever` (tryb RETRIEVAL_MODE=multi_query): rozszerza pytanie do
+  kilku wariantów, embeduje je jednym wywołaniem, przeszukuje bazę dla
+  wszystkich naraz i łączy wyniki metodą Reciprocal Rank Fusion. Jeśli baza
+  ma indeks słów kluczowych (artefakt, `lexical_search_with_vectors`), do
+  fuzji dochodzi ranking BM25 pytania – wyszukiwanie hybrydowe.
+"""
+from langchain_core.documents import Document
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.runnables import RunnableLambda, RunnableParallel
+from app.filters import to_chroma_where
+from app.rate_limit import COMPLETION_TOKENS_ESTIMATE, INTERACTIVE, RateLimitTimeout, deadline_timeout, estimate_tokens, get_scheduler
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from typing import Any
+from operator import itemgetter
+import numpy as np
+import os
+import re
+
+# Fragmenty z poprzedniej tury są użyte ponownie, gdy najlepsze podobieństwo nowego pytania
+# osiąga co najmniej taki ułamek podobieństwa, jakie miało do nich pytanie poprzednie.
+REUSE_RATIO = float(os.getenv("CHAT_REUSE_RATIO", "0.9"))
+
+# Od jakiego podobieństwa tekstu przeformułowane pytanie uznajemy za "prawie identyczne" z oryginałem.
+SPECULATIVE_SIMILARITY = float(os.getenv("SPECULATIVE_SIMILARITY", "0.9"))
+
+# Tryb wyszukiwania: "single" (jedno zapytanie) albo "multi_query" (warianty pytania + RRF).
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "single")
+MULTI_QUERY_VARIANTS = int(os.getenv("MULTI_QUERY_VARIANTS", "4"))
+# Rozszerzanie pytania przez LLM kosztuje dodatkowe wywołanie modelu, dlatego domyślnie jest wyłączone.
+MULTI_QUERY_LLM = os.getenv("MULTI_QUERY_LLM", "0") == "1"
+# Stała w RRF: wynik fragmentu to suma 1 / (RRF_K + pozycja) po wszystkich wariantach pytania.
+RRF_K = 60
+
+# Słowniczek pojęć RODO do rozszerzania pytań regułami: potoczne określenie -> termin z rozporządzenia.
+QUERY_SYNONYMS = {
+    "bycia zapomnianym": "prawo do usunięcia danych",
+    "usunięcie danych": "prawo do bycia zapomnianym",
+    "usunąć dane": "prawo do usunięcia danych",
+    "wyciek": "naruszenie ochrony danych osobowych",
+    "kara": "administracyjne kary pieniężne",
+    "kary": "administracyjne kary pieniężne",
+    "grzywn": "administracyjne kary pieniężne",
+    "firm": "administrator",
+    "iod": "inspektor ochrony danych",
+    "zgod": "zgoda osoby, której dane dotyczą",
+    "sprzeciw": "prawo do sprzeciwu",
+    "przenies": "prawo do przenoszenia danych",
+    "profilowani": "zautomatyzowane podejmowanie decyzji, w tym profilowanie",
+    "dane wrażliwe": "szczególne kategorie danych osobowych",
+    "rodo": "ogólne rozporządzenie o ochronie danych",
+}
+
+QUESTION_WORDS = {
+    "a", "czy", "co", "jak", "jaki", "jaka", "jakie", "jakich", "kiedy", "kto", "gdzie", "ile", "dlaczego",
+    "czym", "jest", "są", "się", "mi", "mnie", "można", "mogę", "w", "na", "o", "do", "z", "i", "to", "ten",
+}
+
+MULTI_QUERY_PROMPT_TEMPLATE = """
+Zapisz {n} różne sformułowania poniższego pytania dotyczącego RODO, używając terminologii z rozporządzenia.
+Każde sformułowanie umieść w osobnej linii, bez numeracji i komentarzy.
+
+Pytanie:
+{question}
+"""
+
+
+def cosine_similarities(vector, matrix) -> np.ndarray:
+    """Podobieństwo kosinusowe jednego wektora do każdego wiersza macierzy."""
+    vector = np.asarray(vector, dtype=np.float32)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector)
+    return matrix @ vector / np.maximum(norms, 1e-12)
+
+
+def search_with_vectors(vector_store, query_vector, k, filters=None):
+    """
+    Zwraca (dokumenty, macierz ich wektorów) dla wektora zapytania. Wektory
+    pochodzą z bazy (w Chroma – z tego samego zapytania do kolekcji); dla
+    magazynów, które ich nie udostępniają, zamiast macierzy jest None.
+    """
+    return search_many_with_vectors(vector_store, [query_vector], k, filters)[0]
+
+
+def search_many_with_vectors(vector_store, query_vectors, k, filters=None):
+    """
+    Jak `search_with_vectors`, ale dla wielu wektorów zapytań naraz; zwraca listę
+    par (dokumenty, wektory albo None). Chroma obsługuje wszystkie zapytania w
+    jednym wywołaniu kolekcji, magazyny z `search_by_vectors` (lokalny, zdalny,
+    shardowany, artefakt) zwracają zapisane wektory, a pozostałe przeszukujemy
+    równolegle w wątkach i zwracamy same rankingi – ponowne embedowanie
+    wyników byłoby drugim wywołaniem modelu w tym etapie.
+    `filters` to opcjonalny filtr metadanych w składni z `app/filters.py`.
+    """
+    search_by_vectors = getattr(vector_store, "search_by_vectors", None)
+    if search_by_vectors is not None:
+        return search_by_vectors(query_vectors, k, filters=filters)
+
+    collection = getattr(vector_store, "_collection", None)
+    if collection is not None:
+        where = to_chroma_where(filters) if filters else None
+        results = collection.query(
+            query_embeddings=[list(vector) for vector in query_vectors],
+            n_results=k,
+            where=where,
+            include=["documents", "metadatas", "embeddings"],
+        )
+        return [
+            ([Document(page_content=text, metadata=metadata or {}) for text, metadata in zip(texts, metadatas)],
+             np.asarray(vectors, dtype=np.float32))
+            for texts, metadatas, vectors in zip(results["documents"], results["metadatas"], results["embeddings"])
+        ]
+
+    with ThreadPoolExecutor(max_workers=len(query_vectors)) as pool:
+        found = list(pool.map(lambda vector: vector_store.similarity_search_by_vector(list(vector), k=k, filter=filters),
+                              query_vectors))
+    return [(docs, None) for docs in found]
+
+
+class RetrievalCache:
+    """Fragmenty ostatniej tury rozmowy wraz z ich wektorami."""
+
+    __slots__ = ("docs", "vectors", "similarities", "reference_score")
+
+    def __init__(self, docs, vectors, query_vector):
+        self.docs = docs
+        self.vectors = vectors
+        # Podobieństwo każdego fragmentu do pytania, dla którego go znaleziono.
+        self.similarities = cosine_similarities(query_vector, vectors) if len(docs) else np.zeros(0, dtype=np.float32)
+        self.reference_score = float(self.similarities.max()) if len(docs) else 0.0
+
+    def score(self, query_vector) -> float:
+        """Najlepsze podobieństwo nowego pytania do zapamiętanych fragmentów."""
+        if not len(self.docs):
+            return 0.0
+        return float(cosine_similarities(query_vector, self.vectors).max())
+
+    def matches(self, query_vector, ratio: float = REUSE_RATIO) -> bool:
+        return self.reference_score > 0 and self.score(query_vector) >= ratio * self.reference_score
+
+
+def _normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def is_near_identical(rewritten: str, original: str, threshold: float = SPECULATIVE_SIMILARITY) -> bool:
+    """Czy przeformułowane pytanie praktycznie nie różni się od oryginału?"""
+    return SequenceMatcher(None, _normalize(rewritten), _normalize(original)).ratio() >= threshold
+
+
+def dedupe_documents(docs):
+    """Usuwa powtórzone fragmenty (po treści), zachowując kolejność pierwszego wystąpienia."""
+    seen = set()
+    unique = []
+    for doc in docs:
+        if doc.page_content not in seen:
+            seen.add(doc.page_content)
+            unique.append(doc)
+    return unique
+
+
+def merge_candidates(query_vector, primary, secondary, k):
+    """
+    Łączy dwa zbiory kandydatów (dokumenty, wektory), usuwa duplikaty i zwraca
+    `k` fragmentów najbliższych wektorowi zapytania, razem z ich wektorami.
+    Bez wektorów (None) zachowuje kolejność: najpierw `primary`, potem `secondary`.
+    """
+    if primary[1] is None or secondary[1] is None:
+        return dedupe_documents(primary[0] + secondary[0])[:k], None
+    docs, rows, seen = [], [], set()
+    for candidates, vectors in (primary, secondary):
+        for doc, vector in zip(candidates, vectors):
+            if doc.page_content not in seen:
+                seen.add(doc.page_content)
+                docs.append(doc)
+                rows.append(vector)
+    if not docs:
+        return [], np.zeros((0, len(query_vector)), dtype=np.float32)
+    vectors = np.asarray(rows, dtype=np.float32)
+    order = np.argsort(-cosine_similarities(query_vector, vectors), kind="stable")[:k]
+    return [docs[i] for i in order], vectors[order]
+
+
+def create_speculative_history_aware_retriever(llm, retriever, prompt):
+    """
+    Odpowiednik `create_history_aware_retriever` z LangChain (zob. module-09/081.py),
+    który nie czeka z wyszukiwaniem na przeformułowanie pytania.
+
+    Wyszukiwanie dla surowego pytania i przeformułowanie przez LLM biegną
+    równolegle. Jeśli nowe pytanie jest prawie identyczne z oryginałem,
+    zwracamy wynik spekulatywny; w przeciwnym razie wyszukujemy ponownie dla
+    nowego pytania i łączymy oba zbiory bez duplikatów.
+    """
+    rewrite_chain = prompt | llm | StrOutputParser()
+    speculative = RunnableParallel(rewritten=rewrite_chain, docs=itemgetter("input") | retriever)
+
+    def run(inputs):
+        if not inputs.get("chat_history"):
+            return retriever.invoke(inputs["input"])
+        result = speculative.invoke(inputs)
+        if is_near_identical(result["rewritten"], inputs["input"]):
+            return result["docs"]
+        return dedupe_documents(retriever.invoke(result["rewritten"]) + result["docs"])
+
+    return RunnableLambda(run)
+
+
+def expand_query(question: str, max_variants: int = MULTI_QUERY_VARIANTS):
+    """
+    Tanie, regułowe warianty pytania: oryginał, wersja z terminologią RODO
+    (ze słowniczka QUERY_SYNONYMS), odwołanie do artykułu i same słowa kluczowe.
+    """
+    variants = [question]
+    lowered = question.lower()
+    for phrase, term in QUERY_SYNONYMS.items():
+        if phrase in lowered and term.lower() not in lowered:
+            variants.append(f"{question} ({term})")
+    article = re.search(r"\bart(?:ykuł\w*|\.)?\s*(\d+)", lowered)
+    if article:
+        variants.append(f"Artykuł {article.group(1)} RODO")
+    keywords = [word for word in re.findall(r"\w+", lowered) if word not in QUESTION_WORDS]
+    if keywords:
+        variants.append(" ".join(keywords))
+    return dedupe_queries(variants)[:max_variants]
+
+
+def dedupe_queries(queries):
+    """Usuwa puste i powtórzone (po normalizacji) warianty pytania."""
+    seen = set()
+    unique = []
+    for query in queries:
+        key = _normalize(query)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(query.strip())
+    return unique
+
+
+def reciprocal_rank_fusion(ranked_lists, k: int, rrf_k: int = RRF_K):
+    """
+    Łączy rankingi (listy par (dokumenty, wektory)) metodą RRF i zwraca `k`
+    najlepszych fragmentów bez duplikatów, razem z ich wektorami. RRF potrzebuje
+    tylko pozycji, więc rankingi bez wektorów (None) dają wynik z wektorami None.
+    """
+    rank_only = any(ranked_vectors is None for _, ranked_vectors in ranked_lists)
+    scores, docs, vectors = {}, {}, {}
+    for ranked_docs, ranked_vectors in ranked_lists:
+        for rank, doc in enumerate(ranked_docs, start=1):
+            key = doc.page_content
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            docs.setdefault(key, doc)
+            if not rank_only:
+                vectors.setdefault(key, ranked_vectors[rank - 1])
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    if rank_only:
+        return [docs[key] for key in best], None
+    if not best:
+        return [], np.zeros((0, 0), dtype=np.float32)
+    return [docs[key] for key in best], np.asarray([vectors[key] for key in best], dtype=np.float32)
+
+
+class FusionRetriever(BaseRetriever):
+    """
+    Retriever wielozapytaniowy. Wszystkie warianty pytania są embedowane w
+    jednej partii i wyszukiwane razem, więc cały etap kosztuje tyle, co jedno
+    wywołanie modelu embeddingowego (plus opcjonalne rozszerzenie przez LLM).
+    Z `hybrid=True` i bazą z indeksem BM25 do RRF dochodzi ranking słów
+    kluczowych pytania, który nie wymaga embeddingów.
+    """
+
+    vector_store: Any
+    embeddings: Any
+    k: int = 3
+    fetch_k: int = 6
+    max_variants: int = MULTI_QUERY_VARIANTS
+    llm: Any = None
+    hybrid: bool = True
+    # Bezpiecznik LLM potoku (`resilience.CircuitBreaker`); ustawia go `RagPipeline`.
+    breaker: Any = None
+
+    def variants(self, question: str):
+        variants = expand_query(question, self.max_variants)
+        if self.llm is not None:
+            variants = dedupe_queries(variants + self._expand_with_llm(question))[:self.max_variants + 2]
+        return variants
+
+    def _expand_with_llm(self, question: str):
+        if self.breaker is not None and not self.breaker.allow():
+            return []
+        prompt = MULTI_QUERY_PROMPT_TEMPLATE.format(n=self.max_variants - 1, question=question)
+        try:
+            get_scheduler().acquire(estimate_tokens(prompt) + COMPLETION_TOKENS_ESTIMATE, INTERACTIVE,
+                                    timeout=deadline_timeout())
+            lines = self.llm.invoke(prompt).content.splitlines()
+        except RateLimitTimeout as e:
+            if self.breaker is not None:
+                self.breaker.release()
+            print(f"Brak budżetu na rozszerzenie pytania przez LLM, używam wariantów regułowych: {e}")
+            return []
+        except Exception as e:
+            if self.breaker is not None:
+                self.breaker.record_failure()
+            print(f"Nie udało się rozszerzyć pytania przez LLM, używam wariantów regułowych: {e}")
+            return []
+        if self.breaker is not None:
+            self.breaker.record_success()
+        return lines
+
+    def search_with_vectors(self, question: str, filters=None):
+        """Zwraca (dokumenty, ich wektory, wektor oryginalnego pytania)."""
+        queries = self.variants(question)
+        query_vectors = self.embeddings.embed_documents(queries)
+        ranked = search_many_with_vectors(self.vector_store, query_vectors, self.fetch_k, filters)
+        lexical_search = getattr(self.vector_store, "lexical_search_with_vectors", None)
+        if self.hybrid and lexical_search is not None:
+            ranked.append(lexical_search(question, self.fetch_k, filters))
+        docs, vectors = reciprocal_rank_fusion(ranked, self.k)
+        return docs, vectors, query_vectors[0]
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self.search_with_vectors(query)[0]
@@ -0,0 +1,317 @@
+# Baza wektorowa podzielona na shardy: scatter-gather po procesach lub węzłach HTTP
+
+"""
+Ten plik dzieli bazę wektorową na N shardów (VECTOR_BACKEND=sharded), aby
+korpus mógł urosnąć ponad to, co mieści i przeszukuje jeden proces.
+
+- Ingestia (`write_shards`) przydziela każdy fragment do shardu przez
+  spójne haszowanie (`ConsistentHashRing`) identyfikatora fragmentu albo –
+  przy SHARD_BY=source – pliku źródłowego, dzięki czemu cały dokument trafia
+  do jednego shardu. Dodanie shardu przenosi tylko ok. 1/N fragmentów.
+- Zapytanie trafia równolegle do wszystkich shardów (scatter), a ich
+  posortowane listy wyników są łączone kopcem (`heapq.merge`) w globalne
+  top-k (gather).
+
+Shardem może być proces roboczy na tej samej maszynie (`ProcessShard`,
+`LocalVectorStore` z katalogu `vector_db/shards/shard-<i>`) albo węzeł z
+serwisem `app/vector_service.py` (SHARD_NODES – lista adresów URL).
+
+Proces roboczy obsługuje kilka zapytań naraz (SHARD_WORKERS wątków; NumPy
+zwalnia GIL na czas mnożenia macierzy). Wszystkie idą jednym potokiem, a każde
+niesie własny numer, po którym odpowiedź trafia do właściwego wywołującego.
+"""
+from langchain_core.vectorstores import VectorStore
+from app.filters import InvalidFilter
+from app.local_store import VECTOR_INDEX, VECTOR_QUANTIZATION, LocalVectorStore
+from app.vector_client import VECTOR_SERVICE_NAMESPACE, RemoteVectorStore
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import count, islice
+import bisect
+import hashlib
+import heapq
+import json
+import multiprocessing
+import numpy as np
+import os
+import shutil
+import threading
+
+SHARDS_PATH = os.path.join(os.path.dirname(__file__), '..', 'vector_db', 'shards')
+SHARD_COUNT = int(os.getenv("VECTOR_SHARDS", "4"))
+# Klucz podziału: "chunk" (identyfikator fragmentu) albo "source" (cały dokument w jednym shardzie).
+SHARD_BY = os.getenv("SHARD_BY", "chunk")
+# Adresy węzłów z serwisem wektorowym, oddzielone przecinkami; puste = procesy robocze na tej maszynie.
+SHARD_NODES = [url.strip() for url in os.getenv("SHARD_NODES", "").split(",") if url.strip()]
+# Liczba punktów każdego shardu na pierścieniu – im więcej, tym równiejszy podział.
+RING_REPLICAS = 256
+# Ile zapytań naraz obsługuje jeden proces roboczy shardu.
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", "4"))
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+class ConsistentHashRing:
+    """Pierścień spójnego haszowania: klucz trafia do pierwszego punktu shardu za swoim haszem."""
+
+    def __init__(self, shards: int, replicas: int = RING_REPLICAS):
+        points = sorted((_hash(f"shard-{shard}#{replica}"), shard)
+                        for shard in range(shards) for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._shards = [shard for _, shard in points]
+
+    def shard_for(self, key: str) -> int:
+        position = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._shards[position]
+
+
+def chunk_id(doc) -> str:
+    """Stabilny identyfikator fragmentu (źródło, strona, treść) – ten sam przy każdej ingestii."""
+    key = f"{doc.metadata.get('source', '')}\0{doc.metadata.get('page', '')}\0{doc.page_content}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:20]
+
+
+def chunk_ids(docs):
+    """
+    Identyfikatory `chunk_id` dla kolejnych fragmentów, unikalne w obrębie listy: powtórzony
+    fragment (to samo źródło, strona i treść) dostaje przyrostek "-2", "-3"... zamiast zostać
+    pominięty. Pierwsze wystąpienie zachowuje sam skrót, więc `/chunks/{id}` je odnajduje.
+    """
+    seen, ids = {}, []
+    for doc in docs:
+        key = chunk_id(doc)
+        seen[key] = seen.get(key, 0) + 1
+        ids.append(key if seen[key] == 1 else f"{key}-{seen[key]}")
+    return ids
+
+
+def partition(docs, shards: int, by: str = SHARD_BY):
+    """Dzieli fragmenty na `shards` list pozycji w `docs`."""
+    if by not in ("chunk", "source"):
+        raise ValueError(f"Nieznany klucz podziału: {by} (dostępne: chunk, source)")
+    ring = ConsistentHashRing(shards)
+    parts = [[] for _ in range(shards)]
+    for position, doc in enumerate(docs):
+        key = chunk_id(doc) if by == "chunk" else str(doc.metadata.get("source", ""))
+        parts[ring.shard_for(key)].append(position)
+    return parts
+
+
+def write_shards(docs, embeddings, shards: int = SHARD_COUNT, by: str = SHARD_BY, path: str = SHARDS_PATH,
+                 nodes=SHARD_NODES):
+    """
+    Embeduje fragmenty i zapisuje je w shardach: do katalogów `path/shard-<i>`
+    albo – gdy podano `nodes` – do serwisów wektorowych pod tymi adresami.
+    Zwraca liczbę fragmentów w każdym shardzie.
+    """
+    shards = len(nodes) if nodes else shards
+    vectors = embeddings.embed_documents([doc.page_content for doc in docs])
+    all_ids = chunk_ids(docs)
+    sizes = []
+    if not nodes and os.path.isdir(path):
+        # Katalogi po wcześniejszej ingestii z inną liczbą shardów nie mogą zostać odczytane jako aktualne.
+        shutil.rmtree(path)
+    for shard, positions in enumerate(partition(docs, shards, by)):
+        texts = [docs[i].page_content for i in positions]
+        metadatas = [docs[i].metadata for i in positions]
+        ids = [all_ids[i] for i in positions]
+        shard_vectors = [vectors[i] for i in positions]
+        if nodes:
+            store = RemoteVectorStore(embeddings, url=nodes[shard])
+            store.clear()
+            store.add_embeddings(texts, shard_vectors, metadatas, ids)
+        elif positions:
+            store = LocalVectorStore(embeddings)
+            store.add_embeddings(texts, shard_vectors, metadatas, ids)
+            store.save(os.path.join(path, f"shard-{shard}"))
+        sizes.append(len(positions))
+    if not nodes:
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, "shards.json"), "w", encoding="utf-8") as f:
+            json.dump({"by": by, "sizes": sizes}, f)
+    return sizes
+
+
+def _serve_shard(path, quantization, index, connection, workers=SHARD_WORKERS):
+    """
+    Pętla procesu roboczego: wczytuje swój shard i odpowiada na zapytania z potoku.
+    Zapytania są wykonywane równolegle w puli wątków, a odpowiedź niesie numer
+    zapytania, więc może wrócić w innej kolejności niż przyszło zapytanie.
+    """
+    store = LocalVectorStore.load(path, None, quantization, index=index)
+    methods = {"search": store.search_with_scores_by_vectors, "get": store.get_by_ids}
+    send_lock = threading.Lock()
+
+    def reply(request_id, status, result):
+        with send_lock:
+            connection.send((request_id, status, result))
+
+    def handle(request_id, method, args):
+        try:
+            reply(request_id, "ok", methods[method](*args))
+        except InvalidFilter as e:
+            reply(request_id, "invalid_filter", str(e))
+        except Exception as e:
+            reply(request_id, "error", f"{type(e).__name__}: {e}")
+
+    connection.send(("ready", len(store)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shard-worker") as pool:
+        while True:
+            message = connection.recv()
+            if message is None:
+                break
+            pool.submit(handle, *message)
+    # Pula dokończyła zapytania w toku – dopiero teraz kończymy strumień odpowiedzi.
+    connection.send(None)
+
+
+class ProcessShard:
+    """
+    Shard obsługiwany przez osobny proces. Zapytania z wielu wątków współdzielą
+    jeden potok: każde dostaje numer, a wątek czytający odpowiedzi przekazuje
+    wynik do Future tego zapytania.
+    """
+
+    def __init__(self, path: str, quantization: str = VECTOR_QUANTIZATION, index: str = VECTOR_INDEX,
+                 workers: int = SHARD_WORKERS):
+        context = multiprocessing.get_context("spawn")
+        self._connection, child = context.Pipe()
+        self._process = context.Process(
+            target=_serve_shard, daemon=True,
+            args=(path, quantization, index, child, workers),
+        )
+        self._process.start()
+        status, self.size = self._connection.recv()
+        self._send_lock = threading.Lock()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._alive = True
+        self._request_ids = count()
+        self._reader = threading.Thread(target=self._read_replies, daemon=True, name="shard-reader")
+        self._reader.start()
+
+    def _read_replies(self):
+        try:
+            while True:
+                message = self._connection.recv()
+                if message is None:
+                    break
+                request_id, status, result = message
+                with self._pending_lock:
+                    future = self._pending.pop(request_id)
+                future.set_result((status, result))
+        except (EOFError, OSError):
+            pass
+        # Proces zakończył pracę (albo padł) – nikt już nie odpowie na oczekujące zapytania.
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+            self._alive = False
+        for future in pending.values():
+            future.set_result(("error", "proces shardu nie odpowiada"))
+
+    def _call(self, method: str, *args):
+        future = Future()
+        with self._pending_lock:
+            if not self._alive:
+                raise RuntimeError("Błąd shardu: proces shardu nie odpowiada")
+            request_id = next(self._request_ids)
+            self._pending[request_id] = future
+        with self._send_lock:
+            self._connection.send((request_id, method, args))
+        status, result = future.result()
+        if status == "invalid_filter":
+            raise InvalidFilter(result)
+        if status != "ok":
+            raise RuntimeError(f"Błąd shardu: {result}")
+        return result
+
+    def search_with_scores_by_vectors(self, query_vectors, k: int, filters=None):
+        return self._call("search", [np.asarray(vector, dtype=np.float32) for vector in query_vectors], k, filters)
+
+    def get_by_ids(self, ids):
+        return self._call("get", list(ids))
+
+    def close(self):
+        with self._send_lock:
+            self._connection.send(None)
+        self._reader.join(timeout=5)
+        self._process.join(timeout=5)
+
+
+class ShardedVectorStore(VectorStore):
+    """VectorStore, który rozsyła zapytanie do wszystkich shardów i łączy ich wyniki."""
+
+    def __init__(self, embedding, shards):
+        self._embedding = embedding
+        self.shards = list(shards)
+        # Kilka wątków na shard, aby współbieżne zapytania do węzłów HTTP nie czekały na siebie nawzajem.
+        self._pool = ThreadPoolExecutor(max_workers=max(1, 4 * len(self.shards)), thread_name_prefix="shard")
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        raise NotImplementedError("Shardy zapisuje ingestia (`write_shards`), a nie pojedyncze wywołania add_texts.")
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, **kwargs):
+        raise NotImplementedError("Użyj `write_shards`, a potem `open_sharded_store`.")
+
+    def search_with_scores_by_vectors(self, query_vectors, k: int, filters=None):
+        """Scatter-gather: każdy shard zwraca swoje top-k, a kopiec scala je w globalne top-k."""
+        futures = [self._pool.submit(shard.search_with_scores_by_vectors, query_vectors, k, filters)
+                   for shard in self.shards]
+        per_shard = [future.result() for future in futures]
+        return [
+            list(islice(heapq.merge(*(hits[query] for hits in per_shard), key=lambda hit: -hit[1]), k))
+            for query in range(len(query_vectors))
+        ]
+
+    def get_by_ids(self, ids):
+        """Dokumenty o podanych identyfikatorach – pytamy wszystkie shardy, bo przy SHARD_BY=source id nie wskazuje shardu."""
+        ids = list(ids)
+        futures = [self._pool.submit(shard.get_by_ids, ids) for shard in self.shards]
+        return [doc for future in futures for doc in future.result()]
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, filter=None, **kwargs):
+        return [(doc, score) for doc, score, _ in self.search_with_scores_by_vectors([embedding], k, filter)[0]]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query, k: int = 4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query, k: int = 4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: (score + 1) / 2
+
+    def search_by_vectors(self, query_vectors, k: int, filters=None):
+        """Jak `retrieval.search_many_with_vectors`: lista par (dokumenty, wektory) dla wielu zapytań."""
+        results = []
+        for hits in self.search_with_scores_by_vectors(query_vectors, k, filters):
+            vectors = np.asarray([vector for _, _, vector in hits], dtype=np.float32)
+            results.append(([doc for doc, _, _ in hits], vectors))
+        return results
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+        for shard in self.shards:
+            if hasattr(shard, "close"):
+                shard.close()
+
+
+def open_sharded_store(embeddings, path: str = SHARDS_PATH, nodes=SHARD_NODES,
+                       namespace: str = VECTOR_SERVICE_NAMESPACE):
+    """Uruchamia procesy robocze dla (niepustych) shardów z dysku albo łączy się z węzłami HTTP."""
+    if nodes:
+        return ShardedVectorStore(embeddings, [RemoteVectorStore(embeddings, url=url, namespace=namespace)
+                                               for url in nodes])
+    with open(os.path.join(path, "shards.json"), encoding="utf-8") as f:
+        sizes = json.load(f)["sizes"]
+    return ShardedVectorStore(embeddings, [ProcessShard(os.path.join(path, f"shard-{shard}"))
+                                           for shard, size in enumerate(sizes) if size])
@@ -0,0 +1,186 @@
+# Narzędzie do przeglądu parametrów chunkingu (chunk_size / overlap / k)
+
+"""
+Ten skrypt automatyzuje dobór parametrów splittera i retrievera.
+
+Dla każdej kombinacji `chunk_size` x `chunk_overlap` buduje osobny indeks
+ChromaDB (równolegle, w wątkach), a następnie dla każdej wartości `k` mierzy:
+- jakość wyszukiwania na zbiorze pytań testowych (trafienie w top-k oraz MRR),
+- rozmiar indeksu na dysku,
+- czas budowy indeksu,
+- medianę i p95 czasu zapytania do indeksu.
+
+Embeddingi są liczone tylko raz dla każdego unikalnego tekstu fragmentu –
+fragmenty identyczne w różnych konfiguracjach (i w kolejnych uruchomieniach)
+pochodzą z cache'u `CachedEmbeddings`.
+
+Uruchomienie (z głównego folderu projektu):
+    python -m app.sweep --chunk-sizes 600 1200 --overlaps 60 120 --k 3 5
+"""
+from langchain_community.vectorstores import Chroma
+from langchain_openai import OpenAIEmbeddings
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from app.embedding_cache import CachedEmbeddings
+from app.http_client import provider_kwargs
+from app.ingest_data import load_documents, split_documents
+from app.rate_limit import BATCH, ScheduledEmbeddings
+import argparse
+import csv
+import json
+import os
+import shutil
+import statistics
+import time
+
+load_dotenv()
+
+SWEEP_DIR = os.path.join(os.path.dirname(__file__), '..', 'cache', 'sweep')
+EVAL_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'eval_questions.json')
+
+
+def load_eval_questions(path=EVAL_PATH):
+    """
+    Wczytuje zbiór pytań testowych. Format pliku to lista obiektów:
+    {"question": "...", "expected": ["fraza, która musi paść w dobrym fragmencie", ...]}
+    """
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def _is_relevant(text, expected):
+    text = text.lower()
+    return any(phrase.lower() in text for phrase in expected)
+
+
+def build_index(chunk_size, chunk_overlap, chunks, embeddings):
+    """Buduje indeks Chroma dla jednej konfiguracji i zwraca (vector_store, czas, rozmiar)."""
+    persist_directory = os.path.join(SWEEP_DIR, f"cs{chunk_size}-ov{chunk_overlap}")
+    shutil.rmtree(persist_directory, ignore_errors=True)
+
+    start = time.perf_counter()
+    vector_store = Chroma.from_documents(
+        documents=chunks,
+        embedding=embeddings,
+        persist_directory=persist_directory,
+        collection_name=f"sweep_cs{chunk_size}_ov{chunk_overlap}",
+    )
+    build_time = time.perf_counter() - start
+    return vector_store, build_time, _dir_size(persist_directory)
+
+
+def evaluate_index(vector_store, query_vectors, questions, k):
+    """Mierzy hit rate, MRR i czasy zapytań dla jednego indeksu i jednej wartości k."""
+    hits = 0
+    reciprocal_ranks = []
+    latencies = []
+    for vector, item in zip(query_vectors, questions):
+        start = time.perf_counter()
+        docs = vector_store.similarity_search_by_vector(vector, k=k)
+        latencies.append(time.perf_counter() - start)
+
+        rank = next((i for i, doc in enumerate(docs, 1) if _is_relevant(doc.page_content, item["expected"])), None)
+        if rank:
+            hits += 1
+            reciprocal_ranks.append(1 / rank)
+        else:
+            reciprocal_ranks.append(0.0)
+
+    latencies.sort()
+    return {
+        "hit_rate": hits / len(questions),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "p50_ms": 1000 * latencies[len(latencies) // 2],
+        "p95_ms": 1000 * latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+    }
+
+
+def run_sweep(chunk_sizes, overlaps, ks, eval_path=EVAL_PATH, workers=4):
+    """Przeprowadza pełny przegląd siatki parametrów i zwraca listę wyników."""
+    questions = load_eval_questions(eval_path)
+    documents = load_documents()
+    print(f"Załadowano {len(documents)} stron i {len(questions)} pytań testowych.")
+
+    configs = [(cs, ov) for cs in chunk_sizes for ov in overlaps if ov < cs]
+    splits = {config: split_documents(documents, *config) for config in configs}
+
+    # Krok 1: jedno wspólne embedowanie unikalnych fragmentów ze wszystkich konfiguracji
+    embeddings = CachedEmbeddings(ScheduledEmbeddings(OpenAIEmbeddings(**provider_kwargs()), BATCH))
+    all_texts = [chunk.page_content for chunks in splits.values() for chunk in chunks]
+    unique_texts = list(dict.fromkeys(all_texts))
+    embeddings.embed_documents(unique_texts)
+    print(f"Fragmentów łącznie: {len(all_texts)}, unikalnych: {len(unique_texts)}, "
+          f"nowo embedowanych: {embeddings.misses}.")
+
+    query_vectors = [embeddings.embed_query(item["question"]) for item in questions]
+
+    # Krok 2: równoległa budowa indeksów (embeddingi pochodzą już wyłącznie z cache'u)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            config: pool.submit(build_index, *config, splits[config], embeddings)
+            for config in configs
+        }
+        built = {config: future.result() for config, future in futures.items()}
+    # Indeksy są gotowe, a wektory pytań policzone – pamięć podręczną cache'u można zwolnić.
+    embeddings.clear_memory()
+
+    # Krok 3: pomiar jakości i opóźnień dla każdego punktu siatki
+    results = []
+    for (chunk_size, chunk_overlap), (vector_store, build_time, size_bytes) in built.items():
+        for k in ks:
+            metrics = evaluate_index(vector_store, query_vectors, questions, k)
+            results.append({
+                "chunk_size": chunk_size,
+                "chunk_overlap": chunk_overlap,
+                "k": k,
+                "chunks": len(splits[(chunk_size, chunk_overlap)]),
+                "index_mb": size_bytes / 1e6,
+                "build_s": build_time,
+                **metrics,
+            })
+    return results
+
+
+def print_results(results):
+    """Wypisuje wyniki w formie czytelnej tabeli."""
+    header = f"{'size':>6} {'overlap':>7} {'k':>3} {'chunks':>7} {'hit@k':>6} {'MRR':>6} " \
+             f"{'index MB':>9} {'build s':>8} {'p50 ms':>7} {'p95 ms':>7}"
+    print(header)
+    print("-" * len(header))
+    for r in sorted(results, key=lambda r: (-r["hit_rate"], -r["mrr"], r["index_mb"])):
+        print(f"{r['chunk_size']:>6} {r['chunk_overlap']:>7} {r['k']:>3} {r['chunks']:>7} "
+              f"{r['hit_rate']:>6.2f} {r['mrr']:>6.2f} {r['index_mb']:>9.2f} {r['build_s']:>8.2f} "
+              f"{r['p50_ms']:>7.2f} {r['p95_ms']:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Przegląd parametrów chunkingu dla bazy wiedzy RODO.")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[600, 900, 1200])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[60, 120])
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5])
+    parser.add_argument("--eval", default=EVAL_PATH, help="Plik JSON z pytaniami testowymi.")
+    parser.add_argument("--workers", type=int, default=4, help="Liczba równolegle budowanych indeksów.")
+    parser.add_argument("--csv", help="Opcjonalna ścieżka do zapisu wyników w formacie CSV.")
+    args = parser.parse_args()
+
+    results = run_sweep(args.chunk_sizes, args.overlaps, args.k, args.eval, args.workers)
+    print_results(results)
+
+    if args.csv:
+        with open(args.csv, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+            writer.writeheader()
+            writer.writerows(results)
+        print(f"Wyniki zapisano w: {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
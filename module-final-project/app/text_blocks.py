@@ -0,0 +1,105 @@
+# Teksty skompresowane w blokach zstd, z indeksem bloków i pamięcią LRU rozpakowanych bloków
+
+"""
+Ten plik kompresuje teksty fragmentów (kolumna tekstu `ChunkStore`) i stron
+(`ParentStore`) algorytmem zstd.
+
+Sklejone teksty fragmentów dzielimy na bloki po ok. TEXT_BLOCK_SIZE bajtów,
+zawsze na granicy fragmentu, i kompresujemy każdy blok osobno. Indeks bloków
+to tablica par (początek bloku w tekście nieskompresowanym, początek bloku w
+pliku skompresowanym). Odczyt fragmentu rozpakowuje tylko jego blok, a
+ostatnio używane bloki trzyma mała pamięć LRU (TEXT_CACHE_BLOCKS) – kolejne
+trafienia z tej samej strony dokumentu nie rozpakowują niczego.
+"""
+from collections import OrderedDict
+import numpy as np
+import os
+import threading
+import zstandard
+
+TEXT_BLOCK_SIZE = int(os.getenv("TEXT_BLOCK_SIZE", str(64 * 1024)))
+TEXT_CACHE_BLOCKS = int(os.getenv("TEXT_CACHE_BLOCKS", "64"))
+ZSTD_LEVEL = int(os.getenv("ZSTD_LEVEL", "9"))
+
+
+def compress(data: bytes) -> bytes:
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+
+
+def decompress(data: bytes) -> bytes:
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+def compress_blocks(blob, offsets, block_size: int = TEXT_BLOCK_SIZE):
+    """
+    Kompresuje sklejone teksty `blob` (granice tekstów w `offsets`) w bloki.
+    Zwraca (skompresowane dane, indeks bloków o kształcie (bloki + 1, 2)).
+    """
+    offsets = np.asarray(offsets, dtype=np.uint64)
+    boundaries = [0]
+    for end in offsets[1:]:
+        if int(end) - boundaries[-1] >= block_size:
+            boundaries.append(int(end))
+    if boundaries[-1] != len(blob):
+        boundaries.append(len(blob))
+    parts, index = [], [(0, 0)]
+    for start, end in zip(boundaries, boundaries[1:]):
+        parts.append(compress(bytes(blob[start:end])))
+        index.append((end, index[-1][1] + len(parts[-1])))
+    return b"".join(parts), np.asarray(index, dtype=np.uint64)
+
+
+class CompressedText:
+    """
+    Tekst tylko do odczytu z bloków skompresowanych (np. przez mmap). Wycinek
+    `text[start:end]` zwraca bajty, rozpakowując wyłącznie potrzebne bloki.
+    """
+
+    def __init__(self, data, index, cache_blocks: int = TEXT_CACHE_BLOCKS):
+        self.data = data
+        self.index = index
+        self.cache_blocks = cache_blocks
+        self._starts = np.asarray(index[:, 0], dtype=np.int64)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return int(self._starts[-1])
+
+    @property
+    def nbytes(self) -> int:
+        """Rozmiar danych skompresowanych i indeksu bloków."""
+        return len(self.data) + self.index.nbytes
+
+    def cached_nbytes(self) -> int:
+        with self._lock:
+            return sum(len(block) for block in self._cache.values())
+
+    def _block(self, block: int) -> bytes:
+        with self._lock:
+            data = self._cache.get(block)
+            if data is not None:
+                self._cache.move_to_end(block)
+                self.hits += 1
+                return data
+        start, end = int(self.index[block, 1]), int(self.index[block + 1, 1])
+        data = decompress(bytes(self.data[start:end]))
+        with self._lock:
+            self.misses += 1
+            self._cache[block] = data
+            while len(self._cache) > self.cache_blocks:
+                self._cache.popitem(last=False)
+        return data
+
+    def __getitem__(self, key: slice) -> bytes:
+        start, end, _ = key.indices(len(self))
+        if start >= end:
+            return b""
+        first = int(np.searchsorted(self._starts, start, side="right")) - 1
+        last = int(np.searchsorted(self._starts, end - 1, side="right")) - 1
+        parts = [self._block(block) for block in range(first, last + 1)]
+        data = parts[0] if len(parts) == 1 else b"".join(parts)
+        offset = int(self._starts[first])
+        return data[start - offset:end - offset]
@@ -0,0 +1,131 @@
+# Klient LangChain dla lokalnego serwisu wektorowego (app/vector_service.py)
+
+"""
+Ten plik zawiera `RemoteVectorStore` – VectorStore LangChain, który zamiast
+trzymać wektory u siebie, rozmawia przez HTTP z serwisem z
+`app/vector_service.py` (VECTOR_BACKEND=remote).
+
+Dokumenty są embedowane po stronie aplikacji i wysyłane partiami
+(VECTOR_SERVICE_BATCH), a wiele zapytań naraz (np. warianty pytania z trybu
+multi_query) trafia do serwisu w jednym wywołaniu `query`.
+"""
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from app.filters import InvalidFilter
+from app.http_client import get_http_client
+import numpy as np
+import os
+import uuid
+
+VECTOR_SERVICE_URL = os.getenv("VECTOR_SERVICE_URL", "http://localhost:8100")
+VECTOR_SERVICE_NAMESPACE = os.getenv("VECTOR_SERVICE_NAMESPACE", "rodo")
+UPSERT_BATCH_SIZE = int(os.getenv("VECTOR_SERVICE_BATCH", "256"))
+
+
+class RemoteVectorStore(VectorStore):
+    """VectorStore oparty na lokalnym serwisie wektorowym z API HTTP."""
+
+    def __init__(self, embedding, url: str = VECTOR_SERVICE_URL, namespace: str = VECTOR_SERVICE_NAMESPACE,
+                 client=None, timeout: float = 30.0):
+        self._embedding = embedding
+        self.url = url.rstrip("/")
+        self.namespace = namespace
+        # Domyślnie współdzielony klient z pulą połączeń (app/http_client.py), więc kolejne
+        # zapytania i wszystkie shardy używają już otwartych połączeń keep-alive; `timeout`
+        # jest wtedy podawany przy każdym zapytaniu. `client` pozwala podać własnego klienta
+        # httpx (np. TestClient FastAPI w testach) – obowiązują wtedy jego własne limity.
+        self._client = client or get_http_client()
+        self._request_options = {} if client is not None else {"timeout": timeout}
+
+    @property
+    def embeddings(self):
+        return self._embedding
+
+    def _request(self, method: str, path: str, payload=None):
+        response = self._client.request(method, f"{self.url}/namespaces/{self.namespace}{path}",
+                                        json=payload, **self._request_options)
+        if response.status_code == 400:
+            detail = response.json().get("detail", "")
+            raise InvalidFilter(detail) if detail.startswith("Nieprawidłowy filtr") else ValueError(detail)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return response.json()
+
+    def add_texts(self, texts, metadatas=None, ids=None, **kwargs):
+        texts = list(texts)
+        return self.add_embeddings(texts, self._embedding.embed_documents(texts), metadatas, ids)
+
+    def add_embeddings(self, texts, vectors, metadatas=None, ids=None):
+        """Wysyła gotowe wektory partiami po UPSERT_BATCH_SIZE."""
+        texts = list(texts)
+        ids = list(ids) if ids is not None else [uuid.uuid4().hex for _ in texts]
+        metadatas = list(metadatas) if metadatas is not None else [{} for _ in texts]
+        records = [
+            {"id": doc_id, "values": [float(x) for x in vector], "text": text, "metadata": metadata}
+            for doc_id, vector, text, metadata in zip(ids, vectors, texts, metadatas)
+        ]
+        for start in range(0, len(records), UPSERT_BATCH_SIZE):
+            self._request("POST", "/upsert", {"vectors": records[start:start + UPSERT_BATCH_SIZE]})
+        return ids
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, **kwargs):
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
+
+    def delete(self, ids=None, filter=None, **kwargs):
+        result = self._request("POST", "/delete", {"ids": list(ids or []), "filter": filter})
+        return result is not None
+
+    def clear(self):
+        """Usuwa całą przestrzeń nazw (np. przed ponowną ingestią)."""
+        self._request("DELETE", "")
+
+    def get_by_ids(self, ids):
+        """Dokumenty o podanych identyfikatorach (np. `chunk_id` nadawany przy ingestii)."""
+        ids = list(ids)
+        if not ids:
+            return []
+        result = self._request("POST", "/fetch", {"ids": ids})
+        return [self._document(match) for match in result["vectors"]] if result is not None else []
+
+    def _query(self, query_vectors, k: int, filters=None, include_values: bool = False):
+        payload = {"vectors": [[float(x) for x in vector] for vector in query_vectors], "top_k": k,
+                   "filter": filters or None, "include_values": include_values}
+        result = self._request("POST", "/query", payload)
+        return result["results"] if result is not None else [[] for _ in query_vectors]
+
+    @staticmethod
+    def _document(match) -> Document:
+        return Document(page_content=match["text"], metadata=match["metadata"], id=match["id"])
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4, filter=None, **kwargs):
+        return [(self._document(match), match["score"]) for match in self._query([embedding], k, filter)[0]]
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, **kwargs)]
+
+    def similarity_search_with_score(self, query, k: int = 4, **kwargs):
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, **kwargs)
+
+    def similarity_search(self, query, k: int = 4, **kwargs):
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, **kwargs)]
+
+    def _select_relevance_score_fn(self):
+        # Serwis zwraca podobieństwo kosinusowe z zakresu [-1, 1].
+        return lambda score: (score + 1) / 2
+
+    def search_with_scores_by_vectors(self, query_vectors, k: int, filters=None):
+        """Dla każdego zapytania lista trójek (dokument, podobieństwo, wektor), od najbliższego."""
+        return [[(self._document(match), match["score"], np.asarray(match["values"], dtype=np.float32)) for match in matches]
+                for matches in self._query(query_vectors, k, filters, include_values=True)]
+
+    def search_by_vectors(self, query_vectors, k: int, filters=None):
+        """Jak `retrieval.search_many_with_vectors`: wszystkie zapytania w jednym wywołaniu serwisu, razem z wektorami."""
+        results = []
+        for matches in self._query(query_vectors, k, filters, include_values=True):
+            vectors = np.asarray([match["values"] for match in matches], dtype=np.float32)
+            results.append(([self._document(match) for match in matches], vectors))
+        return results
@@ -0,0 +1,383 @@
+# Lokalny serwis bazy wektorowej z API HTTP (zastępstwo zarządanej bazy do pracy offline)
+
+"""
+Ten plik zawiera mały serwer bazy wektorowej, który naśladuje usługi w rodzaju
+Pinecone: przestrzenie nazw, wsadowe upsert/delete/query/fetch i filtry metadanych
+(ta sama składnia co w `/ask`, zob. `app/filters.py`).
+
+Uruchomienie (z katalogu module-final-project):
+
+    uvicorn app.vector_service:app --port 8100
+
+Trwałość zapewnia dziennik zapisu z wyprzedzeniem (write-ahead log): każda
+operacja zmieniająca dane jest najpierw dopisywana do `wal.jsonl` i
+utrwalana przez fsync, a dopiero potem stosowana w pamięci. Po restarcie
+serwis wczytuje ostatni zrzut (`snapshot.npz`) i odtwarza z dziennika
+operacje, które po nim nastąpiły. Co VECTOR_SERVICE_COMPACT_EVERY operacji
+zrzut jest zapisywany od nowa, a dziennik czyszczony.
+
+Po stronie aplikacji serwis jest widoczny jako zwykły VectorStore LangChain
+(`app/vector_client.py`, VECTOR_BACKEND=remote).
+"""
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel, Field
+from app.filters import InvalidFilter, MetadataBitsets
+from app.local_store import normalize
+from typing import Any, Dict, List, Optional
+import json
+import numpy as np
+import os
+import re
+import shutil
+import threading
+
+SERVICE_DIR = os.getenv("VECTOR_SERVICE_DIR", os.path.join(os.path.dirname(__file__), '..', 'vector_db', 'service'))
+# Po ilu operacjach w dzienniku zapisujemy nowy zrzut i czyścimy dziennik.
+COMPACT_EVERY = int(os.getenv("VECTOR_SERVICE_COMPACT_EVERY", "1000"))
+# Maksymalna liczba wektorów w jednym wywołaniu upsert/query.
+MAX_BATCH = int(os.getenv("VECTOR_SERVICE_MAX_BATCH", "1000"))
+
+NAMESPACE_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class Namespace:
+    """Jedna przestrzeń nazw: wektory (znormalizowane) z tekstami i metadanymi, zrzut i dziennik na dysku."""
+
+    def __init__(self, path: str, compact_every: int = COMPACT_EVERY):
+        self.path = path
+        self.compact_every = compact_every
+        self.lock = threading.Lock()
+        self.ids = []
+        self.rows = {}
+        self.texts = []
+        self.metadatas = []
+        # Bufor z zapasem miejsca (jak lista w Pythonie), aby kolejne partie nie kopiowały całej macierzy.
+        self._matrix = None
+        self.bitsets = None
+        self.wal_records = 0
+        os.makedirs(path, exist_ok=True)
+        self._load()
+        self._wal = open(os.path.join(path, "wal.jsonl"), "a", encoding="utf-8")
+
+    @property
+    def vectors(self):
+        return None if self._matrix is None else self._matrix[:len(self.ids)]
+
+    @property
+    def dimension(self):
+        return None if self._matrix is None else self._matrix.shape[1]
+
+    def _reserve(self, count: int, dimension: int):
+        if self._matrix is not None and count <= len(self._matrix):
+            return
+        capacity = max(count, 2 * (0 if self._matrix is None else len(self._matrix)), 1024)
+        grown = np.empty((capacity, dimension), dtype=np.float32)
+        if self._matrix is not None:
+            grown[:len(self.ids)] = self.vectors
+        self._matrix = grown
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _load(self):
+        snapshot = os.path.join(self.path, "snapshot.npz")
+        if os.path.exists(snapshot):
+            with np.load(snapshot) as data:
+                docs = json.loads(str(data["docs"]))
+                if docs:
+                    self._matrix = data["vectors"]
+            for row, doc in enumerate(docs):
+                self.rows[doc["id"]] = row
+                self.ids.append(doc["id"])
+                self.texts.append(doc["text"])
+                self.metadatas.append(doc["metadata"])
+        wal = os.path.join(self.path, "wal.jsonl")
+        if os.path.exists(wal):
+            valid_bytes = 0
+            with open(wal, "rb") as f:
+                for line in f:
+                    try:
+                        operation = json.loads(line)
+                    except ValueError:
+                        break
+                    self._apply(operation)
+                    self.wal_records += 1
+                    valid_bytes += len(line)
+            # Niedokończony ostatni wpis (awaria w trakcie zapisu) nie został potwierdzony klientowi – obcinamy go,
+            # aby kolejne operacje nie zostały dopisane za uszkodzoną linią.
+            if valid_bytes < os.path.getsize(wal):
+                with open(wal, "r+b") as f:
+                    f.truncate(valid_bytes)
+
+    def _log(self, operation):
+        """Dopisuje operację do dziennika i czeka, aż trafi na dysk – dopiero potem ją stosujemy."""
+        self._wal.write(json.dumps(operation, ensure_ascii=False) + "\n")
+        self._wal.flush()
+        os.fsync(self._wal.fileno())
+        self.wal_records += 1
+
+    def _apply(self, operation):
+        if operation["op"] == "upsert":
+            self._upsert(operation["items"])
+        elif operation["op"] == "delete":
+            self._delete(operation["ids"])
+        self.bitsets = None
+
+    def _upsert(self, items):
+        # Powtórzony identyfikator w jednej partii – wygrywa ostatnia wersja.
+        items = list({item["id"]: item for item in items}.values())
+        vectors = normalize([item["values"] for item in items])
+        self._reserve(len(self.ids) + len(items), vectors.shape[1])
+        for item, vector in zip(items, vectors):
+            row = self.rows.get(item["id"])
+            if row is None:
+                row = self.rows[item["id"]] = len(self.ids)
+                self.ids.append(item["id"])
+                self.texts.append(item.get("text", ""))
+                self.metadatas.append(item.get("metadata") or {})
+            else:
+                self.texts[row] = item.get("text", "")
+                self.metadatas[row] = item.get("metadata") or {}
+            self._matrix[row] = vector
+
+    def _delete(self, ids):
+        remove = sorted((self.rows[doc_id] for doc_id in set(ids) if doc_id in self.rows), reverse=True)
+        if not remove:
+            return
+        keep = np.ones(len(self.ids), dtype=bool)
+        keep[remove] = False
+        kept = self.vectors[keep]
+        for row in remove:
+            del self.ids[row], self.texts[row], self.metadatas[row]
+        self._matrix[:len(kept)] = kept
+        self.rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+    def _check_dimension(self, vectors):
+        dimension = self.dimension or len(vectors[0])
+        if any(len(vector) != dimension for vector in vectors):
+            raise ValueError(f"Wszystkie wektory w tej przestrzeni nazw muszą mieć wymiar {dimension}.")
+
+    def upsert(self, items):
+        """Dodaje lub nadpisuje wektory; zwraca ich liczbę."""
+        with self.lock:
+            self._check_dimension([item["values"] for item in items])
+            operation = {"op": "upsert", "items": items}
+            self._log(operation)
+            self._apply(operation)
+            self._maybe_compact()
+        return len(items)
+
+    def delete(self, ids=None, filters=None):
+        """Usuwa wektory o podanych identyfikatorach i/lub spełniające filtr; zwraca liczbę usuniętych."""
+        with self.lock:
+            ids = [doc_id for doc_id in (ids or []) if doc_id in self.rows]
+            if filters:
+                ids += [self.ids[row] for row in np.flatnonzero(self._mask(filters))]
+            ids = list(dict.fromkeys(ids))
+            if ids:
+                operation = {"op": "delete", "ids": ids}
+                self._log(operation)
+                self._apply(operation)
+                self._maybe_compact()
+        return len(ids)
+
+    def fetch(self, ids):
+        """Zapisane rekordy (bez wektorów) o podanych identyfikatorach; nieznane są pomijane."""
+        with self.lock:
+            return [{"id": doc_id, "text": self.texts[self.rows[doc_id]], "metadata": self.metadatas[self.rows[doc_id]]}
+                    for doc_id in dict.fromkeys(ids) if doc_id in self.rows]
+
+    def _mask(self, filters):
+        if self.bitsets is None:
+            self.bitsets = MetadataBitsets.build(self.metadatas)
+        return self.bitsets.mask(filters)
+
+    def query(self, vectors, top_k: int, filters=None, include_values: bool = False):
+        """Najbliższe wektory (podobieństwo kosinusowe) dla każdego z zapytań – wszystkie liczone jednym mnożeniem macierzy."""
+        with self.lock:
+            if not self.ids:
+                return [[] for _ in vectors]
+            self._check_dimension(vectors)
+            scores = normalize(vectors) @ self.vectors.T
+            if filters:
+                scores[:, ~self._mask(filters)] = -np.inf
+            count = min(top_k, len(self.ids))
+            results = []
+            for row_scores in scores:
+                top = np.argpartition(-row_scores, count - 1)[:count]
+                top = top[np.argsort(-row_scores[top], kind="stable")]
+                matches = []
+                for row in top[np.isfinite(row_scores[top])]:
+                    match = {"id": self.ids[row], "score": float(row_scores[row]),
+                             "text": self.texts[row], "metadata": self.metadatas[row]}
+                    if include_values:
+                        match["values"] = self.vectors[row].tolist()
+                    matches.append(match)
+                results.append(matches)
+            return results
+
+    def _maybe_compact(self):
+        if self.wal_records >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Zapisuje pełny zrzut (atomowo, przez plik tymczasowy) i czyści dziennik."""
+        docs = [{"id": doc_id, "text": text, "metadata": metadata}
+                for doc_id, text, metadata in zip(self.ids, self.texts, self.metadatas)]
+        vectors = self.vectors if self.vectors is not None else np.zeros((0, 0), dtype=np.float32)
+        tmp_path = os.path.join(self.path, "snapshot.tmp.npz")
+        with open(tmp_path, "wb") as f:
+            np.savez(f, vectors=vectors, docs=np.array(json.dumps(docs, ensure_ascii=False)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.path, "snapshot.npz"))
+        # Awaria w tym miejscu jest niegroźna: ponowne odtworzenie dziennika na nowym zrzucie daje ten sam stan.
+        self._wal.truncate(0)
+        self._wal.seek(0)
+        self.wal_records = 0
+
+    def close(self):
+        with self.lock:
+            self._wal.close()
+
+
+class VectorService:
+    """Zbiór przestrzeni nazw zapisanych w podkatalogach `root`."""
+
+    def __init__(self, root: str = SERVICE_DIR, compact_every: int = COMPACT_EVERY):
+        self.root = root
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self.namespaces = {}
+        os.makedirs(root, exist_ok=True)
+        for name in sorted(os.listdir(root)):
+            if NAMESPACE_PATTERN.match(name) and os.path.isdir(os.path.join(root, name)):
+                self.namespaces[name] = Namespace(os.path.join(root, name), compact_every)
+
+    def get(self, name: str, create: bool = False):
+        with self._lock:
+            namespace = self.namespaces.get(name)
+            if namespace is None and create:
+                if not NAMESPACE_PATTERN.match(name):
+                    raise ValueError("Nazwa przestrzeni może zawierać tylko litery, cyfry, '_' i '-' (do 64 znaków).")
+                namespace = self.namespaces[name] = Namespace(os.path.join(self.root, name), self.compact_every)
+            return namespace
+
+    def drop(self, name: str) -> bool:
+        with self._lock:
+            namespace = self.namespaces.pop(name, None)
+        if namespace is None:
+            return False
+        namespace.close()
+        shutil.rmtree(namespace.path, ignore_errors=True)
+        return True
+
+    def close(self):
+        for namespace in list(self.namespaces.values()):
+            namespace.close()
+
+
+class VectorRecord(BaseModel):
+    id: str = Field(min_length=1, max_length=512)
+    values: List[float]
+    text: str = ""
+    metadata: Dict[str, Any] = Field(default_factory=dict)
+
+class UpsertRequest(BaseModel):
+    vectors: List[VectorRecord]
+
+class DeleteRequest(BaseModel):
+    ids: List[str] = Field(default_factory=list)
+    filter: Optional[Dict[str, Any]] = None
+
+class FetchRequest(BaseModel):
+    ids: List[str]
+
+class QueryRequest(BaseModel):
+    vectors: List[List[float]]
+    top_k: int = Field(default=4, ge=1, le=1000)
+    filter: Optional[Dict[str, Any]] = None
+    include_values: bool = False
+
+
+app = FastAPI(
+    title="Lokalny serwis wektorowy",
+    description="Przestrzenie nazw, wsadowe upsert/delete/query i filtry metadanych, z dziennikiem zapisu (WAL)."
+)
+
+service = None
+
+@app.on_event("startup")
+def startup_event():
+    global service
+    service = VectorService()
+    print(f"Serwis wektorowy gotowy: {len(service.namespaces)} przestrzeni nazw w {os.path.abspath(SERVICE_DIR)}.")
+
+@app.on_event("shutdown")
+def shutdown_event():
+    if service is not None:
+        service.close()
+
+def _namespace(name: str):
+    namespace = service.get(name)
+    if namespace is None:
+        raise HTTPException(status_code=404, detail=f"Przestrzeń nazw '{name}' nie istnieje.")
+    return namespace
+
+def _check_batch(size: int):
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Lista wektorów nie może być pusta.")
+    if size > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Maksymalnie {MAX_BATCH} wektorów w jednym zapytaniu.")
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "namespaces": len(service.namespaces)}
+
+@app.get("/namespaces")
+def list_namespaces():
+    """Przestrzenie nazw z liczbą wektorów i ich wymiarem."""
+    return {"namespaces": {name: {"count": len(namespace), "dimension": namespace.dimension}
+                           for name, namespace in service.namespaces.items()}}
+
+@app.post("/namespaces/{name}/upsert")
+def upsert(name: str, request: UpsertRequest):
+    """Dodaje lub nadpisuje wektory (przestrzeń nazw jest tworzona przy pierwszym zapisie)."""
+    _check_batch(len(request.vectors))
+    try:
+        namespace = service.get(name, create=True)
+        return {"upserted": namespace.upsert([record.model_dump() for record in request.vectors])}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/namespaces/{name}/delete")
+def delete(name: str, request: DeleteRequest):
+    """Usuwa wektory po identyfikatorach i/lub filtrze metadanych."""
+    try:
+        return {"deleted": _namespace(name).delete(request.ids, request.filter)}
+    except InvalidFilter as e:
+        raise HTTPException(status_code=400, detail=f"Nieprawidłowy filtr: {e}")
+
+@app.post("/namespaces/{name}/fetch")
+def fetch(name: str, request: FetchRequest):
+    """Zwraca teksty i metadane rekordów o podanych identyfikatorach."""
+    _check_batch(len(request.ids))
+    return {"vectors": _namespace(name).fetch(request.ids)}
+
+@app.post("/namespaces/{name}/query")
+def query(name: str, request: QueryRequest):
+    """Wyszukuje `top_k` najbliższych wektorów dla każdego z zapytań w partii."""
+    _check_batch(len(request.vectors))
+    try:
+        return {"results": _namespace(name).query(request.vectors, request.top_k, request.filter, request.include_values)}
+    except InvalidFilter as e:
+        raise HTTPException(status_code=400, detail=f"Nieprawidłowy filtr: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/namespaces/{name}")
+def drop_namespace(name: str):
+    """Usuwa całą przestrzeń nazw razem z plikami na dysku."""
+    if not service.drop(name):
+        raise HTTPException(status_code=404, detail=f"Przestrzeń nazw '{name}' nie istnieje.")
+    return {"deleted": name}
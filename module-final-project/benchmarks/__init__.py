@@ -0,0 +1 @@
+# Plik może być pusty. Jego obecność sprawia, że folder benchmarks jest traktowany jako pakiet Pythona.
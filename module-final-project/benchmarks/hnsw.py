@@ -0,0 +1,79 @@
+# Porównanie grafu HNSW z dokładnym wyszukiwaniem na syntetycznym korpusie
+
+"""
+Ten skrypt mierzy recall@k i czas zapytania indeksu HNSW (`app/hnsw.py`)
+względem dokładnego przeszukania wszystkich wektorów, dla kilku wartości
+`ef_search`. Raportuje też czas budowy grafu i jego rozmiar na dysku.
+
+Korpus jest syntetyczny (skupiska wektorów jak w `benchmarks/quantization.py`),
+więc test nie wymaga klucza API. Implementacja jest w czystym Pythonie i
+NumPy – budowa grafu jest wolniejsza niż w bibliotekach w C++, a przewaga
+nad pełnym skanem pojawia się dopiero przy dużych bazach.
+
+Uruchomienie (z głównego folderu projektu):
+    python -m benchmarks.hnsw --n 20000 --dim 128 --m 16 --ef-construction 100 --ef-search 16 32 64 128
+"""
+from app.hnsw import HNSWIndex
+from benchmarks.quantization import synthetic_corpus
+import argparse
+import numpy as np
+import os
+import tempfile
+import time
+
+
+def timed_queries(search, queries):
+    latencies, results = [], []
+    for query in queries:
+        started_at = time.perf_counter()
+        results.append(search(query))
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    latencies.sort()
+    return results, latencies[len(latencies) // 2], latencies[int(0.95 * (len(latencies) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall i opóźnienia HNSW względem wyszukiwania dokładnego.")
+    parser.add_argument("--n", type=int, default=20000, help="Liczba wektorów w korpusie.")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=100)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors, queries = synthetic_corpus(args.n, args.dim, args.topics, args.seed)
+    queries = queries[:args.queries]
+
+    index = HNSWIndex(args.dim, args.m, args.ef_construction)
+    started_at = time.perf_counter()
+    index.add(vectors)
+    build_s = time.perf_counter() - started_at
+
+    with tempfile.TemporaryDirectory() as path:
+        graph_path = os.path.join(path, "hnsw.npz")
+        index.save(graph_path)
+        graph_mb = os.path.getsize(graph_path) / 2 ** 20
+        started_at = time.perf_counter()
+        index = HNSWIndex.load(graph_path, vectors)
+        load_s = time.perf_counter() - started_at
+
+    truth, exact_p50, exact_p95 = timed_queries(
+        lambda q: set(np.argpartition(-(vectors @ q), args.k)[:args.k].tolist()), queries)
+
+    print(f"Graf: {args.n} wektorów, budowa {build_s:.1f} s, odczyt {load_s:.2f} s, {graph_mb:.1f} MB na dysku")
+    header = f"{'metoda':>14} {'p50 ms':>7} {'p95 ms':>7} {'recall@' + str(args.k):>10}"
+    print(header)
+    print("-" * len(header))
+    print(f"{'dokładna':>14} {exact_p50:>7.2f} {exact_p95:>7.2f} {1.0:>10.3f}")
+    for ef in args.ef_search:
+        found, p50, p95 = timed_queries(lambda q: index.search(q, args.k, ef)[0], queries)
+        recall = sum(len(set(f.tolist()) & t) for f, t in zip(found, truth)) / (args.k * len(queries))
+        print(f"{'hnsw ef=' + str(ef):>14} {p50:>7.2f} {p95:>7.2f} {recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
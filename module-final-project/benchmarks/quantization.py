@@ -0,0 +1,87 @@
+# Porównanie indeksów float32, int8 i binarnego w lokalnym magazynie wektorów
+
+"""
+Ten skrypt mierzy, ile pamięci oszczędza kwantyzacja indeksu w
+`LocalVectorStore` i ile kosztuje to jakości oraz czasu wyszukiwania.
+
+Korpus jest syntetyczny: wektory skupione wokół losowych "tematów" (jak
+fragmenty kilku aktów prawnych), więc test nie wymaga klucza API. Dla
+każdego wariantu raportujemy:
+- rozmiar indeksu skanowanego w pamięci (wektory float32 leżą w mmapie),
+- medianę i p95 czasu zapytania,
+- recall@k względem dokładnego wyszukiwania na float32.
+
+Uruchomienie (z głównego folderu projektu):
+    python -m benchmarks.quantization --n 200000 --dim 1536 --k 10
+"""
+from app.local_store import QUANTIZATIONS, LocalVectorStore, normalize
+import argparse
+import numpy as np
+import os
+import tempfile
+import time
+
+
+def synthetic_corpus(n, dim, topics, seed):
+    """Wektory skupione wokół `topics` środków, znormalizowane jak embeddingi OpenAI."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, topics, n)] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32)
+    queries = centers[rng.integers(0, topics, 200)] + 0.6 * rng.standard_normal((200, dim)).astype(np.float32)
+    return normalize(vectors), normalize(queries)
+
+
+def evaluate(store, queries, truth, k):
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        started_at = time.perf_counter()
+        indices, _ = store.search_indices(query, k)
+        latencies.append((time.perf_counter() - started_at) * 1000)
+        hits += len(set(indices.tolist()) & expected)
+    latencies.sort()
+    return {
+        "index_mb": store.index_nbytes() / 2 ** 20,
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))],
+        "recall": hits / (k * len(queries)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kwantyzacja int8 / binarna z przeliczeniem na float32.")
+    parser.add_argument("--n", type=int, default=100000, help="Liczba wektorów w korpusie.")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--rescore-factors", type=int, nargs="+", default=[4, 10])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors, queries = synthetic_corpus(args.n, args.dim, args.topics, args.seed)
+    queries = queries[:args.queries]
+    truth = [set(np.argsort(-(vectors @ query))[:args.k].tolist()) for query in queries]
+    texts = [str(i) for i in range(args.n)]
+
+    with tempfile.TemporaryDirectory() as path:
+        builder = LocalVectorStore(None, "none")
+        builder.add_embeddings(texts, vectors)
+        for quantization in QUANTIZATIONS:
+            builder.quantization = quantization
+            builder.save(path)
+
+        header = f"{'indeks':>8} {'rescore':>8} {'MB w RAM':>9} {'p50 ms':>7} {'p95 ms':>7} {'recall@' + str(args.k):>10}"
+        print(header)
+        print("-" * len(header))
+        for quantization in QUANTIZATIONS:
+            factors = [1] if quantization == "none" else args.rescore_factors
+            for factor in factors:
+                store = LocalVectorStore.load(path, None, quantization, factor)
+                r = evaluate(store, queries, truth, args.k)
+                print(f"{quantization:>8} {factor:>8} {r['index_mb']:>9.1f} {r['p50_ms']:>7.2f} "
+                      f"{r['p95_ms']:>7.2f} {r['recall']:>10.3f}")
+        print(f"Wektory float32 na dysku (mmap): {os.path.getsize(os.path.join(path, 'vectors.f32.npy')) / 2 ** 20:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
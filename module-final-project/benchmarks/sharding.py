@@ -0,0 +1,100 @@
+# Przepustowość wyszukiwania w bazie podzielonej na shardy (1..N procesów roboczych)
+
+"""
+Ten skrypt mierzy, jak przepustowość zapytań rośnie z liczbą shardów
+`ShardedVectorStore` (app/sharding.py), gdy każdy shard jest osobnym
+procesem roboczym.
+
+Korpus jest syntetyczny (jak w `benchmarks.quantization`), więc test nie
+wymaga klucza API. Dla każdej liczby shardów zapisujemy korpus przez
+`write_shards`, uruchamiamy procesy robocze i wysyłamy zapytania z kilku
+wątków naraz. Raportujemy:
+- zapytania na sekundę,
+- medianę i p95 czasu zapytania,
+- recall@k względem dokładnego wyszukiwania w całym korpusie (scatter-gather
+  z płaskim skanem powinien dawać 1.0),
+- rozkład fragmentów między shardy.
+
+Shardy skalują się najwyżej do liczby rdzeni procesora.
+
+Uruchomienie (z głównego folderu projektu):
+    python -m benchmarks.sharding --n 500000 --dim 384 --shards 1 2 4 8 --concurrency 16
+"""
+from langchain_core.documents import Document
+from app.sharding import open_sharded_store, write_shards
+from benchmarks.quantization import synthetic_corpus
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import numpy as np
+import tempfile
+import time
+
+
+class PrecomputedEmbeddings:
+    """Zwraca gotowe wektory syntetycznego korpusu zamiast wywoływać model embeddingowy."""
+
+    def __init__(self, texts, vectors):
+        self.by_text = dict(zip(texts, vectors))
+
+    def embed_documents(self, texts):
+        return [self.by_text[text] for text in texts]
+
+    def embed_query(self, text):
+        return self.by_text[text]
+
+
+def run(store, queries, k, concurrency):
+    """Wysyła wszystkie zapytania z `concurrency` wątków; zwraca (zapytania/s, czasy w ms, wyniki)."""
+    def search(query):
+        started_at = time.perf_counter()
+        hits = store.search_with_scores_by_vectors([query], k)[0]
+        return (time.perf_counter() - started_at) * 1000, [int(doc.page_content) for doc, _, _ in hits]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        started_at = time.perf_counter()
+        results = list(pool.map(search, queries))
+        elapsed = time.perf_counter() - started_at
+    return len(queries) / elapsed, sorted(latency for latency, _ in results), [found for _, found in results]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Przepustowość scatter-gather dla 1..N shardów.")
+    parser.add_argument("--n", type=int, default=200000, help="Liczba wektorów w korpusie.")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--sources", type=int, default=40, help="Liczba plików źródłowych (dla --by source).")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--concurrency", type=int, default=8, help="Liczba wątków wysyłających zapytania.")
+    parser.add_argument("--by", choices=["chunk", "source"], default="chunk")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors, queries = synthetic_corpus(args.n, args.dim, args.topics, args.seed)
+    queries = np.resize(queries, (args.queries, args.dim))
+    texts = [str(i) for i in range(args.n)]
+    docs = [Document(page_content=text, metadata={"source": f"akt-{i % args.sources}.pdf", "page": i % 300})
+            for i, text in enumerate(texts)]
+    embeddings = PrecomputedEmbeddings(texts, vectors)
+    truth = [set(np.argsort(-(vectors @ query))[:args.k].tolist()) for query in queries]
+
+    header = f"{'shardy':>6} {'zapytań/s':>10} {'p50 ms':>7} {'p95 ms':>7} {'recall@' + str(args.k):>10}  fragmenty w shardach"
+    print(header)
+    print("-" * len(header))
+    for shards in args.shards:
+        with tempfile.TemporaryDirectory() as path:
+            sizes = write_shards(docs, embeddings, shards, args.by, path, nodes=[])
+            store = open_sharded_store(embeddings, path, nodes=[])
+            try:
+                run(store, queries[:args.concurrency], args.k, args.concurrency)
+                qps, latencies, found = run(store, queries, args.k, args.concurrency)
+            finally:
+                store.close()
+        recall = sum(len(set(f) & t) for f, t in zip(found, truth)) / (args.k * len(queries))
+        print(f"{shards:>6} {qps:>10.1f} {latencies[len(latencies) // 2]:>7.2f} "
+              f"{latencies[int(0.95 * (len(latencies) - 1))]:>7.2f} {recall:>10.3f}  {min(sizes)}–{max(sizes)}")
+
+
+if __name__ == "__main__":
+    main()
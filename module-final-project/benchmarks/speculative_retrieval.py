@@ -0,0 +1,107 @@
+# Pomiar zysku z wyszukiwania spekulatywnego w /chat
+
+"""
+Ten skrypt mierzy, ile czasu odpowiedzi `/chat` oszczędza wyszukiwanie
+spekulatywne (`SPECULATIVE_RETRIEVAL`).
+
+Model językowy i baza wektorowa są zastąpione atrapami o zadanych
+opóźnieniach, więc wynik nie zależy od sieci ani od klucza API – mierzymy
+wyłącznie kolejność i równoległość etapów potoku `RagPipeline.chat`.
+Parametr `--same-share` określa, jaka część przeformułowań jest prawie
+identyczna z oryginalnym pytaniem (wtedy wynik spekulatywny jest używany
+bez drugiego wyszukiwania).
+
+Uruchomienie (z głównego folderu projektu):
+    python -m benchmarks.speculative_retrieval --rewrite-ms 600 --retrieval-ms 150 --answer-ms 900
+"""
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessageChunk
+from app import core
+from app.chat_memory import ChatSession
+import argparse
+import random
+import statistics
+import time
+
+
+class SleepyLLM:
+    """Atrapa LLM: przeformułowanie i odpowiedź przychodzą po zadanym czasie."""
+
+    def __init__(self, rewrite_s, answer_s, same_share, seed=0):
+        self.rewrite_s = rewrite_s
+        self.answer_s = answer_s
+        self.same_share = same_share
+        self.random = random.Random(seed)
+
+    def stream(self, prompt):
+        if "Samodzielne pytanie:" in prompt:
+            time.sleep(self.rewrite_s)
+            question = prompt.split("Ostatnie pytanie:")[1].split("Samodzielne pytanie:")[0].strip()
+            if self.random.random() < self.same_share:
+                yield AIMessageChunk(content=question)
+            else:
+                yield AIMessageChunk(content=f"Jakie obowiązki administratora danych wynikają z RODO? {question}")
+        else:
+            time.sleep(self.answer_s)
+            yield AIMessageChunk(content="Odpowiedź na podstawie fragmentów RODO.")
+
+
+class SleepyRetriever:
+    """Atrapa retrievera: zwraca stałe fragmenty po zadanym czasie."""
+
+    def __init__(self, latency_s, k=core.RETRIEVER_K):
+        self.latency_s = latency_s
+        self.k = k
+
+    def invoke(self, query):
+        time.sleep(self.latency_s)
+        return [Document(page_content=f"Fragment {i} dla: {query[:40]}", metadata={"page": i, "source": "rodo_pl.pdf"})
+                for i in range(self.k)]
+
+
+def measure(speculative, args):
+    """Zwraca czasy (w ms) kolejnych wywołań `chat` przy włączonym lub wyłączonym trybie spekulatywnym."""
+    core.SPECULATIVE_RETRIEVAL = speculative
+    llm = SleepyLLM(args.rewrite_ms / 1000, args.answer_ms / 1000, args.same_share, args.seed)
+    pipeline = core.RagPipeline(SleepyRetriever(args.retrieval_ms / 1000), llm, prompt=None)
+    timings = []
+    for i in range(args.runs):
+        session = ChatSession(f"bench-{i}")
+        session.add("user", "Czym są dane osobowe?")
+        session.add("assistant", "Dane osobowe to informacje o zidentyfikowanej osobie fizycznej.")
+        started_at = time.perf_counter()
+        pipeline.chat(session, "A jakie ma obowiązki administrator?")
+        timings.append((time.perf_counter() - started_at) * 1000)
+    return timings
+
+
+def summarize(timings):
+    ordered = sorted(timings)
+    return statistics.median(ordered), ordered[max(0, int(round(0.95 * len(ordered))) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zysk z wyszukiwania spekulatywnego w /chat.")
+    parser.add_argument("--rewrite-ms", type=float, default=600, help="Czas przeformułowania pytania przez LLM.")
+    parser.add_argument("--retrieval-ms", type=float, default=150, help="Czas jednego wyszukiwania (embedding + baza).")
+    parser.add_argument("--answer-ms", type=float, default=900, help="Czas generowania odpowiedzi.")
+    parser.add_argument("--same-share", type=float, default=0.5,
+                        help="Jaka część przeformułowań jest prawie identyczna z pytaniem (0-1).")
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    baseline = summarize(measure(False, args))
+    speculative = summarize(measure(True, args))
+
+    header = f"{'tryb':>12} {'p50 ms':>8} {'p95 ms':>8}"
+    print(header)
+    print("-" * len(header))
+    print(f"{'sekwencyjny':>12} {baseline[0]:>8.1f} {baseline[1]:>8.1f}")
+    print(f"{'spekulatywny':>12} {speculative[0]:>8.1f} {speculative[1]:>8.1f}")
+    print(f"Oszczędność p50: {baseline[0] - speculative[0]:.1f} ms "
+          f"({(baseline[0] - speculative[0]) / baseline[0]:.0%} czasu odpowiedzi)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# Pamięć i miejsce na dysku tekstów fragmentów i stron: bez kompresji i w blokach zstd
+
+"""
+Ten skrypt mierzy, ile kosztuje przechowywanie tekstów korpusu RODO przed i
+po kompresji (app/text_blocks.py).
+
+Korpus to prawdziwy dokument z `data/rodo_pl.pdf`, podzielony tak jak przy
+ingestii (CHUNK_SIZE / CHUNK_OVERLAP). Porównujemy:
+- fragmenty jako obiekty `Document` z `docs.jsonl` (tak trzymał je
+  `LocalVectorStore` przed kolumnami; tekst w Chroma też leży bez kompresji),
+- kolumny `ChunkStore` z tekstem w blokach zstd, czytane przez mmap,
+- strony w `ParentStore` skompresowane zlib (poprzednio) i zstd.
+
+Dla każdego wariantu raportujemy rozmiar na dysku, pamięć zajętą przez
+obiekty Pythona po wczytaniu i po serii zapytań (z pamięcią LRU
+rozpakowanych bloków) oraz medianę czasu odczytu tekstów top-k.
+
+Uruchomienie (z głównego folderu projektu):
+    python -m benchmarks.text_store --pdf data/rodo_pl.pdf --k 3 --queries 500
+"""
+from langchain_core.documents import Document
+from app.chunk_store import ChunkStore
+from app.ingest_data import PDF_PATH, load_documents, split_documents
+from app.parent_store import ParentStore, parent_id
+from app.text_blocks import TEXT_BLOCK_SIZE, TEXT_CACHE_BLOCKS
+import argparse
+import json
+import numpy as np
+import os
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+import zlib
+
+
+def measure(load, read, queries):
+    """Zwraca (obiekt, pamięć po wczytaniu, pamięć po zapytaniach, mediana odczytu w ms)."""
+    tracemalloc.start()
+    store = load()
+    loaded = tracemalloc.get_traced_memory()[0]
+    latencies = []
+    for rows in queries:
+        started_at = time.perf_counter()
+        read(store, rows)
+        latencies.append((time.perf_counter() - started_at) * 1000)
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return store, loaded, used, float(np.median(latencies))
+
+
+def chunk_variants(chunks, queries, path):
+    ids = [f"{i:020x}" for i in range(len(chunks))]
+    jsonl = os.path.join(path, "docs.jsonl")
+    with open(jsonl, "w", encoding="utf-8") as f:
+        for doc_id, doc in zip(ids, chunks):
+            f.write(json.dumps({"id": doc_id, "text": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False) + "\n")
+
+    def load_documents_list():
+        with open(jsonl, encoding="utf-8") as f:
+            return [Document(page_content=row["text"], metadata=row["metadata"], id=row["id"])
+                    for row in map(json.loads, f)]
+
+    _, loaded, used, latency = measure(load_documents_list, lambda docs, rows: [docs[i] for i in rows], queries)
+    yield "fragmenty: Document + dict", os.path.getsize(jsonl), loaded, used, latency
+
+    columns = ChunkStore()
+    columns.extend(ids, [doc.page_content for doc in chunks], [doc.metadata for doc in chunks])
+    os.makedirs(os.path.join(path, "columns"))
+    columns.save(os.path.join(path, "columns"))
+    disk = sum(os.path.getsize(os.path.join(path, "columns", name)) for name in os.listdir(os.path.join(path, "columns")))
+    store, loaded, used, latency = measure(lambda: ChunkStore.load(os.path.join(path, "columns")),
+                                           lambda store, rows: [store.document(i) for i in rows], queries)
+    yield "fragmenty: kolumny + bloki zstd", disk, loaded, used, latency
+    text = store._text
+    print(f"Bloki tekstu: {len(text.index) - 1} po ~{TEXT_BLOCK_SIZE // 1024} KB, {len(text) / 1024:.0f} KB tekstu -> "
+          f"{text.nbytes / 1024:.0f} KB; trafienia LRU ({TEXT_CACHE_BLOCKS} bloków): "
+          f"{text.hits / max(1, text.hits + text.misses):.0%}.")
+
+
+def page_variants(pages, queries, path):
+    keys = [parent_id(doc.metadata) for doc in pages]
+    legacy = os.path.join(path, "parents-zlib.sqlite")
+    db = sqlite3.connect(legacy)
+    db.execute("CREATE TABLE parents (id TEXT PRIMARY KEY, data BLOB NOT NULL)")
+    db.executemany("INSERT OR REPLACE INTO parents (id, data) VALUES (?, ?)", [
+        (parent_id(doc.metadata),
+         zlib.compress(json.dumps({"text": doc.page_content, "metadata": doc.metadata}, ensure_ascii=False).encode("utf-8")))
+        for doc in pages
+    ])
+    db.commit()
+    db.close()
+    current = os.path.join(path, "parents.sqlite")
+    ParentStore(current).put_many(pages)
+
+    def read_zlib(db, rows):
+        ids = [keys[i] for i in rows]
+        found = db.execute(f"SELECT id, data FROM parents WHERE id IN ({','.join('?' * len(ids))})", ids).fetchall()
+        return {key: json.loads(zlib.decompress(blob)) for key, blob in found}
+
+    _, loaded, used, latency = measure(lambda: sqlite3.connect(legacy), read_zlib, queries)
+    yield "strony: zlib w SQLite", os.path.getsize(legacy), loaded, used, latency
+    _, loaded, used, latency = measure(lambda: ParentStore(current),
+                                       lambda store, rows: store.get_many(keys[i] for i in rows), queries)
+    yield "strony: zstd w SQLite", os.path.getsize(current), loaded, used, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rozmiar tekstów korpusu przed i po kompresji zstd.")
+    parser.add_argument("--pdf", default=PDF_PATH)
+    parser.add_argument("--k", type=int, default=3, help="Ile fragmentów (stron) odczytuje jedno zapytanie.")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.pdf):
+        raise SystemExit(f"Brak pliku {args.pdf} – zob. data/README.md.")
+    pages = load_documents(args.pdf)
+    chunks = split_documents(pages)
+    rng = np.random.default_rng(args.seed)
+    chunk_queries = [rng.integers(0, len(chunks), args.k) for _ in range(args.queries)]
+    page_queries = [rng.integers(0, len(pages), args.k) for _ in range(args.queries)]
+    print(f"Korpus: {len(pages)} stron, {len(chunks)} fragmentów, "
+          f"{sum(len(doc.page_content.encode('utf-8')) for doc in chunks) / 1024:.0f} KB tekstu fragmentów.")
+
+    header = f"{'wariant':<32} {'dysk KB':>8} {'pamięć KB':>10} {'po zapytaniach KB':>18} {'odczyt top-' + str(args.k) + ' ms':>15}"
+    rows = []
+    with tempfile.TemporaryDirectory() as path:
+        rows.extend(chunk_variants(chunks, chunk_queries, path))
+        rows.extend(page_variants(pages, page_queries, path))
+    print(header)
+    print("-" * len(header))
+    for label, disk, loaded, used, latency in rows:
+        print(f"{label:<32} {disk / 1024:>8.0f} {loaded / 1024:>10.0f} {used / 1024:>18.0f} {latency:>15.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# Testy kontroli dopuszczania zapytań (app/admission.py)
+import threading
+import time
+
+import pytest
+
+from app.admission import AdmissionController, AdmissionRejected
+
+TIERS = {
+    "premium": {"weight": 8, "max_concurrency": 1, "max_queue": 10},
+    "free": {"weight": 1, "max_concurrency": 1, "max_queue": 10},
+}
+
+
+def wait_for_queue(controller, size):
+    # Czekamy, aż wszystkie wątki ustawią się w kolejkach.
+    deadline = time.monotonic() + 5
+    while sum(len(queue) for queue in controller.waiting.values()) < size:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def admit_and_leave(controller, tier):
+    with controller.admit(tier, timeout=5):
+        pass
+
+
+# Test 1: przy jednym wolnym miejscu plan o większej wadze wchodzi pierwszy
+def test_wfq_kolejnosc_wedlug_wagi():
+    controller = AdmissionController(TIERS, max_concurrency=1)
+    order = []
+
+    def request(tier):
+        with controller.admit(tier, timeout=5):
+            order.append(tier)
+
+    with controller.admit("free"):
+        threads = []
+        for tier in ["free", "free", "premium", "premium"]:
+            thread = threading.Thread(target=request, args=(tier,))
+            thread.start()
+            threads.append(thread)
+            # Kolejność wejścia do kolejki nie może zależeć od szeregowania wątków.
+            wait_for_queue(controller, len(threads))
+    for thread in threads:
+        thread.join()
+
+    # Znaczniki premium (1/8, 2/8) są mniejsze niż znaczniki free (1, 2).
+    assert order == ["premium", "premium", "free", "free"]
+    assert controller.active == {"premium": 0, "free": 0}
+
+
+# Test 2: pełna kolejka planu kończy się odpowiedzią 429
+def test_pelna_kolejka_odrzuca_z_429():
+    tiers = {"free": {"weight": 1, "max_concurrency": 1, "max_queue": 1}}
+    controller = AdmissionController(tiers, max_concurrency=1)
+    with controller.admit("free"):
+        waiting = threading.Thread(target=admit_and_leave, args=(controller, "free"))
+        waiting.start()
+        wait_for_queue(controller, 1)
+        with pytest.raises(AdmissionRejected) as error:
+            with controller.admit("free"):
+                pass
+        assert error.value.status_code == 429
+    waiting.join()
+    assert controller.active["free"] == 0
+
+
+# Test 3: zbyt długie oczekiwanie to 503, a zapytanie znika z kolejki
+def test_przekroczony_czas_oczekiwania_503():
+    controller = AdmissionController(TIERS, max_concurrency=1)
+    with controller.admit("premium"):
+        with pytest.raises(AdmissionRejected) as error:
+            with controller.admit("free", timeout=0.05):
+                pass
+        assert error.value.status_code == 503
+        assert controller.waiting["free"] == []
+    # Po zwolnieniu miejsca kontroler znów przyjmuje zapytania od razu.
+    with controller.admit("free", timeout=0.05):
+        assert controller.active["free"] == 1
@@ -0,0 +1,63 @@
+# Testy rejestru kluczy API i limitów per klucz (app/api_keys.py)
+import sqlite3
+
+import pytest
+
+from app.api_keys import ApiKeyRegistry, QuotaExceeded, create_key
+
+
+def make_registry(tmp_path, **limits):
+    db_path = str(tmp_path / "keys.sqlite")
+    raw_key = create_key(db_path, "acme", **limits)
+    return ApiKeyRegistry(db_path), raw_key
+
+
+# Test 1: poprawny klucz daje rekord klienta, zły albo pusty – None
+def test_uwierzytelnianie(tmp_path):
+    registry, raw_key = make_registry(tmp_path, tier="premium")
+    record = registry.authenticate(raw_key)
+    assert record.tenant == "acme"
+    assert record.tier == "premium"
+    assert registry.authenticate(raw_key + "x") is None
+    assert registry.authenticate("") is None
+
+
+# Test 2: limit równoległych zapytań i zwalnianie miejsc
+def test_limit_rownoleglosci(tmp_path):
+    registry, raw_key = make_registry(tmp_path, rate_per_s=1000, burst=100, max_concurrency=2)
+    record = registry.authenticate(raw_key)
+    record.acquire()
+    record.acquire()
+    with pytest.raises(QuotaExceeded):
+        record.acquire()
+    # Odrzucone zapytanie nie zajmuje miejsca.
+    assert record.in_flight == 2
+    record.release()
+    record.acquire()
+    assert record.in_flight == 2
+
+
+# Test 3: wiadro z tokenami ogranicza liczbę zapytań mimo zwalniania miejsc
+def test_limit_zapytan_na_sekunde(tmp_path):
+    registry, raw_key = make_registry(tmp_path, rate_per_s=0.001, burst=2, max_concurrency=10)
+    record = registry.authenticate(raw_key)
+    for _ in range(2):
+        record.acquire()
+        record.release()
+    with pytest.raises(QuotaExceeded):
+        record.acquire()
+    assert record.in_flight == 0
+
+
+# Test 4: odświeżenie zachowuje stan limitów i usuwa unieważnione klucze
+def test_odswiezenie_rejestru(tmp_path):
+    registry, raw_key = make_registry(tmp_path, max_concurrency=2)
+    record = registry.authenticate(raw_key)
+    record.acquire()
+    registry.refresh()
+    assert registry.authenticate(raw_key) is record
+    assert record.in_flight == 1
+    with sqlite3.connect(registry.db_path) as db:
+        db.execute("UPDATE api_keys SET active = 0")
+    registry.refresh()
+    assert registry.authenticate(raw_key) is None
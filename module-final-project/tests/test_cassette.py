@@ -0,0 +1,100 @@
+# Testy kasety LLM (app/cassette.py): nagranie i odtworzenie odpowiedzi, strumienia i embeddingów
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+import time
+
+import pytest
+
+from app.cassette import Cassette, CassetteChatModel, CassetteEmbeddings, CassetteMiss
+
+CHUNKS = ["Prawo ", "do ", "usunięcia ", "danych."]
+DELAY = 0.05
+
+
+class SlowChatModel(BaseChatModel):
+    """Model testowy: odpowiada po chwili i strumieniuje fragmenty z opóźnieniem."""
+
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "slow-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        time.sleep(DELAY)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(CHUNKS)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        for text in CHUNKS:
+            time.sleep(DELAY)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+
+def record(path):
+    cassette = Cassette(str(path), mode="record")
+    inner = SlowChatModel()
+    llm = CassetteChatModel(inner=inner, cassette=cassette)
+    answer = llm.invoke("Czym jest prawo do bycia zapomnianym?").content
+    streamed = [chunk.content for chunk in llm.stream("Czym jest prawo do bycia zapomnianym?")]
+    return inner, answer, streamed
+
+
+def replay(path, timing):
+    inner = SlowChatModel()
+    return inner, CassetteChatModel(inner=inner, cassette=Cassette(str(path), mode="replay", timing=timing))
+
+
+# Test 1: odpowiedź i fragmenty strumienia wracają z kasety bez wołania modelu
+def test_nagranie_i_odtworzenie(tmp_path):
+    path = tmp_path / "kaseta.jsonl.gz"
+    inner, answer, streamed = record(path)
+    assert inner.calls == 2
+    assert streamed == CHUNKS
+
+    inner, llm = replay(path, "instant")
+    assert llm.invoke("Czym jest prawo do bycia zapomnianym?").content == answer
+    assert [chunk.content for chunk in llm.stream("Czym jest prawo do bycia zapomnianym?")] == CHUNKS
+    assert inner.calls == 0
+
+
+# Test 2: tryb `instant` pomija opóźnienia, tryb `recorded` je odtwarza
+def test_odtwarzanie_czasow(tmp_path):
+    path = tmp_path / "kaseta.jsonl.gz"
+    record(path)
+
+    _, llm = replay(path, "instant")
+    start = time.perf_counter()
+    list(llm.stream("Czym jest prawo do bycia zapomnianym?"))
+    assert time.perf_counter() - start < DELAY
+
+    _, llm = replay(path, "recorded")
+    start = time.perf_counter()
+    offsets = []
+    for _ in llm.stream("Czym jest prawo do bycia zapomnianym?"):
+        offsets.append(time.perf_counter() - start)
+    # Kolejne fragmenty przychodzą w nagranych odstępach, nie wszystkie naraz.
+    for i, offset in enumerate(offsets, start=1):
+        assert offset >= i * DELAY * 0.9
+    assert offsets[-1] - offsets[0] >= (len(CHUNKS) - 1) * DELAY * 0.9
+
+
+# Test 3: embeddingi wracają z kasety, a nieznane wywołanie zgłasza CassetteMiss
+def test_embeddingi_i_brak_nagrania(tmp_path):
+    path = tmp_path / "kaseta.jsonl.gz"
+    embeddings = CassetteEmbeddings(DeterministicFakeEmbedding(size=8), Cassette(str(path), mode="record"))
+    vectors = embeddings.embed_documents(["RODO", "art. 17"])
+    query = embeddings.embed_query("prawo do usunięcia")
+
+    replayed = CassetteEmbeddings(DeterministicFakeEmbedding(size=8), Cassette(str(path), mode="replay"))
+    assert replayed.embed_documents(["RODO", "art. 17"]) == vectors
+    assert replayed.embed_query("prawo do usunięcia") == query
+    with pytest.raises(CassetteMiss):
+        replayed.embed_query("inne pytanie")
+
+    _, llm = replay(path, "instant")
+    with pytest.raises(CassetteMiss):
+        llm.invoke("Pytanie spoza kasety")
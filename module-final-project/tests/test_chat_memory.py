@@ -0,0 +1,96 @@
+# Testy pamięci rozmów /chat (app/chat_memory.py): LRU z dyskiem, przypinanie, wygasanie i podsumowania
+import sqlite3
+import time
+
+from app.chat_memory import KEEP_RECENT_MESSAGES, ChatSession, SessionStore, compact_session
+
+
+def store(tmp_path, **kwargs):
+    return SessionStore(db_path=str(tmp_path / "sessions.sqlite"), **kwargs)
+
+
+def say(sessions, session_id, text, owner=None):
+    session = sessions.get(session_id, owner)
+    session.add("user", text)
+    sessions.release(session)
+    return session
+
+
+# Test 1: najdawniej używana sesja trafia na dysk i wraca z niego z pełną historią
+def test_wypieranie_na_dysk(tmp_path):
+    sessions = store(tmp_path, max_in_memory=2)
+    first = say(sessions, "a", "Czym jest RODO?")
+    say(sessions, "b", "Co to jest art. 17?")
+    say(sessions, "c", "Kto jest administratorem?")
+    assert len(sessions) == 2
+
+    restored = sessions.get("a")
+    assert restored is not first
+    assert restored.messages == [("user", "Czym jest RODO?")]
+    sessions.release(restored)
+    assert len(sessions) == 2
+
+
+# Test 2: przypiętej sesji nie wypieramy, więc kolejne zapytanie dostaje ten sam obiekt
+def test_przypinanie(tmp_path):
+    sessions = store(tmp_path, max_in_memory=1)
+    pinned = sessions.get("a")
+    say(sessions, "b", "Pytanie w innej sesji")
+    assert len(sessions) == 1
+
+    pinned.add("user", "Odpowiedź jeszcze się generuje")
+    again = sessions.get("a")
+    assert again is pinned and pinned.pins == 2
+    sessions.release(again)
+    sessions.release(pinned)
+    assert pinned.pins == 0
+
+
+# Test 3: sesja nieużywana dłużej niż TTL jest usuwana z pamięci i z dysku
+def test_wygasanie(tmp_path):
+    sessions = store(tmp_path, max_in_memory=10, ttl_s=60, prune_interval_s=0)
+    old = say(sessions, "stara", "Dawne pytanie")
+    say(sessions, "nowa", "Świeże pytanie")
+    old.updated_at = time.time() - 120
+    sessions.flush()
+
+    fresh = sessions.get("stara")
+    assert fresh is not old and fresh.messages == []
+    sessions.release(fresh)
+    with sqlite3.connect(str(tmp_path / "sessions.sqlite")) as db:
+        assert [row[0] for row in db.execute("SELECT id FROM sessions")] == ["nowa"]
+
+
+# Test 4: ten sam identyfikator sesji u dwóch klientów to dwie osobne rozmowy
+def test_sesje_per_wlasciciel(tmp_path):
+    sessions = store(tmp_path, max_in_memory=1)
+    say(sessions, "rozmowa", "Pytanie klienta A", owner="klucz-a")
+    say(sessions, "rozmowa", "Pytanie klienta B", owner="klucz-b")
+    session = sessions.get("rozmowa", owner="klucz-a")
+    assert session.messages == [("user", "Pytanie klienta A")]
+    assert session.key == "klucz-a:rozmowa"
+    sessions.release(session)
+
+
+# Test 5: długa historia jest zwijana do podsumowania, a ostatnie wiadomości zostają dosłownie
+def test_compact_session():
+    session = ChatSession("s")
+    for i in range(10):
+        session.add("user" if i % 2 == 0 else "assistant", f"Wiadomość {i} o artykule {i} RODO " * 5)
+    prompts = []
+
+    def summarize(prompt):
+        prompts.append(prompt)
+        return "  Rozmowa dotyczyła artykułów 0-5.  "
+
+    assert not compact_session(session, summarize, threshold=10_000)
+    assert compact_session(session, summarize, threshold=50)
+    assert session.summary == "Rozmowa dotyczyła artykułów 0-5."
+    assert len(session.messages) == KEEP_RECENT_MESSAGES
+    assert session.messages[-1][1].startswith("Wiadomość 9")
+    assert "Wiadomość 0" in prompts[0] and "Wiadomość 9" not in prompts[0]
+    assert "Podsumowanie wcześniejszej rozmowy: Rozmowa dotyczyła" in session.history_text()
+
+    # Za mało wiadomości do zwinięcia – podsumowanie nie jest generowane ponownie.
+    assert not compact_session(session, summarize, threshold=0)
+    assert len(prompts) == 1
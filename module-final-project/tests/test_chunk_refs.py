@@ -0,0 +1,84 @@
+# Testy odwołań do fragmentów (app/chunk_refs.py) i endpointu /chunks/{id}
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+import pytest
+
+import app.main as main
+from app.chunk_refs import ChunkCache, chunk_etag, etag_matches
+from app.sharding import chunk_id, chunk_ids
+
+DOC = Document(page_content="Art. 17. Prawo do usunięcia danych", metadata={"source": "data/rodo_pl.pdf", "page": 44})
+
+
+class FakePipeline:
+    """Potok, który zna tylko fragmenty z pamięci `ChunkCache` i liczy odwołania do bazy."""
+
+    def __init__(self, docs):
+        self.chunk_cache = ChunkCache()
+        for doc in docs:
+            self.chunk_cache.put(doc)
+        self.lookups = 0
+
+    def chunk(self, key):
+        self.lookups += 1
+        return self.chunk_cache.get(key)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "qa_chain", FakePipeline([DOC]))
+    return TestClient(main.app)
+
+
+# Test 1: ETag to identyfikator w cudzysłowie, dopasowywany także w postaci słabej i przez *
+def test_etag_matches():
+    etag = chunk_etag("abc")
+    assert etag == '"abc"'
+    assert etag_matches('"abc"', etag)
+    assert etag_matches('"xyz", W/"abc"', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"xyz"', etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches("", etag)
+
+
+# Test 2: identyfikator fragmentu zależy od treści, źródła i strony
+def test_identyfikator_z_tresci():
+    cache = ChunkCache()
+    key = cache.put(DOC)
+    assert key == chunk_id(DOC)
+    other_page = Document(page_content=DOC.page_content, metadata={**DOC.metadata, "page": 45})
+    assert cache.put(other_page) != key
+    references = cache.references([DOC], {key: 0.8})
+    assert references == [{"id": key, "page": 44, "source": "data/rodo_pl.pdf", "score": 0.8}]
+
+
+# Test 3: istniejący fragment – treść z silnym ETag, a przy zgodnym If-None-Match 304
+def test_chunks_200_i_304(client):
+    key = chunk_id(DOC)
+    response = client.get(f"/chunks/{key}")
+    assert response.status_code == 200
+    assert response.json()["page_content"] == DOC.page_content
+    assert response.headers["etag"] == chunk_etag(key)
+    assert "immutable" in response.headers["cache-control"]
+
+    cached = client.get(f"/chunks/{key}", headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == chunk_etag(key)
+
+
+# Test 4: nieznany fragment to 404 także wtedy, gdy klient wysłał pasujący If-None-Match
+def test_chunks_404_przed_304(client):
+    for headers in ({}, {"If-None-Match": chunk_etag("nieistnieje")}, {"If-None-Match": "*"}):
+        response = client.get("/chunks/nieistnieje", headers=headers)
+        assert response.status_code == 404
+        assert "etag" not in response.headers
+    assert main.qa_chain.lookups == 3
+
+
+# Test 5: powtórzone fragmenty dostają unikalne identyfikatory zamiast znikać z indeksu
+def test_chunk_ids_bez_pomijania_duplikatow():
+    other = Document(page_content="Art. 18", metadata=DOC.metadata)
+    ids = chunk_ids([DOC, other, DOC, DOC])
+    assert ids == [chunk_id(DOC), chunk_id(other), f"{chunk_id(DOC)}-2", f"{chunk_id(DOC)}-3"]
+    assert len(set(ids)) == 4
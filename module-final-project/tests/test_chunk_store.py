@@ -0,0 +1,70 @@
+# Testy kolumnowego magazynu fragmentów (app/chunk_store.py): zapis, odczyt i lekkie widoki
+from langchain_core.documents import Document
+
+import numpy as np
+
+from app.chunk_store import ChunkStore, ChunkView
+from app.text_blocks import CompressedText
+
+IDS = ["a1", "b2", "ć3", "d4"]
+TEXTS = ["Art. 17 – prawo do usunięcia danych", "Motyw 26 – dane zanonimizowane", "", "Art. 4 pkt 1 – „dane osobowe”"]
+METADATAS = [
+    {"source": "data/rodo_pl.pdf", "page": 12, "parent_id": "rodo_pl.pdf:12"},
+    {"source": "data/rodo_pl.pdf", "page": 3},
+    {"page": "iii", "author": "UE"},          # strona jako tekst nie trafia do kolumny liczb
+    {"source": "data/motywy.pdf", "page": True, "total_pages": 88},
+]
+
+
+def filled():
+    store = ChunkStore()
+    store.extend(IDS[:2], TEXTS[:2], METADATAS[:2])
+    store.extend(IDS[2:], TEXTS[2:], METADATAS[2:])
+    return store
+
+
+# Test 1: zapis i odczyt zachowują teksty, identyfikatory i metadane z ich typami
+def test_zapis_i_odczyt(tmp_path):
+    store = filled()
+    store.save(str(tmp_path))
+    loaded = ChunkStore.load(str(tmp_path))
+
+    assert len(loaded) == len(IDS)
+    assert list(loaded.ids()) == IDS
+    assert list(loaded.texts()) == TEXTS
+    assert list(loaded.metadatas()) == METADATAS
+    assert type(loaded.metadata(3)["page"]) is bool
+    assert loaded.sources == ["data/rodo_pl.pdf", "data/motywy.pdf"]
+    assert loaded.find(["ć3", "brak", "a1"]) == [2, 0]
+
+
+# Test 2: kolumny po wczytaniu są mapowane z pliku, a tekst pozostaje skompresowany
+def test_wczytanie_przez_mmap(tmp_path):
+    filled().save(str(tmp_path))
+    loaded = ChunkStore.load(str(tmp_path))
+    assert isinstance(loaded.pages, np.memmap)
+    assert isinstance(loaded._text, CompressedText)
+    assert loaded._text.cached_nbytes() == 0
+
+    # Dopisanie do wczytanego magazynu robi kopie kolumn w pamięci i nie rusza plików.
+    loaded.extend(["e5"], ["Nowy fragment"], [{"source": "data/rodo_pl.pdf", "page": 1}])
+    assert list(loaded.texts())[-2:] == [TEXTS[-1], "Nowy fragment"]
+    assert len(ChunkStore.load(str(tmp_path))) == len(IDS)
+
+
+# Test 3: widok fragmentu czyta kolumny dopiero przy dostępie do pól
+def test_leniwy_widok(tmp_path):
+    filled().save(str(tmp_path))
+    loaded = ChunkStore.load(str(tmp_path))
+    view = loaded[0]
+    assert isinstance(view, ChunkView)
+    assert loaded._text.misses == 0
+
+    assert view.page == 12 and view.source == "data/rodo_pl.pdf" and view.id == "a1"
+    assert loaded._text.misses == 0
+    assert view.page_content == TEXTS[0]
+    assert loaded._text.misses == 1
+    assert loaded[2].page is None and loaded[2].source is None
+
+    assert view.to_document() == Document(page_content=TEXTS[0], metadata=METADATAS[0], id="a1")
+    assert loaded.document(1).metadata == METADATAS[1]
@@ -0,0 +1,68 @@
+# Testy deduplikacji fragmentów przy ingestii (app/dedup.py): MinHash, LSH i mapa kanonicznych
+from langchain_core.documents import Document
+
+import pytest
+
+from app.dedup import MinHasher, deduplicate, jaccard, lsh_params, shingles
+
+WORDS = [f"słowo{i}" for i in range(120)]
+BASE = " ".join(WORDS)
+
+
+def chunk(text, source="data/rodo_pl.pdf", page=0):
+    return Document(page_content=text, metadata={"source": source, "page": page})
+
+
+def variant(changed):
+    """Tekst bazowy z `changed` podmienionymi słowami (rozrzuconymi po całym tekście)."""
+    words = list(WORDS)
+    for i in range(changed):
+        words[i * len(words) // changed] = f"inne{i}"
+    return " ".join(words)
+
+
+# Test 1: parametry LSH odpowiadają progowi i dzielą całą sygnaturę
+@pytest.mark.parametrize("threshold", [0.5, 0.8, 0.9])
+def test_lsh_params(threshold):
+    bands, rows = lsh_params(threshold)
+    assert bands * rows == 128
+    assert abs((1 / bands) ** (1 / rows) - threshold) < 0.1
+
+
+# Test 2: podobieństwo sygnatur MinHash przybliża współczynnik Jaccarda
+def test_minhash_przybliza_jaccarda():
+    hasher = MinHasher()
+    a, b = shingles(BASE), shingles(variant(3))
+    estimate = (hasher.signature(a) == hasher.signature(b)).mean()
+    assert abs(estimate - jaccard(a, b)) < 0.1
+
+
+# Test 3: próg decyduje, czy prawie identyczny fragment jest duplikatem
+def test_prog_podobienstwa():
+    similar = variant(1)
+    similarity = jaccard(shingles(BASE), shingles(similar))
+    assert 0.8 < similarity < 1.0
+
+    unique, canonical_map, _ = deduplicate([chunk(BASE), chunk(similar, page=1)], threshold=similarity - 0.05)
+    assert canonical_map == {1: 0} and len(unique) == 1
+    unique, canonical_map, _ = deduplicate([chunk(BASE), chunk(similar, page=1)], threshold=min(0.99, similarity + 0.02))
+    assert canonical_map == {} and len(unique) == 2
+
+    # Fragment z wieloma zmianami nie jest duplikatem przy domyślnym progu.
+    _, canonical_map, _ = deduplicate([chunk(BASE), chunk(variant(12), page=1)], threshold=0.9)
+    assert canonical_map == {}
+
+
+# Test 4: duplikaty wskazują pierwszy fragment grupy, a ten zna strony wszystkich duplikatów
+def test_mapa_kanonicznych_i_metadane():
+    chunks = [chunk(BASE, page=3), chunk("Zupełnie inny tekst o prawie do sprostowania danych."),
+              chunk(BASE, source="data/motywy.pdf", page=7), chunk(BASE.upper() + "!", page=9)]
+    unique, canonical_map, report = deduplicate(chunks, threshold=0.9)
+
+    assert canonical_map == {2: 0, 3: 0}
+    assert unique == [chunks[0], chunks[1]]
+    assert chunks[0].metadata["duplicates"] == 2
+    assert chunks[0].metadata["duplicate_locations"] == "motywy.pdf:7,rodo_pl.pdf:9"
+    assert "duplicates" not in chunks[1].metadata
+    assert report["chunks"] == 4 and report["unique"] == 2 and report["duplicates"] == 2
+    assert report["saved_chars"] == len(chunks[2].page_content) + len(chunks[3].page_content)
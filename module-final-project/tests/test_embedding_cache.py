@@ -0,0 +1,79 @@
+# Testy trwałego cache'u embeddingów (app/embedding_cache.py)
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import numpy as np
+
+from app.embedding_cache import CachedEmbeddings
+from app.ingest_data import split_documents
+
+PAGES = [Document(page_content=" ".join(f"Artykuł {page}.{i} określa prawa osoby, której dane dotyczą." for i in range(12)),
+                  metadata={"source": "data/rodo_pl.pdf", "page": page}) for page in range(4)]
+
+
+class RecordingEmbeddings(DeterministicFakeEmbedding):
+    """Embeddingi testowe, które zapamiętują teksty wysłane do modelu."""
+
+    sent: list = []
+
+    def embed_documents(self, texts):
+        self.sent = self.sent + list(texts)
+        return super().embed_documents(texts)
+
+
+def texts(chunks):
+    return [chunk.page_content for chunk in chunks]
+
+
+# Test 1: druga konfiguracja splittera embeduje tylko fragmenty, których jeszcze nie było
+def test_druga_konfiguracja_embeduje_tylko_nowe_fragmenty(tmp_path):
+    inner = RecordingEmbeddings(size=8)
+    embeddings = CachedEmbeddings(inner, path=str(tmp_path / "cache.sqlite"))
+
+    first = texts(split_documents(PAGES, 200, 0))
+    embeddings.embed_documents(first)
+    assert sorted(inner.sent) == sorted(set(first))
+
+    # Zmieniona treść jednej strony – niezmienione fragmenty pochodzą z cache'u.
+    changed = [PAGES[0].model_copy(update={"page_content": PAGES[0].page_content.replace("prawa", "obowiązki")}),
+               *PAGES[1:]]
+    second = texts(split_documents(changed, 200, 0))
+    inner.sent = []
+    vectors = embeddings.embed_documents(second)
+    new_texts = set(second) - set(first)
+    assert new_texts and len(new_texts) < len(set(second))
+    assert sorted(inner.sent) == sorted(new_texts)
+    np.testing.assert_allclose(vectors, DeterministicFakeEmbedding(size=8).embed_documents(second), rtol=1e-6)
+    assert embeddings.stats() == {"hits": len(first) - len(set(first)) + len(second) - len(new_texts),
+                                  "misses": len(set(first)) + len(new_texts)}
+
+
+# Test 2: cache przetrwa restart procesu, a pamięć podręczna ma ograniczony rozmiar
+def test_trwalosc_i_limit_pamieci(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    chunks = texts(split_documents(PAGES, 200, 0))
+    CachedEmbeddings(RecordingEmbeddings(size=8), path=path).embed_documents(chunks)
+
+    inner = RecordingEmbeddings(size=8)
+    embeddings = CachedEmbeddings(inner, path=path, memory_items=3)
+    first = embeddings.embed_documents(chunks)
+    assert inner.sent == []
+    assert len(embeddings._memory) == 3
+    # Wektory usunięte z pamięci są ponownie czytane z SQLite, bez wywołania modelu.
+    assert embeddings.embed_documents(chunks) == first
+    assert inner.sent == []
+
+    embeddings.clear_memory()
+    assert len(embeddings._memory) == 0
+    assert embeddings.embed_documents(chunks[:2]) == first[:2]
+
+
+# Test 3: liczniki trafień i chybień są spójne przy wywołaniach z wielu wątków
+def test_liczniki_wielowatkowo(tmp_path):
+    embeddings = CachedEmbeddings(DeterministicFakeEmbedding(size=8), path=str(tmp_path / "cache.sqlite"), memory_items=4)
+    queries = [f"pytanie {i % 10}" for i in range(400)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(embeddings.embed_query, queries))
+    stats = embeddings.stats()
+    assert stats["hits"] + stats["misses"] == len(queries)
+    assert stats["misses"] >= 10
@@ -0,0 +1,153 @@
+# Testy filtrów metadanych (app/filters.py): walidacja, warunki Chroma i bitsety
+import uuid
+
+import chromadb
+import pytest
+
+from app.filters import InvalidFilter, MetadataBitsets, to_chroma_where, validate
+
+FIELDS = ["source", "page"]
+
+# Metadane jak z PyPDFLoader: numer strony jako liczba, źródło jako tekst.
+METADATAS = [{"source": f"data/{'a' if page % 2 else 'b'}.pdf", "page": page} for page in range(20)]
+
+
+# Test 1: poprawne filtry przechodzą walidację
+@pytest.mark.parametrize("filters", [
+    {"page": 3},
+    {"page": [3, 4]},
+    {"page": {"$gte": 10, "$lte": "20"}},
+    {"source": "data/a.pdf", "page": {"$in": [1, 3]}},
+    {"$or": [{"page": 3}, {"$and": [{"page": {"$gt": 15}}, {"source": "data/b.pdf"}]}]},
+])
+def test_validate_poprawne_filtry(filters):
+    validate(filters, FIELDS)
+
+
+# Test 2: błędy są wykrywane także w zagnieżdżonych filtrach
+@pytest.mark.parametrize("filters", [
+    [{"page": 3}],
+    {"chapter": 3},
+    {"page": {}},
+    {"page": {"$regex": "3"}},
+    {"page": {"$in": 3}},
+    {"page": {"$in": []}},
+    {"page": []},
+    {"page": {"$gt": "trzy"}},
+    {"$or": []},
+    {"$and": [{"page": 3}, {"chapter": 1}]},
+    {"$or": [{"page": {"$lt": None}}]},
+])
+def test_validate_bledne_filtry(filters):
+    with pytest.raises(InvalidFilter):
+        validate(filters, FIELDS)
+
+
+# Test 3: tłumaczenie na warunek `where` bazy Chroma
+def test_to_chroma_where():
+    assert to_chroma_where({}, FIELDS) is None
+    assert to_chroma_where({"source": "data/a.pdf"}, FIELDS) == {"source": {"$in": ["data/a.pdf"]}}
+    # Granice zakresu zawsze jako liczby; kilka warunków to $and.
+    assert to_chroma_where({"page": {"$gte": "10", "$lt": 20}}, FIELDS) == {
+        "$and": [{"page": {"$gte": 10.0}}, {"page": {"$lt": 20.0}}]}
+    # Jeden podfiltr w $or nie tworzy jednoelementowej listy (Chroma jej nie przyjmuje).
+    assert to_chroma_where({"$or": [{"source": "data/a.pdf"}]}, FIELDS) == {"source": {"$in": ["data/a.pdf"]}}
+    with pytest.raises(InvalidFilter):
+        to_chroma_where({"chapter": 1}, FIELDS)
+
+
+# Test 4: ta sama wartość jako tekst i liczba (Chroma porównuje typy, bitsety – tekst)
+def test_to_chroma_where_wartosci_obu_typow():
+    expected = {"$or": [{"page": {"$in": ["3"]}}, {"page": {"$in": [3]}}]}
+    assert to_chroma_where({"page": "3"}, FIELDS) == expected
+    assert to_chroma_where({"page": 3}, FIELDS) == expected
+    assert to_chroma_where({"page": [3, "x"]}, FIELDS) == {
+        "$or": [{"page": {"$in": ["3", "x"]}}, {"page": {"$in": [3]}}]}
+
+
+@pytest.fixture(scope="module")
+def chroma_collection():
+    collection = chromadb.EphemeralClient().create_collection(f"filters-{uuid.uuid4().hex}")
+    collection.add(ids=[str(i) for i in range(len(METADATAS))], documents=["fragment"] * len(METADATAS),
+                   metadatas=METADATAS, embeddings=[[1.0, 0.0]] * len(METADATAS))
+    return collection
+
+
+# Test 5: maska bitsetów wybiera te same fragmenty co Chroma z przetłumaczonym filtrem
+@pytest.mark.parametrize("filters", [
+    {"page": 3},
+    {"page": "3"},
+    {"page": [3, "4", 99]},
+    {"page": {"$in": ["5", 6]}},
+    {"page": {"$gte": "10", "$lte": 12}},
+    {"page": {"$gt": 17.5}},
+    {"source": "data/a.pdf", "page": {"$lt": 6}},
+    {"$or": [{"page": "0"}, {"$and": [{"source": "data/b.pdf"}, {"page": {"$gte": 16}}]}]},
+])
+def test_maska_zgodna_z_chroma(filters, chroma_collection):
+    bitsets = MetadataBitsets.build(METADATAS, FIELDS)
+    local = [i for i, selected in enumerate(bitsets.mask(filters)) if selected]
+    chroma = sorted(int(i) for i in chroma_collection.get(where=to_chroma_where(filters, FIELDS))["ids"])
+    assert local == chroma
+    assert local
+
+
+# Test 6: pusty filtr przepuszcza wszystko, a nieznana wartość nic
+def test_maska_brzegowe_przypadki():
+    bitsets = MetadataBitsets.build(METADATAS, FIELDS)
+    assert bitsets.mask({}).all()
+    assert not bitsets.mask({"source": "data/c.pdf"}).any()
+    assert len(bitsets.mask({})) == len(METADATAS)
+
+
+def write_pdf(path, pages):
+    # Minimalny PDF z jedną linią tekstu na stronę (bez zależności od generatorów PDF).
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>",
+               f"<< /Type /Pages /Kids [{' '.join(f'{4 + 2 * i} 0 R' for i in range(len(pages)))}] /Count {len(pages)} >>",
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {5 + 2 * i} 0 R "
+                       f"/Resources << /Font << /F1 3 0 R >> >> >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    body, offsets = b"%PDF-1.4\n", []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(body)
+    body += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    body += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode("latin-1")
+    body += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    path.write_bytes(body)
+
+
+# Test 7: filtr po źródle działa na metadanych z prawdziwej ingestii PDF
+def test_filtr_po_zrodle_z_ingestii(tmp_path, monkeypatch):
+    import app.ingest_data as ingest_data
+
+    monkeypatch.setattr(ingest_data, "PROJECT_DIR", str(tmp_path))
+    (tmp_path / "app").mkdir()
+    (tmp_path / "data").mkdir()
+    write_pdf(tmp_path / "data" / "rodo_pl.pdf", ["Art. 1", "Art. 2"])
+    write_pdf(tmp_path / "data" / "wytyczne.pdf", ["Wytyczne"])
+    # Ścieżka budowana jak PDF_PATH: bezwzględna, z "..".
+    documents = []
+    for name in ("rodo_pl.pdf", "wytyczne.pdf"):
+        path = str(tmp_path / "app" / ".." / "data" / name)
+        documents += ingest_data.load_documents(path)
+    chunks = ingest_data.split_documents(documents)
+    assert {chunk.metadata["source"] for chunk in chunks} == {"data/rodo_pl.pdf", "data/wytyczne.pdf"}
+
+    bitsets = MetadataBitsets.build([chunk.metadata for chunk in chunks], FIELDS)
+    selected = [chunk.page_content for chunk, keep in zip(chunks, bitsets.mask({"source": "data/rodo_pl.pdf"})) if keep]
+    assert selected == ["Art. 1", "Art. 2"]
+    assert to_chroma_where({"source": "data/rodo_pl.pdf", "page": 1}, FIELDS) == {
+        "$and": [{"source": {"$in": ["data/rodo_pl.pdf"]}}, {"$or": [{"page": {"$in": ["1"]}}, {"page": {"$in": [1]}}]}]}
+
+
+# Test 8: pliki spoza folderu projektu są opisywane samą nazwą pliku
+def test_source_name_poza_projektem(tmp_path):
+    from app.ingest_data import source_name
+
+    assert source_name(str(tmp_path / "data" / "a.pdf"), root=str(tmp_path)) == "data/a.pdf"
+    assert source_name("/inny/katalog/b.pdf", root=str(tmp_path)) == "b.pdf"
@@ -0,0 +1,82 @@
+# Testy indeksu HNSW (app/hnsw.py): recall względem wyszukiwania dokładnego
+import numpy as np
+
+from app.hnsw import HNSWIndex
+
+K = 10
+
+
+def normalized(rows):
+    return (rows / np.linalg.norm(rows, axis=1, keepdims=True)).astype(np.float32)
+
+
+def clustered_vectors(count=1500, dim=32, clusters=15, seed=0):
+    # Skupiska, jak w embeddingach tekstu – na nich rozspójniony graf traci recall.
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    points = centers[rng.integers(clusters, size=count)] + 0.3 * rng.normal(size=(count, dim))
+    return normalized(points)
+
+
+def brute_force(vectors, query, k, allowed=None):
+    scores = vectors @ query
+    if allowed is not None:
+        scores = np.where(allowed, scores, -np.inf)
+    return np.argsort(-scores)[:k]
+
+
+def recall(index, vectors, queries, allowed=None):
+    hits = 0
+    for query in queries:
+        found, _ = index.search(query, K, allowed=allowed)
+        hits += len(set(found.tolist()) & set(brute_force(vectors, query, K, allowed).tolist()))
+    return hits / (K * len(queries))
+
+
+VECTORS = clustered_vectors()
+QUERIES = normalized(np.random.default_rng(1).normal(size=(50, 32)) + VECTORS[:50])
+INDEX = HNSWIndex(32, m=16, ef_construction=100, ef_search=64)
+INDEX.add(VECTORS)
+
+
+# Test 1: recall@10 przybliżonego wyszukiwania względem wyszukiwania dokładnego
+def test_recall_wzgledem_wyszukiwania_dokladnego():
+    assert recall(INDEX, VECTORS, QUERIES) >= 0.9
+
+
+# Test 2: szersze przeszukiwanie (ef_search) podnosi recall
+def test_recall_rosnie_z_ef():
+    recalls = []
+    try:
+        for ef in (16, 64, 256):
+            INDEX.ef_search = ef
+            recalls.append(recall(INDEX, VECTORS, QUERIES))
+    finally:
+        INDEX.ef_search = 64
+    assert recalls == sorted(recalls)
+    assert recalls[-1] >= 0.99
+
+
+# Test 3: podobieństwa zwracane przez indeks to podobieństwa kosinusowe
+def test_zwracane_podobienstwa():
+    found, scores = INDEX.search(QUERIES[0], K)
+    np.testing.assert_allclose(scores, VECTORS[found] @ QUERIES[0], atol=1e-5)
+    assert list(scores) == sorted(scores, reverse=True)
+
+
+# Test 4: maska `allowed` ogranicza wyniki bez dużej utraty recall
+def test_recall_z_maska():
+    allowed = np.zeros(len(VECTORS), dtype=bool)
+    allowed[::4] = True
+    found, _ = INDEX.search(QUERIES[0], K, allowed=allowed)
+    assert allowed[found].all()
+    assert recall(INDEX, VECTORS, QUERIES, allowed) >= 0.9
+
+
+# Test 5: graf wczytany z pliku daje te same wyniki
+def test_zapis_i_odczyt(tmp_path):
+    path = str(tmp_path / "hnsw.npz")
+    INDEX.save(path)
+    loaded = HNSWIndex.load(path, VECTORS)
+    for query in QUERIES[:10]:
+        assert loaded.search(query, K)[0].tolist() == INDEX.search(query, K)[0].tolist()
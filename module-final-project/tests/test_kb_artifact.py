@@ -0,0 +1,70 @@
+# Testy artefaktu bazy wiedzy (app/kb_artifact.py): ranking BM25 i wyszukiwanie hybrydowe
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import numpy as np
+import pytest
+
+from app.kb_artifact import KnowledgeBaseStore, write_artifact
+from app.retrieval import FusionRetriever
+
+TEXTS = [
+    "Administrator wyznacza inspektora ochrony danych.",
+    "Usunięcie danych na żądanie osoby, której dane dotyczą, to prawo do bycia zapomnianym.",
+    "Usunięcie danych następuje niezwłocznie. Usunięcie danych dotyczy także kopii. Usunięcie danych jest prawem.",
+    "Administracyjne kary pieniężne nakłada organ nadzorczy.",
+    "Dane osobowe przetwarza się zgodnie z prawem.",
+]
+METADATAS = [{"source": "data/rodo_pl.pdf", "page": page} for page in range(len(TEXTS))]
+
+
+@pytest.fixture
+def store(tmp_path):
+    embeddings = DeterministicFakeEmbedding(size=8)
+    path = str(tmp_path / "kb")
+    write_artifact(path, [f"c{i}" for i in range(len(TEXTS))], TEXTS, METADATAS,
+                   embeddings.embed_documents(TEXTS), "1")
+    return KnowledgeBaseStore.open(path, embeddings, verify=True)
+
+
+def pages(results):
+    return [doc.metadata["page"] for doc, _ in results]
+
+
+# Test 1: BM25 – częstszy term i rzadszy term podnoszą wynik, fragmenty bez termów nie trafiają do wyników
+def test_bm25_ranking(store):
+    results = store.lexical_search("usunięcie danych", k=5)
+    # Fragment 2 ma trzy wystąpienia "usunięcie", fragment 1 – jedno; "danych" (częste) waży mniej.
+    assert pages(results)[:2] == [2, 1]
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True) and all(score > 0 for score in scores)
+    assert 3 not in pages(results)
+    # Rzadki term (jeden fragment) wygrywa z termem występującym w wielu fragmentach.
+    assert pages(store.lexical_search("inspektora danych", k=1)) == [0]
+    assert store.lexical_search("nieistniejące słowo", k=3) == []
+
+
+# Test 2: filtr metadanych ogranicza też ranking BM25
+def test_bm25_z_filtrem(store):
+    assert pages(store.lexical_search("usunięcie danych", k=5, filters={"page": {"$lte": 1}})) == [1, 0]
+
+
+# Test 3: ranking BM25 z wektorami fragmentów do fuzji RRF
+def test_bm25_z_wektorami(store):
+    docs, vectors = store.lexical_search_with_vectors("kary pieniężne", k=2)
+    assert [doc.metadata["page"] for doc in docs] == [3]
+    assert vectors.shape == (1, 8)
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, atol=1e-5)
+    docs, vectors = store.lexical_search_with_vectors("nic", k=2)
+    assert docs == [] and vectors.shape == (0, 8)
+
+
+# Test 4: wyszukiwanie hybrydowe – fragment znaleziony tylko przez BM25 trafia do wyników
+def test_wyszukiwanie_hybrydowe(store):
+    question = "kary pieniężne"
+    vector_only = FusionRetriever(vector_store=store, embeddings=store.embeddings, k=1, fetch_k=1,
+                                  max_variants=1, hybrid=False)
+    hybrid = FusionRetriever(vector_store=store, embeddings=store.embeddings, k=2, fetch_k=1, max_variants=1)
+    vector_page = vector_only.invoke(question)[0].metadata["page"]
+    # Embeddingi testowe nie znają znaczenia tekstu, więc samo wyszukiwanie wektorowe chybia.
+    assert vector_page != 3
+    found = [doc.metadata["page"] for doc in hybrid.invoke(question)]
+    assert 3 in found and vector_page in found
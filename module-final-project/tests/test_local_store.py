@@ -0,0 +1,80 @@
+# Testy lokalnego magazynu wektorów (app/local_store.py): kwantyzacja, dokładne przeliczenie i zapis na dysk
+import numpy as np
+import pytest
+
+from app.local_store import LocalVectorStore
+
+DIM = 64
+COUNT = 3000
+
+
+def clustered(count, seed):
+    """Wektory skupione wokół kilkudziesięciu centrów – jak embeddingi fragmentów na podobne tematy."""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(50, DIM))
+    rng = np.random.default_rng(seed)
+    return centers[rng.integers(0, len(centers), count)] + 0.6 * rng.normal(size=(count, DIM))
+
+
+VECTORS = clustered(COUNT, seed=1)
+QUERIES = clustered(40, seed=2)
+METADATAS = [{"source": f"data/{'a' if i % 4 else 'b'}.pdf", "page": i % 50} for i in range(COUNT)]
+
+
+def build(quantization, rescore_factor=4):
+    store = LocalVectorStore(None, quantization=quantization, rescore_factor=rescore_factor, index="flat")
+    store.add_embeddings([f"Fragment {i}" for i in range(COUNT)], VECTORS, METADATAS, [f"id-{i}" for i in range(COUNT)])
+    return store
+
+
+EXACT = build("none")
+
+
+def recall(store, k=10, mask=None):
+    found = [set(store.search_indices(query, k, mask)[0]) for query in QUERIES]
+    expected = [set(EXACT.search_indices(query, k, mask)[0]) for query in QUERIES]
+    return np.mean([len(a & b) / max(1, len(b)) for a, b in zip(found, expected)])
+
+
+# Test 1: kwantyzacja zmniejsza indeks, a dokładne przeliczenie kandydatów zachowuje wyniki
+@pytest.mark.parametrize("quantization, rescore_factor, ratio, min_recall", [
+    ("int8", 4, 4, 0.99),
+    ("binary", 4, 32, 0.8),
+    ("binary", 10, 32, 0.99),
+])
+def test_kwantyzacja_i_recall(quantization, rescore_factor, ratio, min_recall):
+    store = build(quantization, rescore_factor)
+    assert store.index_nbytes() <= EXACT.index_nbytes() / ratio + 1024
+    assert recall(store) >= min_recall
+    # Zwracane podobieństwa są dokładne (float32), a nie przybliżone z kodów.
+    indices, scores = store.search_indices(QUERIES[0], 5)
+    np.testing.assert_allclose(scores, EXACT.vectors[indices] @ (QUERIES[0] / np.linalg.norm(QUERIES[0])), rtol=1e-5)
+
+
+# Test 2: filtr metadanych zawęża wyniki tak samo w każdym wariancie
+@pytest.mark.parametrize("quantization", ["none", "int8", "binary"])
+def test_filtr(quantization):
+    store = build(quantization, rescore_factor=10)
+    filters = {"source": "data/b.pdf", "page": {"$lt": 10}}
+    mask = store.filter_mask(filters)
+    assert mask.sum() == sum(1 for m in METADATAS if m["source"] == "data/b.pdf" and m["page"] < 10)
+    docs = store.similarity_search_by_vector(QUERIES[0], k=8, filter=filters)
+    assert len(docs) == 8
+    assert all(doc.metadata["source"] == "data/b.pdf" and doc.metadata["page"] < 10 for doc in docs)
+    assert recall(store, mask=mask) == 1.0
+
+
+# Test 3: zapis i odczyt – kody wracają z dysku, a wektory float32 są mapowane przez mmap
+@pytest.mark.parametrize("quantization", ["int8", "binary"])
+def test_zapis_i_odczyt(tmp_path, quantization):
+    store = build(quantization)
+    store.save(str(tmp_path))
+    loaded = LocalVectorStore.load(str(tmp_path), None, quantization, index="flat")
+
+    assert isinstance(loaded.vectors, np.memmap)
+    assert (loaded._codes if quantization == "int8" else loaded._bits) is not None
+    assert len(loaded) == COUNT
+    for query in QUERIES[:5]:
+        np.testing.assert_array_equal(loaded.search_indices(query, 10)[0], store.search_indices(query, 10)[0])
+    doc = loaded.get_by_ids(["id-7"])[0]
+    assert doc.page_content == "Fragment 7" and doc.metadata == METADATAS[7]
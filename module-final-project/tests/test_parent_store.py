@@ -0,0 +1,74 @@
+# Testy magazynu dokumentów nadrzędnych (app/parent_store.py): zapis zstd, rozwijanie fragmentów i retriever
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.parent_store import ParentRetriever, ParentStore, get_parent_store, parent_id
+from app.sharding import chunk_id
+
+PAGES = [Document(page_content=f"Strona {page}: " + "Administrator przetwarza dane osobowe zgodnie z prawem. " * 40,
+                  metadata={"source": "data/rodo_pl.pdf", "page": page}) for page in range(5)]
+
+
+class FixedRetriever(BaseRetriever):
+    """Retriever testowy zwracający zawsze te same fragmenty potomne."""
+
+    docs: list
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        return self.docs
+
+
+def child(page, part):
+    return Document(page_content=f"Fragment {part} strony {page}",
+                    metadata={"source": "data/rodo_pl.pdf", "page": page, "parent_id": f"rodo_pl.pdf:{page}"})
+
+
+def filled(tmp_path):
+    store = ParentStore(str(tmp_path / "parents.sqlite"))
+    store.put_many(PAGES)
+    return store
+
+
+# Test 1: strony wracają z bazy bez zmian, a na dysku zajmują mniej niż tekst
+def test_zapis_i_odczyt(tmp_path):
+    store = filled(tmp_path)
+    assert len(store) == len(PAGES)
+    assert store.size_bytes() < sum(len(page.page_content.encode("utf-8")) for page in PAGES)
+    found = store.get_many(["rodo_pl.pdf:3", "brak:1"])
+    assert found == {"rodo_pl.pdf:3": PAGES[3]}
+    assert store.get_many([]) == {}
+
+    # Ponowny zapis tej samej strony zastępuje ją zamiast dodawać kopię.
+    store.put_many([Document(page_content="Nowa treść", metadata=PAGES[3].metadata)])
+    assert len(store) == len(PAGES)
+    assert store.get_many(["rodo_pl.pdf:3"])["rodo_pl.pdf:3"].page_content == "Nowa treść"
+
+
+# Test 2: magazyn otwarty ponownie z pliku odnajduje stronę po jej chunk_id
+def test_chunk_id_po_restarcie(tmp_path):
+    filled(tmp_path)
+    reopened = get_parent_store(str(tmp_path / "parents.sqlite"))
+    assert reopened.get_by_chunk_id(chunk_id(PAGES[2])) == PAGES[2]
+    assert reopened.get_by_chunk_id("brak") is None
+    assert get_parent_store(str(tmp_path / "inna.sqlite")) is None
+    assert parent_id(PAGES[2].metadata) == "rodo_pl.pdf:2"
+
+
+# Test 3: fragmenty zamieniają się w strony w kolejności trafności, bez duplikatów i z limitem
+def test_expand(tmp_path):
+    store = filled(tmp_path)
+    loose = Document(page_content="Fragment bez strony nadrzędnej", metadata={})
+    orphan = Document(page_content="Fragment usuniętej strony", metadata={"parent_id": "stary.pdf:1"})
+    children = [child(4, 0), child(1, 0), child(4, 1), loose, loose, orphan, child(0, 0)]
+
+    assert store.expand(children, max_parents=10) == [PAGES[4], PAGES[1], loose, orphan, PAGES[0]]
+    assert store.expand(children, max_parents=2) == [PAGES[4], PAGES[1]]
+    assert store.expand([]) == []
+
+
+# Test 4: ParentRetriever rozwija wyniki retrievera fragmentów potomnych
+def test_parent_retriever(tmp_path):
+    store = filled(tmp_path)
+    retriever = ParentRetriever(child=FixedRetriever(docs=[child(2, 0), child(2, 1), child(3, 0)]), store=store,
+                                max_parents=3)
+    assert retriever.invoke("Jak administrator przetwarza dane?") == [PAGES[2], PAGES[3]]
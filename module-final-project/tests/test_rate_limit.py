@@ -0,0 +1,106 @@
+# Testy harmonogramu ruchu do dostawcy LLM (app/rate_limit.py): wiadra RPM/TPM, priorytety i deadline'y
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import threading
+import time
+
+import pytest
+
+from app import metrics, rate_limit
+from app.rate_limit import (BATCH, INTERACTIVE, LLMScheduler, RateLimitTimeout, ScheduledEmbeddings, TokenBucket,
+                            deadline_scope, get_scheduler)
+from app.resilience import Deadline
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Embeddingi testowe, które zapamiętują wielkość każdej partii."""
+
+    batches: list = []
+
+    def embed_documents(self, texts):
+        self.batches = self.batches + [len(texts)]
+        return super().embed_documents(texts)
+
+
+def drained(tpm=6000):
+    """Harmonogram z pustym wiadrem tokenów: 100 tokenów na sekundę przy tpm=6000."""
+    scheduler = LLMScheduler(rpm=60000, tpm=tpm, name="test")
+    scheduler.tokens.consume(scheduler.tokens.capacity)
+    return scheduler
+
+
+# Test 1: wiadro uzupełnia się w stałym tempie, ale nie ponad pojemność
+def test_token_bucket():
+    bucket = TokenBucket(rate_per_s=100, capacity=10)
+    assert bucket.try_consume(10)
+    assert not bucket.try_consume(5)
+    assert 0.03 < bucket.wait_time(5) <= 0.05
+    time.sleep(0.2)
+    assert bucket.wait_time(10) == 0
+    assert bucket.tokens <= 10
+    # Zapytanie większe niż pojemność czeka najwyżej na pełne wiadro, a nie w nieskończoność.
+    assert bucket.wait_time(1000) == 0
+
+
+# Test 2: zapytanie interaktywne wyprzedza wcześniej czekającą pracę wsadową
+def test_priorytet_interaktywnych():
+    scheduler = drained()
+    order = []
+
+    def acquire(priority, name):
+        scheduler.acquire(10, priority)
+        order.append(name)
+
+    batch = threading.Thread(target=acquire, args=(BATCH, "batch"))
+    batch.start()
+    time.sleep(0.03)
+    interactive = threading.Thread(target=acquire, args=(INTERACTIVE, "interactive"))
+    interactive.start()
+    batch.join(2)
+    interactive.join(2)
+    assert order == ["interactive", "batch"]
+    assert scheduler._waiting == []
+
+
+# Test 3: czekanie na budżet kończy się po czasie błędem, a kolejka zostaje uprzątnięta
+def test_limit_czasu():
+    scheduler = drained()
+    timeouts = metrics.snapshot()["counters"].get("test.scheduler.timeouts", 0)
+    start = time.perf_counter()
+    with pytest.raises(RateLimitTimeout):
+        scheduler.acquire(500, INTERACTIVE, timeout=0.05)
+    assert time.perf_counter() - start < 0.5
+    assert scheduler._waiting == []
+    assert metrics.snapshot()["counters"]["test.scheduler.timeouts"] == timeouts + 1
+
+    # try_acquire nie czeka: bez wolnego budżetu od razu zwraca False.
+    assert not scheduler.try_acquire(10)
+    assert LLMScheduler(rpm=60, tpm=1000, name="test").try_acquire(10)
+
+
+# Test 4: każdy model ma własny harmonogram, a limit można nadpisać dla jednego modelu
+def test_harmonogram_per_model(monkeypatch):
+    monkeypatch.setattr(rate_limit, "_schedulers", {})
+    monkeypatch.setenv("LLM_TPM", "90000")
+    monkeypatch.setenv("LLM_TPM_TEXT_EMBEDDING_3_SMALL", "1000000")
+    chat = get_scheduler()
+    embeddings = get_scheduler("text-embedding-3-small")
+    assert chat is not embeddings and get_scheduler() is chat
+    assert chat.tokens.capacity == 90000 and embeddings.tokens.capacity == 1000000
+    assert (chat.name, embeddings.name) == ("llm", "llm.text-embedding-3-small")
+
+
+# Test 5: embeddingi są wysyłane partiami mieszczącymi się w budżecie i czekają najwyżej do deadline'u
+def test_scheduled_embeddings():
+    inner = CountingEmbeddings(size=8)
+    scheduler = LLMScheduler(rpm=60000, tpm=400, name="test")
+    embeddings = ScheduledEmbeddings(inner, BATCH, scheduler)
+    texts = [f"Artykuł {i} " + "dane osobowe " * 10 for i in range(12)]
+    assert len(embeddings.embed_documents(texts)) == len(texts)
+    assert len(inner.batches) > 1 and sum(inner.batches) == len(texts)
+
+    scheduler.tokens.consume(scheduler.tokens.capacity)
+    start = time.perf_counter()
+    with deadline_scope(Deadline(0.1)):
+        with pytest.raises(RateLimitTimeout):
+            embeddings.embed_query("Czym jest RODO? " * 50)
+    assert time.perf_counter() - start < 0.5
@@ -0,0 +1,267 @@
+# Testy odporności potoku (app/resilience.py): deadline'y etapów, hedging i bezpiecznik wywołań LLM
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.messages import AIMessageChunk
+import threading
+import time
+
+import pytest
+
+from app import metrics, resilience
+from app.core import RagPipeline
+from app.resilience import CircuitBreaker, Deadline, DeadlineExceeded, hedged_stream
+from app.retrieval import RetrievalCache
+
+
+class SlowEmbeddings(DeterministicFakeEmbedding):
+    """Embeddingi testowe, które odpowiadają z opóźnieniem."""
+
+    delay: float = 0.0
+
+    def embed_query(self, text):
+        time.sleep(self.delay)
+        return super().embed_query(text)
+
+
+def pipeline_with(embeddings):
+    pipeline = RagPipeline.__new__(RagPipeline)
+    pipeline.embeddings = embeddings
+    return pipeline
+
+
+# Test 1: embedding pytania przy ponownym użyciu fragmentów mieści się w budżecie wyszukiwania
+def test_reuse_previous_chunks_respektuje_deadline():
+    fast = DeterministicFakeEmbedding(size=8)
+    docs = [Document(page_content="Art. 17 RODO")]
+    cache = RetrievalCache(docs, [fast.embed_query("Art. 17 RODO")], fast.embed_query("Art. 17 RODO"))
+
+    reused, _ = pipeline_with(fast)._reuse_previous_chunks(cache, "Art. 17 RODO", Deadline(1.0))
+    assert reused == docs
+
+    # Budżet wyszukiwania to 25% z 0,4 s, a embedding trwa 0,5 s.
+    slow = pipeline_with(SlowEmbeddings(size=8, delay=0.5))
+    start = time.perf_counter()
+    with pytest.raises(DeadlineExceeded) as error:
+        slow._reuse_previous_chunks(cache, "Art. 17 RODO", Deadline(0.4))
+    assert error.value.stage == "retrieval"
+    assert time.perf_counter() - start < 0.3
+
+
+class ScriptedLLM:
+    """
+    LLM testowy: kolejne wywołania `stream` czekają podany czas na pierwszy token.
+    Zapamiętuje, które strumienie zostały zamknięte przed końcem.
+    """
+
+    def __init__(self, *first_token_delays, chunks=("Prawo ", "do ", "usunięcia.")):
+        self.delays = list(first_token_delays)
+        self.chunks = chunks
+        self.calls = 0
+        self.closed = [threading.Event() for _ in self.delays]
+        self._lock = threading.Lock()
+
+    def stream(self, prompt):
+        with self._lock:
+            index = self.calls
+            self.calls += 1
+        return self._generate(index)
+
+    def _generate(self, index):
+        try:
+            time.sleep(self.delays[index])
+            for text in self.chunks:
+                yield AIMessageChunk(content=text)
+                time.sleep(0.01)
+        except GeneratorExit:
+            self.closed[index].set()
+            raise
+
+
+def counter(name):
+    return metrics.snapshot()["counters"].get(name, 0)
+
+
+@pytest.fixture
+def hedge_after(monkeypatch):
+    """Stały próg hedgingu, niezależny od czasów zebranych przez inne testy."""
+    def set_delay(seconds):
+        monkeypatch.setattr(resilience, "hedge_delay", lambda: seconds)
+    return set_delay
+
+
+# Test 2: szybki pierwszy token – drugie zapytanie nie jest wysyłane
+def test_hedging_bez_drugiego_zapytania(hedge_after):
+    hedge_after(0.2)
+    llm = ScriptedLLM(0.0, 0.0)
+    fired = counter("llm.hedge.fired")
+    assert hedged_stream(llm, "pytanie", hedging=True) == "Prawo do usunięcia."
+    assert llm.calls == 1
+    assert counter("llm.hedge.fired") == fired
+
+
+# Test 3: wolny pierwszy token – drugie zapytanie wygrywa, a przegrane jest zamykane
+def test_hedging_wygrywa_i_zamyka_przegrane(hedge_after):
+    hedge_after(0.05)
+    llm = ScriptedLLM(0.5, 0.0)
+    before = {name: counter(name) for name in ("llm.hedge.fired", "llm.hedge.won", "llm.hedge.extra_prompt_tokens")}
+
+    start = time.perf_counter()
+    assert hedged_stream(llm, "pytanie o RODO", hedging=True) == "Prawo do usunięcia."
+    assert time.perf_counter() - start < 0.4
+    assert llm.calls == 2
+    assert counter("llm.hedge.fired") == before["llm.hedge.fired"] + 1
+    assert counter("llm.hedge.won") == before["llm.hedge.won"] + 1
+    assert counter("llm.hedge.extra_prompt_tokens") > before["llm.hedge.extra_prompt_tokens"]
+
+    # Przegrane zapytanie zamyka strumień, gdy tylko dostanie pierwszy fragment.
+    assert llm.closed[0].wait(2.0)
+    assert not llm.closed[1].is_set()
+
+
+# Test 4: brak budżetu na drugie zapytanie – hedging jest pomijany
+def test_hedging_pominiety_bez_budzetu(hedge_after):
+    hedge_after(0.05)
+    llm = ScriptedLLM(0.2, 0.0)
+    skipped = counter("llm.hedge.skipped")
+    assert hedged_stream(llm, "pytanie", hedging=True, can_hedge=lambda: False) == "Prawo do usunięcia."
+    assert llm.calls == 1
+    assert counter("llm.hedge.skipped") == skipped + 1
+
+
+# Test 5: deadline obejmuje obie próby – po jego upływie zgłaszany jest DeadlineExceeded
+def test_hedging_respektuje_deadline(hedge_after):
+    hedge_after(0.05)
+    llm = ScriptedLLM(1.0, 1.0)
+    exceeded = counter("deadline.exceeded.generation")
+    start = time.perf_counter()
+    with pytest.raises(DeadlineExceeded) as error:
+        hedged_stream(llm, "pytanie", timeout=0.2, hedging=True)
+    assert time.perf_counter() - start < 0.5
+    assert error.value.stage == "generation"
+    assert llm.calls == 2
+    assert counter("deadline.exceeded.generation") == exceeded + 1
+
+
+# Test 6: próby LLM nie czekają w kolejce zajętej puli etapów potoku
+def test_hedging_niezalezny_od_puli_etapow(hedge_after, monkeypatch):
+    hedge_after(0.05)
+    busy = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    busy.submit(release.wait)
+    monkeypatch.setattr(resilience, "_executor", busy)
+    try:
+        llm = ScriptedLLM(0.5, 0.0)
+        assert hedged_stream(llm, "pytanie", timeout=1.0, hedging=True) == "Prawo do usunięcia."
+        assert llm.calls == 2
+    finally:
+        release.set()
+        busy.shutdown()
+
+
+class FakeClock:
+    """Zegar testowy przesuwany ręcznie."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FailingLLM(ScriptedLLM):
+    """LLM testowy, który zawodzi, dopóki `failing` jest ustawione."""
+
+    failing = True
+
+    def _generate(self, index):
+        if self.failing:
+            raise ConnectionError("dostawca niedostępny")
+        yield AIMessageChunk(content="Odpowiedź po awarii.")
+
+
+def guarded_pipeline(breaker):
+    pipeline = RagPipeline.__new__(RagPipeline)
+    pipeline.breaker = breaker
+    return pipeline
+
+
+# Test 7: closed -> open po serii błędów -> half_open po czasie -> closed po udanej próbie
+def test_bezpiecznik_przejscia_stanow():
+    clock = FakeClock()
+    breaker = CircuitBreaker("test-breaker", failure_threshold=3, reset_timeout=30, clock=clock)
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now = 29.9
+    assert not breaker.allow()
+    clock.now = 30.0
+    assert breaker.allow()  # wywołanie próbne
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()  # tylko jedna próba naraz
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.failures == 0
+    assert metrics.snapshot()["gauges"]["test-breaker.breaker.state"] == 0
+
+
+# Test 8: nieudana próba w half_open otwiera bezpiecznik na kolejny pełny okres
+def test_bezpiecznik_nieudana_proba():
+    clock = FakeClock()
+    breaker = CircuitBreaker("test-breaker", failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10.0
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now = 19.9
+    assert not breaker.allow()
+    clock.now = 20.0
+    assert breaker.allow()
+
+
+# Test 9: awaria LLM daje odpowiedź awaryjną z fragmentami, a po czasie próba przywraca generowanie
+def test_bezpiecznik_odpowiedz_awaryjna_i_powrot():
+    clock = FakeClock()
+    pipeline = guarded_pipeline(CircuitBreaker("test-llm", failure_threshold=2, reset_timeout=30, clock=clock))
+    llm = FailingLLM(*[0.0] * 10)
+    docs = [Document(page_content="Art. 17 RODO")]
+    answer = lambda: hedged_stream(llm, "pytanie", hedging=False)
+
+    for _ in range(2):
+        result = pipeline._guarded(answer, docs)
+        assert result["degraded"] is True
+        assert result["source_documents"] == docs
+    assert pipeline.breaker.state == CircuitBreaker.OPEN
+    assert llm.calls == 2
+
+    # Otwarty bezpiecznik odpowiada od razu, bez wywołania LLM.
+    assert pipeline._guarded(answer, docs)["degraded"] is True
+    assert llm.calls == 2
+
+    llm.failing = False
+    clock.now = 30.0
+    result = pipeline._guarded(answer, docs)
+    assert result == {"result": "Odpowiedź po awarii.", "source_documents": docs, "degraded": False}
+    assert llm.calls == 3
+    assert pipeline.breaker.state == CircuitBreaker.CLOSED
+
+
+# Test 10: przekroczony deadline nie jest liczony jako awaria dostawcy
+def test_bezpiecznik_ignoruje_deadline():
+    pipeline = guarded_pipeline(CircuitBreaker("test-llm", failure_threshold=1, clock=FakeClock()))
+
+    def too_slow():
+        raise DeadlineExceeded("generation")
+    with pytest.raises(DeadlineExceeded):
+        pipeline._guarded(too_slow, [])
+    assert pipeline.breaker.state == CircuitBreaker.CLOSED
+    assert pipeline.breaker.failures == 0
@@ -0,0 +1,81 @@
+# Testy wyszukiwania wielozapytaniowego (app/retrieval.py): jedno wywołanie embeddingów na etap
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import numpy as np
+
+from app.local_store import LocalVectorStore
+from app.retrieval import FusionRetriever, merge_candidates, reciprocal_rank_fusion
+
+DOCS = [Document(page_content=f"Artykuł {i} – prawo do usunięcia danych {i}", metadata={"source": "data/rodo_pl.pdf", "page": i})
+        for i in range(30)]
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """Embeddingi testowe, które liczą wywołania modelu."""
+
+    calls: int = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.calls += 1
+        return super().embed_query(text)
+
+
+class PlainStore:
+    """Magazyn bez `search_by_vectors` i bez dostępu do zapisanych wektorów."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None):
+        return self.store.similarity_search_by_vector(embedding, k=k, filter=filter)
+
+
+def doc(text):
+    return Document(page_content=text)
+
+
+# Test 1: RRF nagradza fragmenty wysoko w wielu rankingach
+def test_reciprocal_rank_fusion():
+    ranked = [([doc("a"), doc("b"), doc("c")], np.eye(3, dtype=np.float32)),
+              ([doc("b"), doc("c"), doc("a")], np.eye(3, dtype=np.float32)[[1, 2, 0]])]
+    docs, vectors = reciprocal_rank_fusion(ranked, k=2)
+    assert [d.page_content for d in docs] == ["b", "a"]
+    np.testing.assert_array_equal(vectors, np.eye(3, dtype=np.float32)[[1, 0]])
+
+
+# Test 2: bez wektorów RRF działa na samych pozycjach
+def test_reciprocal_rank_fusion_bez_wektorow():
+    docs, vectors = reciprocal_rank_fusion([([doc("a"), doc("b")], None), ([doc("b"), doc("c")], None)], k=3)
+    assert [d.page_content for d in docs] == ["b", "a", "c"]
+    assert vectors is None
+    merged, vectors = merge_candidates(np.ones(2), ([doc("a")], None), ([doc("a"), doc("b")], None), 2)
+    assert [d.page_content for d in merged] == ["a", "b"] and vectors is None
+
+
+# Test 3: magazyn z zapisanymi wektorami – jedno wywołanie embeddingów i wektory z bazy
+def test_fusion_jedno_wywolanie_embeddingow():
+    embeddings = CountingEmbeddings(size=16)
+    store = LocalVectorStore.from_documents(DOCS, embeddings)
+    embeddings.calls = 0
+    retriever = FusionRetriever(vector_store=store, embeddings=embeddings, k=3, fetch_k=6)
+    docs, vectors, query_vector = retriever.search_with_vectors("Czy firma musi usunąć dane? art. 17")
+    assert embeddings.calls == 1
+    assert len(docs) == 3 and vectors.shape == (3, 16)
+    for found, vector in zip(docs, vectors):
+        np.testing.assert_allclose(vector, np.asarray(embeddings.embed_query(found.page_content)) /
+                                   np.linalg.norm(embeddings.embed_query(found.page_content)), atol=1e-5)
+
+
+# Test 4: magazyn bez wektorów – wyniki nie są ponownie embedowane
+def test_fusion_magazyn_bez_wektorow():
+    embeddings = CountingEmbeddings(size=16)
+    store = PlainStore(LocalVectorStore.from_documents(DOCS, embeddings))
+    embeddings.calls = 0
+    retriever = FusionRetriever(vector_store=store, embeddings=embeddings, k=3, fetch_k=6)
+    docs, vectors, _ = retriever.search_with_vectors("Czy firma musi usunąć dane? art. 17")
+    assert embeddings.calls == 1
+    assert len(docs) == 3 and vectors is None
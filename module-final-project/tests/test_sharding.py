@@ -0,0 +1,75 @@
+# Testy bazy podzielonej na shardy (app/sharding.py): scatter-gather po procesach roboczych
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+import numpy as np
+import pytest
+
+from app.filters import InvalidFilter
+from app.local_store import LocalVectorStore
+from app.sharding import chunk_ids, open_sharded_store, write_shards
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=16)
+DOCS = [Document(page_content=f"Fragment {i} o ochronie danych osobowych",
+                 metadata={"source": f"data/{'a' if i % 3 else 'b'}.pdf", "page": i % 40}) for i in range(300)]
+QUERIES = [EMBEDDINGS.embed_query(f"pytanie {i}") for i in range(24)]
+
+
+@pytest.fixture(scope="module")
+def stores(tmp_path_factory):
+    """Ten sam korpus w trzech shardach (procesach) i w jednym indeksie."""
+    path = str(tmp_path_factory.mktemp("shards"))
+    sizes = write_shards(DOCS, EMBEDDINGS, shards=3, by="chunk", path=path, nodes=[])
+    assert sum(sizes) == len(DOCS) and all(sizes)
+
+    single = LocalVectorStore(EMBEDDINGS, quantization="none", index="flat")
+    single.add_embeddings([doc.page_content for doc in DOCS], EMBEDDINGS.embed_documents([doc.page_content for doc in DOCS]),
+                          [doc.metadata for doc in DOCS], chunk_ids(DOCS))
+    sharded = open_sharded_store(EMBEDDINGS, path=path, nodes=[])
+    yield sharded, single
+    sharded.close()
+
+
+def ranking(hits):
+    return [(doc.page_content, round(score, 5)) for doc, score, _ in hits]
+
+
+# Test 1: scalone top-k z N shardów jest takie samo jak wynik jednego indeksu
+def test_top_k_jak_jeden_indeks(stores):
+    sharded, single = stores
+    for k in (1, 5, 20):
+        expected = single.search_with_scores_by_vectors(QUERIES, k)
+        merged = sharded.search_with_scores_by_vectors(QUERIES, k)
+        assert [ranking(hits) for hits in merged] == [ranking(hits) for hits in expected]
+        # Razem z wynikami wracają zapisane wektory – te same co w jednym indeksie.
+        for hits, expected_hits in zip(merged, expected):
+            np.testing.assert_allclose([vector for _, _, vector in hits],
+                                       [vector for _, _, vector in expected_hits], rtol=1e-6)
+
+
+# Test 2: filtr metadanych działa w każdym shardzie tak samo jak w jednym indeksie
+def test_top_k_z_filtrem(stores):
+    sharded, single = stores
+    filters = {"source": "data/b.pdf", "page": {"$lt": 20}}
+    expected = single.search_with_scores_by_vectors(QUERIES[:4], 10, filters)
+    assert [ranking(hits) for hits in sharded.search_with_scores_by_vectors(QUERIES[:4], 10, filters)] == \
+           [ranking(hits) for hits in expected]
+    with pytest.raises(InvalidFilter):
+        sharded.search_with_scores_by_vectors(QUERIES[:1], 3, {"page": {"$regex": "1"}})
+
+
+# Test 3: współbieżne zapytania współdzielą potok shardu i każde dostaje własną odpowiedź
+def test_wspolbiezne_zapytania(stores):
+    sharded, single = stores
+    expected = [ranking(hits) for hits in single.search_with_scores_by_vectors(QUERIES, 5)]
+
+    def search(i):
+        return ranking(sharded.search_with_scores_by_vectors([QUERIES[i % len(QUERIES)]], 5)[0])
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(search, range(200)))
+    assert results == [expected[i % len(QUERIES)] for i in range(200)]
+
+    ids = chunk_ids(DOCS)
+    assert sorted(doc.page_content for doc in sharded.get_by_ids([ids[7], ids[250]])) == \
+           sorted([DOCS[7].page_content, DOCS[250].page_content])
@@ -0,0 +1,129 @@
+# Testy spekulatywnego wyszukiwania w RagPipeline._condense_and_retrieve (app/core.py)
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+import threading
+import time
+
+from app import metrics
+from app.chat_memory import ChatSession
+from app.core import RagPipeline
+from app.local_store import LocalVectorStore
+from app.resilience import CircuitBreaker
+from app.retrieval import is_near_identical
+
+HISTORY = "Użytkownik: Czym jest RODO?\nAsystent: To unijne rozporządzenie o ochronie danych."
+
+
+class FakeRetriever:
+    """Retriever testowy: zwraca fragmenty przypisane do zapytania i zapisuje, o co pytano."""
+
+    def __init__(self, results, delay=0.0, failing=()):
+        self.results = results
+        self.delay = delay
+        self.failing = failing
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def invoke(self, query):
+        with self.lock:
+            self.queries.append(query)
+        time.sleep(self.delay)
+        if query in self.failing:
+            raise RuntimeError("baza niedostępna")
+        return list(self.results.get(query, []))
+
+
+def docs(*texts):
+    return [Document(page_content=text) for text in texts]
+
+
+def pipeline_with(retriever, rewritten, delay=0.0, vector_store=None, embeddings=None):
+    pipeline = RagPipeline.__new__(RagPipeline)
+    pipeline.breaker = CircuitBreaker("test-speculative")
+    pipeline.retriever = retriever
+    pipeline.vector_store = vector_store
+    pipeline.embeddings = embeddings
+    pipeline.k = 3
+
+    def complete(prompt_text, deadline=None, **kwargs):
+        time.sleep(delay)
+        return rewritten
+    pipeline.complete = complete
+    return pipeline
+
+
+def counter(name):
+    return metrics.snapshot()["counters"].get(name, 0)
+
+
+# Test 1: różnice w wielkości liter i interpunkcji nie zmieniają pytania, inne słowa – tak
+def test_is_near_identical():
+    assert is_near_identical("czy muszę usunąć dane klienta", "Czy muszę usunąć dane klienta?")
+    assert not is_near_identical("Czy firma musi usunąć dane klienta na podstawie art. 17 RODO?",
+                                 "A co z usunięciem?")
+
+
+# Test 2: prawie identyczne pytanie – używamy wyniku spekulatywnego, który biegł równolegle z LLM
+def test_wynik_spekulatywny_uzyty():
+    question = "Czy muszę usunąć dane klienta?"
+    retriever = FakeRetriever({question: docs("Art. 17")}, delay=0.2)
+    pipeline = pipeline_with(retriever, "czy muszę usunąć dane klienta", delay=0.2)
+    used = counter("chat.speculative_retrieval.used")
+
+    start = time.perf_counter()
+    result = pipeline._condense_and_retrieve(ChatSession("s"), HISTORY, question)
+    assert time.perf_counter() - start < 0.35
+    assert result == docs("Art. 17")
+    assert retriever.queries == [question]
+    assert counter("chat.speculative_retrieval.used") == used + 1
+
+
+# Test 3: inne pytanie po przeformułowaniu – drugie wyszukiwanie i połączenie obu wyników bez duplikatów
+def test_wyniki_polaczone():
+    question, standalone = "A co z usunięciem?", "Czy firma musi usunąć dane klienta na podstawie RODO?"
+    retriever = FakeRetriever({question: docs("Motyw 65", "Art. 17"), standalone: docs("Art. 17", "Art. 21")})
+    pipeline = pipeline_with(retriever, standalone)
+    merged = counter("chat.speculative_retrieval.merged")
+
+    result = pipeline._condense_and_retrieve(ChatSession("s"), HISTORY, question)
+    assert [doc.page_content for doc in result] == ["Art. 17", "Art. 21", "Motyw 65"]
+    assert sorted(retriever.queries) == sorted([question, standalone])
+    assert counter("chat.speculative_retrieval.merged") == merged + 1
+
+
+# Test 4: błąd wyszukiwania spekulatywnego nie przerywa zapytania
+def test_blad_spekulacji_pominiety():
+    question, standalone = "A co z usunięciem?", "Czy firma musi usunąć dane klienta na podstawie RODO?"
+    retriever = FakeRetriever({standalone: docs("Art. 17")}, failing={question})
+    pipeline = pipeline_with(retriever, standalone)
+    merged = counter("chat.speculative_retrieval.merged")
+
+    assert pipeline._condense_and_retrieve(ChatSession("s"), HISTORY, question) == docs("Art. 17")
+    assert counter("chat.speculative_retrieval.merged") == merged
+
+
+# Test 5: bez historii nie ma spekulacji ani przeformułowania – jedno wyszukiwanie
+def test_bez_historii():
+    question = "Czym jest RODO?"
+    retriever = FakeRetriever({question: docs("Art. 1")})
+    pipeline = pipeline_with(retriever, "nie powinno być użyte")
+    used = counter("chat.speculative_retrieval.used")
+    assert pipeline._condense_and_retrieve(ChatSession("s"), "", question) == docs("Art. 1")
+    assert retriever.queries == [question]
+    assert counter("chat.speculative_retrieval.used") == used
+
+
+# Test 6: z wektorami łączymy kandydatów po podobieństwie do nowego pytania i zapamiętujemy je w sesji
+def test_polaczenie_z_wektorami():
+    embeddings = DeterministicFakeEmbedding(size=16)
+    texts = [f"Artykuł {i} – prawo do usunięcia danych" for i in range(20)]
+    store = LocalVectorStore.from_documents(docs(*texts), embeddings)
+    question, standalone = "A co z usunięciem?", texts[4]
+    pipeline = pipeline_with(None, standalone, vector_store=store, embeddings=embeddings)
+    session = ChatSession("s")
+
+    result = pipeline._condense_and_retrieve(session, HISTORY, question)
+    assert len(result) == 3
+    assert result[0].page_content == standalone
+    cache = session.retrieval_cache
+    assert cache is not None and cache.docs == result and len(cache.vectors) == 3
@@ -0,0 +1,56 @@
+# Testy tekstów w blokach zstd (app/text_blocks.py): indeks bloków i pamięć LRU rozpakowanych bloków
+import numpy as np
+
+from app.text_blocks import CompressedText, compress_blocks
+
+TEXTS = [f"Art. {i}. Przetwarzanie danych osobowych – ustęp {i} " * (1 + i % 7) for i in range(200)]
+BLOB = "".join(TEXTS).encode("utf-8")
+OFFSETS = np.concatenate([[0], np.cumsum([len(text.encode("utf-8")) for text in TEXTS])]).astype(np.uint64)
+
+
+def compressed(block_size=2048, cache_blocks=4):
+    data, index = compress_blocks(BLOB, OFFSETS, block_size)
+    return CompressedText(np.frombuffer(data, dtype=np.uint8), index, cache_blocks), index
+
+
+# Test 1: bloki kończą się na granicy fragmentu i pokrywają cały tekst
+def test_indeks_blokow():
+    text, index = compressed()
+    starts = [int(start) for start in index[:, 0]]
+    assert starts[0] == 0 and starts[-1] == len(BLOB)
+    assert set(starts) <= {int(offset) for offset in OFFSETS}
+    assert len(index) > 3
+    # Każdy blok (poza ostatnim) ma co najmniej zadany rozmiar, a dane są mniejsze niż tekst.
+    assert all(end - start >= 2048 for start, end in zip(starts[:-2], starts[1:-1]))
+    assert text.nbytes < len(BLOB)
+    assert len(text) == len(BLOB)
+
+
+# Test 2: odczyt dowolnego fragmentu (także na granicy bloków) zwraca dokładnie jego bajty
+def test_odczyt_fragmentow():
+    text, _ = compressed()
+    for i in range(len(TEXTS)):
+        assert text[int(OFFSETS[i]):int(OFFSETS[i + 1])].decode("utf-8") == TEXTS[i]
+    assert text[10:len(BLOB) - 10] == BLOB[10:-10]
+    assert text[5:5] == b""
+
+
+# Test 3: pamięć LRU trzyma ograniczoną liczbę ostatnio używanych bloków
+def test_pamiec_lru():
+    text, index = compressed(cache_blocks=2)
+    block = lambda i: slice(int(index[i, 0]), int(index[i, 0]) + 1)
+
+    text[block(0)]
+    text[block(0)]
+    assert (text.hits, text.misses) == (1, 1)
+
+    text[block(1)]
+    text[block(0)]          # blok 0 staje się ostatnio używanym
+    text[block(2)]          # wypiera blok 1
+    assert (text.hits, text.misses) == (2, 3)
+    assert len(text._cache) == 2
+    text[block(0)]
+    assert text.hits == 3
+    text[block(1)]
+    assert text.misses == 4
+    assert text.cached_nbytes() <= 2 * max(int(b) - int(a) for a, b in zip(index[:-1, 0], index[1:, 0]))
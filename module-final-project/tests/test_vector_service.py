@@ -0,0 +1,139 @@
+# Testy serwisu wektorowego (app/vector_service.py) i jego klienta (app/vector_client.py)
+import os
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app import vector_service
+from app.filters import InvalidFilter
+from app.vector_client import RemoteVectorStore
+from app.vector_service import Namespace, VectorService
+
+DIM = 8
+
+
+def vector(seed):
+    return np.random.default_rng(seed).normal(size=DIM).tolist()
+
+
+def items(start, count, source="data/a.pdf"):
+    return [{"id": f"doc-{i}", "values": vector(i), "text": f"Artykuł {i}", "metadata": {"source": source, "page": i}}
+            for i in range(start, start + count)]
+
+
+class VectorEmbeddings:
+    """Embeddingi testowe: tekst "Artykuł N" dostaje ten sam wektor co rekord doc-N."""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return vector(int(text.split()[-1]))
+
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    """Klient RemoteVectorStore rozmawiający z serwisem przez TestClient (bez sieci)."""
+    monkeypatch.setattr(vector_service, "service", VectorService(str(tmp_path)))
+    client = TestClient(vector_service.app)
+
+    def open_store(namespace):
+        return RemoteVectorStore(VectorEmbeddings(), url="http://testserver", namespace=namespace, client=client)
+    yield open_store
+    vector_service.service.close()
+
+
+# Test 1: po awarii w trakcie zapisu niedokończony wpis dziennika jest pomijany i obcinany
+def test_wal_uszkodzony_koniec(tmp_path):
+    namespace = Namespace(str(tmp_path), compact_every=100)
+    namespace.upsert(items(0, 3))
+    namespace.delete(["doc-1"])
+    namespace.close()
+
+    wal = os.path.join(str(tmp_path), "wal.jsonl")
+    valid_size = os.path.getsize(wal)
+    with open(wal, "ab") as f:
+        f.write(b'{"op": "upsert", "items": [{"id": "doc-9", "val')
+
+    restored = Namespace(str(tmp_path), compact_every=100)
+    assert restored.ids == ["doc-0", "doc-2"]
+    assert os.path.getsize(wal) == valid_size
+
+    # Kolejne operacje są dopisywane za ostatnim poprawnym wpisem i przetrwają następny restart.
+    restored.upsert(items(5, 1))
+    restored.close()
+    again = Namespace(str(tmp_path), compact_every=100)
+    assert again.ids == ["doc-0", "doc-2", "doc-5"]
+    assert again.query([vector(5)], top_k=1)[0][0]["id"] == "doc-5"
+    again.close()
+
+
+# Test 2: zrzut i dziennik razem odtwarzają ten sam stan
+def test_zrzut_i_dziennik(tmp_path):
+    namespace = Namespace(str(tmp_path), compact_every=2)
+    namespace.upsert(items(0, 4))
+    namespace.upsert(items(4, 2))  # druga operacja zapisuje zrzut i czyści dziennik
+    namespace.delete(["doc-0"])
+    namespace.close()
+
+    restored = Namespace(str(tmp_path), compact_every=2)
+    assert restored.ids == ["doc-1", "doc-2", "doc-3", "doc-4", "doc-5"]
+    np.testing.assert_allclose(restored.vectors[0], np.asarray(vector(1)) / np.linalg.norm(vector(1)), rtol=1e-5)
+    restored.close()
+
+
+# Test 3: przestrzenie nazw są od siebie odizolowane
+def test_izolacja_przestrzeni_nazw(remote):
+    first, second = remote("pierwsza"), remote("druga")
+    first.add_texts(["Artykuł 1", "Artykuł 2"], ids=["doc-1", "doc-2"])
+    second.add_texts(["Artykuł 1"], metadatas=[{"source": "data/b.pdf"}], ids=["doc-1"])
+
+    assert [doc.id for doc in first.similarity_search("Artykuł 2", k=5)] == ["doc-2", "doc-1"]
+    assert [doc.metadata for doc in second.similarity_search("Artykuł 2", k=5)] == [{"source": "data/b.pdf"}]
+
+    first.clear()
+    assert first.similarity_search("Artykuł 1", k=5) == []
+    assert [doc.id for doc in second.get_by_ids(["doc-1", "doc-2"])] == ["doc-1"]
+
+
+# Test 4: filtr metadanych zawęża wyniki zapytania, a błędny filtr zgłasza InvalidFilter
+def test_zapytanie_z_filtrem(remote):
+    store = remote("rodo")
+    texts = [f"Artykuł {i}" for i in range(10)]
+    metadatas = [{"source": f"data/{'a' if i % 2 else 'b'}.pdf", "page": i} for i in range(10)]
+    store.add_texts(texts, metadatas, ids=[f"doc-{i}" for i in range(10)])
+
+    docs = store.similarity_search("Artykuł 4", k=10, filter={"source": "data/a.pdf", "page": {"$gte": 5}})
+    assert sorted(doc.metadata["page"] for doc in docs) == [5, 7, 9]
+    assert store.similarity_search("Artykuł 4", k=1, filter={"page": [4, 6]})[0].id == "doc-4"
+
+    # Zapytania wsadowe (wiele wektorów naraz) stosują ten sam filtr do każdego z nich.
+    results = store.search_by_vectors([vector(1), vector(2)], k=3, filters={"page": {"$lt": 3}})
+    assert [docs[0].id for docs, _ in results] == ["doc-1", "doc-2"]
+    assert all(sorted(doc.metadata["page"] for doc in docs) == [0, 1, 2] for docs, _ in results)
+    assert results[0][1].shape == (3, DIM)
+
+    with pytest.raises(InvalidFilter):
+        store.similarity_search("Artykuł 1", k=3, filter={"page": {"$regex": "1"}})
+
+
+# Test 5: usuwanie po filtrze obejmuje tylko pasujące rekordy i jest trwałe
+def test_usuwanie_po_filtrze(remote, tmp_path):
+    store = remote("rodo")
+    store.add_texts([f"Artykuł {i}" for i in range(6)],
+                    [{"source": f"data/{'a' if i < 3 else 'b'}.pdf", "page": i} for i in range(6)],
+                    ids=[f"doc-{i}" for i in range(6)])
+
+    assert store.delete(filter={"source": "data/a.pdf"})
+    assert sorted(doc.id for doc in store.similarity_search("Artykuł 0", k=10)) == ["doc-3", "doc-4", "doc-5"]
+
+    # Identyfikatory i filtr można łączyć; rekordy pasujące do obu są usuwane raz.
+    response = store._client.post("http://testserver/namespaces/rodo/delete",
+                                  json={"ids": ["doc-3"], "filter": {"page": {"$lte": 3}}})
+    assert response.json() == {"deleted": 1}
+
+    vector_service.service.close()
+    restored = VectorService(str(tmp_path))
+    assert restored.get("rodo").ids == ["doc-4", "doc-5"]
+    restored.close()
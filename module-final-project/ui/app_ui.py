@@ -6,8 +6,43 @@ przy użyciu biblioteki Streamlit. UI komunikuje się z backendem FastAPI.
 """
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 
-API_URL = "http://127.0.0.1:8000/ask"
+API_BASE_URL = "http://127.0.0.1:8000"
+API_URL = f"{API_BASE_URL}/chat"
+# Limit czasu po stronie UI; serwer dostaje nieco mniej, aby zdążył zwrócić czytelny błąd.
+REQUEST_TIMEOUT_S = 120
+SERVER_TIMEOUT_S = 110
+
+@st.cache_resource
+def get_http_session():
+    """Jedna sesja HTTP na cały proces Streamlit – połączenia keep-alive są ponownie używane."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def fetch_chunk(chunk_id):
+    """Treść fragmentu z /chunks/{id}; identyfikator wyznacza treść, więc wynik można trzymać w cache'u."""
+    response = get_http_session().get(f"{API_BASE_URL}/chunks/{chunk_id}", timeout=REQUEST_TIMEOUT_S)
+    response.raise_for_status()
+    return response.json()
+
+def show_sources(sources, key):
+    """Ekspander ze źródłami odpowiedzi; treść fragmentów jest pobierana dopiero po jego rozwinięciu."""
+    # `key`, `on_change` i `.open` ekspandera są dostępne od Streamlit 1.55 (zob. requirements.txt).
+    expander = st.expander("Zobacz źródła odpowiedzi", key=key, on_change="rerun")
+    with expander:
+        if not expander.open:
+            return
+        for source in sources:
+            st.markdown(f"**Źródło (strona {source['page']}):**")
+            try:
+                st.info(fetch_chunk(source["id"])["page_content"])
+            except requests.exceptions.RequestException as e:
+                st.warning(f"Nie udało się pobrać treści fragmentu: {e}")
 
 st.set_page_config(page_title="RODO Ekspert AI", page_icon="🤖", layout="wide")
 
@@ -17,11 +52,16 @@ st.caption("Zadaj pytanie dotyczące RODO, a AI odpowie na podstawie oficjalnego
 # Inicjalizacja historii czatu w stanie sesji
 if "messages" not in st.session_state:
     st.session_state.messages = []
+# Identyfikator rozmowy nadany przez API – dzięki niemu pytania uzupełniające mają kontekst
+if "chat_session_id" not in st.session_state:
+    st.session_state.chat_session_id = None
 
-# Wyświetlanie wcześniejszych wiadomości
-for message in st.session_state.messages:
+# Wyświetlanie wcześniejszych wiadomości (rozwinięcie ekspandera źródeł odświeża stronę, więc źródła też trzymamy w historii)
+for index, message in enumerate(st.session_state.messages):
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
+        if message.get("sources"):
+            show_sources(message["sources"], key=f"sources-{index}")
 
 # Pole do wprowadzania nowego pytania
 if prompt := st.chat_input("Jak brzmi Twoje pytanie dotyczące RODO?"):
@@ -36,22 +76,33 @@ if prompt := st.chat_input("Jak brzmi Twoje pytanie dotyczące RODO?"):
         message_placeholder.markdown("Analizuję treść rozporządzenia... ⏳")
         
         try:
-            response = requests.post(API_URL, json={"query": prompt}, timeout=120)
+            response = get_http_session().post(
+                API_URL,
+                json={
+                    "message": prompt,
+                    "session_id": st.session_state.chat_session_id,
+                    "timeout_s": SERVER_TIMEOUT_S,
+                    # Same odwołania do źródeł – ich treść pobieramy dopiero, gdy użytkownik zechce ją zobaczyć.
+                    "references": True,
+                },
+                timeout=REQUEST_TIMEOUT_S,
+            )
             response.raise_for_status()  # Sprawdź, czy nie ma błędu HTTP
             
             result = response.json()
+            st.session_state.chat_session_id = result.get("session_id")
             answer = result.get("answer", "Przepraszam, wystąpił błąd w odpowiedzi.")
             
-            message_placeholder.markdown(answer)
+            if result.get("degraded"):
+                message_placeholder.warning(answer)
+            else:
+                message_placeholder.markdown(answer)
             
-            # Opcjonalnie: wyświetl źródła
-            with st.expander("Zobacz źródła odpowiedzi"):
-                for doc in result.get("source_documents", []):
-                    st.markdown(f"**Źródło (strona {doc['metadata']['page']}):**")
-                    st.info(doc['page_content'])
-
-            # Dodaj odpowiedź AI do historii
-            st.session_state.messages.append({"role": "assistant", "content": answer})
+            # Dodaj odpowiedź AI do historii i pokaż (zwinięte) źródła
+            sources = result.get("sources") or []
+            st.session_state.messages.append({"role": "assistant", "content": answer, "sources": sources})
+            if sources:
+                show_sources(sources, key=f"sources-{len(st.session_state.messages) - 1}")
 
         except requests.exceptions.RequestException as e:
             error_message = f"Błąd połączenia z serwerem API. Upewnij się, że backend działa. Szczegóły: {e}"